@@ -0,0 +1,4 @@
+"""
+Benchmarks for Hifumi internals, run them with
+``python -m benchmarks.<module name>`` from the project root.
+"""
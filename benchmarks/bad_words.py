@@ -0,0 +1,70 @@
+"""
+Compare the bad word check looping over every bad word and every word of
+the message with the combined regex of checks.no_badword, on long pasted
+messages.
+"""
+from random import choice, randint, seed
+from sys import argv
+from time import perf_counter
+from types import SimpleNamespace
+
+from scripts.checks import BAD_WORD, BadWordError, no_badword
+
+_LETTERS = 'abdefgjmnqruvwxyz'
+
+
+def _loop(content: str):
+    """
+    The check before the combined regex.
+    """
+    input_words = str.split(content, ' ')
+    for badword in BAD_WORD:
+        for s in input_words:
+            if badword in s.lower():
+                return s
+    return None
+
+
+def _regex(content: str):
+    try:
+        no_badword(SimpleNamespace(message=SimpleNamespace(content=content)))
+    except BadWordError as e:
+        return str(e)
+    return None
+
+
+def _message(length: int) -> str:
+    words = []
+    while sum(map(len, words)) + len(words) < length:
+        word = ''.join(choice(_LETTERS) for _ in range(randint(1, 10)))
+        words.append(word.title() if randint(0, 5) == 0 else word)
+    return ' '.join(words)
+
+
+def _time(check, messages, rounds: int) -> float:
+    start = perf_counter()
+    for _ in range(rounds):
+        for m in messages:
+            check(m)
+    return (perf_counter() - start) / rounds / len(messages)
+
+
+def main(length: int, rounds: int):
+    seed(0)
+    clean = [_message(length) for _ in range(10)]
+    dirty = [m + ' Children' for m in clean]
+    for m in clean + dirty:
+        assert _loop(m) == _regex(m)
+    print(f'{length:,} character messages')
+    for name, messages in (('clean', clean), ('bad word last', dirty)):
+        loop = _time(_loop, messages, rounds)
+        regex = _time(_regex, messages, rounds)
+        print(f'{name}: loop {loop * 1e6:,.1f}us, '
+              f'regex {regex * 1e6:,.1f}us, {loop / regex:.0f}x')
+
+
+if __name__ == '__main__':
+    main(
+        int(argv[1]) if len(argv) > 1 else 2000,
+        int(argv[2]) if len(argv) > 2 else 100
+    )
@@ -0,0 +1,135 @@
+"""
+Compare the json libraries on booru post list pages, and how long the event
+loop is blocked with and without decoding large pages in a thread pool.
+"""
+from asyncio import get_event_loop, sleep
+from json import dumps
+from random import choice, randint, random, seed
+from string import ascii_lowercase
+from sys import argv
+from time import perf_counter
+
+from bot.json_decoder import JsonDecoder, find_loads
+
+
+def _post(id_: int, tags: list) -> dict:
+    """
+    Make a post like the ones in a konachan or e621 post list.
+    :param id_: the post id.
+    :param tags: the tags to pick from.
+    :return: the post.
+    """
+    md5 = ''.join(choice('0123456789abcdef') for _ in range(32))
+    width, height = randint(500, 4000), randint(500, 4000)
+    return {
+        'id': id_,
+        'tags': ' '.join(choice(tags) for _ in range(randint(5, 40))),
+        'created_at': 1500000000 + id_,
+        'creator_id': randint(1, 100000),
+        'author': choice(tags),
+        'change': randint(1, 10 ** 7),
+        'source': f'https://www.pixiv.net/member_illust.php?id={id_}',
+        'score': randint(0, 500),
+        'md5': md5,
+        'file_size': randint(10 ** 5, 10 ** 7),
+        'file_url': f'//konachan.com/image/{md5}/image.jpg',
+        'is_shown_in_index': True,
+        'preview_url': f'//konachan.com/data/preview/{md5}.jpg',
+        'preview_width': 150,
+        'preview_height': 113,
+        'sample_url': f'//konachan.com/sample/{md5}/sample.jpg',
+        'sample_width': 1500,
+        'sample_height': 1125,
+        'jpeg_url': f'//konachan.com/jpeg/{md5}/image.jpg',
+        'width': width,
+        'height': height,
+        'rating': choice('sqe'),
+        'has_children': random() < 0.1,
+        'parent_id': None,
+        'status': 'active',
+        'frames': [],
+    }
+
+
+def _pages(count: int, posts: int) -> list:
+    """
+    Make post list pages encoded as json.
+    :param count: the number of pages.
+    :param posts: the number of posts per page.
+    :return: a list of json bytes.
+    """
+    letters = ascii_lowercase + '_'
+    tags = [''.join(choice(letters) for _ in range(randint(3, 20)))
+            for _ in range(5000)]
+    return [
+        dumps([_post(i * posts + j, tags) for j in range(posts)]).encode()
+        for i in range(count)
+    ]
+
+
+def _time_libraries(pages: list):
+    """
+    Time each installed json library decoding the pages.
+    :param pages: the json pages.
+    """
+    for name in ('json', 'ujson', 'rapidjson', 'orjson'):
+        found, loads = find_loads(name)
+        if found != name:
+            print(f'{name:>10}: not installed')
+            continue
+        start = perf_counter()
+        for page in pages:
+            loads(page)
+        per_page = (perf_counter() - start) / len(pages) * 1000
+        print(f'{name:>10}: {per_page:.2f}ms/page')
+
+
+async def _max_stall(decoder: JsonDecoder, pages: list) -> float:
+    """
+    Decode the pages while a ticker runs on the event loop.
+    :param decoder: the json decoder.
+    :param pages: the json pages.
+    :return: the longest time in ms the ticker was blocked for.
+    """
+    stall = 0
+    running = True
+
+    async def tick():
+        nonlocal stall
+        while running:
+            start = perf_counter()
+            await sleep(0)
+            stall = max(stall, perf_counter() - start)
+
+    ticker = get_event_loop().create_task(tick())
+    await sleep(0)
+    for page in pages:
+        await decoder.decode(page)
+        # Let the ticker run between pages, like between requests.
+        await sleep(0)
+    running = False
+    await ticker
+    return stall * 1000
+
+
+def main(count: int, posts: int):
+    seed(0)
+    pages = _pages(count, posts)
+    size = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f'{count} pages of {posts} posts, {size:.0f}KiB/page')
+    _time_libraries(pages)
+    loop = get_event_loop()
+    for name in ('json', None):
+        for threshold in (None, 64 * 1024):
+            decoder = JsonDecoder(name, threshold)
+            stall = loop.run_until_complete(_max_stall(decoder, pages))
+            mode = 'executor' if threshold else 'event loop'
+            print(f'{decoder.name:>10} on the {mode}: '
+                  f'longest loop stall {stall:.2f}ms')
+
+
+if __name__ == '__main__':
+    main(
+        int(argv[1]) if len(argv) > 1 else 50,
+        int(argv[2]) if len(argv) > 2 else 320
+    )
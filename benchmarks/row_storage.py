@@ -0,0 +1,81 @@
+"""
+Compare the memory used by member and user rows stored as a dict of row
+objects with the compact array storage.
+"""
+from datetime import datetime, timedelta
+from random import randint
+from sys import argv
+from tracemalloc import get_traced_memory, start, stop
+
+from data_controller.compact_rows import CompactMemberRows, CompactUserRows
+from data_controller.data_rows import _MemberRow, _UserRow
+
+
+def _rows(count: int) -> tuple:
+    """
+    Generate random member and user rows.
+    :param count: the number of rows of each kind.
+    :return: a tuple of (member rows, user rows)
+    """
+    now = datetime.now()
+    members = [
+        (str(randint(1 << 55, 1 << 60)), str(randint(1 << 55, 1 << 60)),
+         randint(0, 5))
+        for _ in range(count)
+    ]
+    users = [
+        (str(randint(1 << 55, 1 << 60)), randint(0, 100000),
+         now - timedelta(seconds=randint(0, 86400 * 30)))
+        for _ in range(count)
+    ]
+    return members, users
+
+
+def _measure(fill) -> int:
+    """
+    Measure the memory allocated by a callable that is still alive after it
+    returns.
+    :param fill: the callable, it should return the container it filled.
+    :return: the number of bytes allocated.
+    """
+    start()
+    container = fill()
+    current, _ = get_traced_memory()
+    stop()
+    del container
+    return current
+
+
+def _dict_layout(members, users) -> tuple:
+    member_dict = {}
+    user_dict = {}
+    for m in members:
+        member_dict[int(m[0]), int(m[1])] = _MemberRow(None, m)
+    for u in users:
+        user_dict[int(u[0])] = _UserRow(None, u)
+    return member_dict, user_dict
+
+
+def _compact_layout(members, users) -> tuple:
+    member_rows = CompactMemberRows(None)
+    user_rows = CompactUserRows(None)
+    for m in members:
+        member_rows[int(m[0]), int(m[1])] = _MemberRow(None, m)
+    for u in users:
+        user_rows[int(u[0])] = _UserRow(None, u)
+    return member_rows, user_rows
+
+
+def main(count: int):
+    members, users = _rows(count)
+    dict_bytes = _measure(lambda: _dict_layout(members, users))
+    compact_bytes = _measure(lambda: _compact_layout(members, users))
+    print(f'{count:,} member rows + {count:,} user rows')
+    print(f'dict of row objects: {dict_bytes / 2 ** 20:.2f}MB '
+          f'({dict_bytes / count / 2:.0f} bytes per row)')
+    print(f'compact arrays:      {compact_bytes / 2 ** 20:.2f}MB '
+          f'({compact_bytes / count / 2:.0f} bytes per row)')
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 200000)
@@ -0,0 +1,73 @@
+"""
+Compare fuzzy tag matching with difflib over all tags and with the trigram
+index on a synthetic corpus of booru style tags.
+"""
+from difflib import get_close_matches
+from random import choice, randint, random, seed
+from string import ascii_lowercase
+from sys import argv
+from time import perf_counter
+
+from data_controller.fuzzy_index import TrigramIndex
+
+_SYLLABLES = [c + v for c in 'bcdfghjkmnprstwyz' for v in 'aeiou']
+
+
+def _word() -> str:
+    return ''.join(choice(_SYLLABLES) for _ in range(randint(1, 4)))
+
+
+def _tag() -> str:
+    return '_'.join(_word() for _ in range(randint(1, 3)))
+
+
+def _typo(s: str) -> str:
+    """
+    Make a typo in a string by deleting, inserting or replacing a letter.
+    """
+    i = randint(0, len(s) - 1)
+    r = random()
+    if r < 1 / 3:
+        return s[:i] + s[i + 1:]
+    if r < 2 / 3:
+        return s[:i] + choice(ascii_lowercase) + s[i:]
+    return s[:i] + choice(ascii_lowercase) + s[i + 1:]
+
+
+def main(tag_count: int, query_count: int):
+    seed(0)
+    tags = list({_tag() for _ in range(tag_count)})
+    queries = [_typo(choice(tags)) for _ in range(query_count // 2)]
+    queries += [_tag() for _ in range(query_count - len(queries))]
+
+    start = perf_counter()
+    index = TrigramIndex(tags)
+    build = perf_counter() - start
+
+    start = perf_counter()
+    expected = []
+    for q in queries:
+        res = get_close_matches(q, tags, 1, cutoff=0.4)
+        expected.append(res[0] if res else None)
+    difflib_time = perf_counter() - start
+
+    start = perf_counter()
+    actual = []
+    for q in queries:
+        res = index.match(q, 0.4)
+        actual.append(res[0] if res else None)
+    index_time = perf_counter() - start
+
+    same = sum(a == e for a, e in zip(actual, expected))
+    print(f'{len(tags):,} tags, {len(queries):,} queries')
+    print(f'index build:   {build:.2f}s')
+    print(f'difflib:       {difflib_time / len(queries) * 1000:.2f}ms/query')
+    print(f'trigram index: {index_time / len(queries) * 1000:.2f}ms/query')
+    print(f'same result as difflib: {same / len(queries):.1%}')
+
+
+if __name__ == '__main__':
+    main(
+        int(argv[1]) if len(argv) > 1 else 100000,
+        int(argv[2]) if len(argv) > 2 else 100
+    )
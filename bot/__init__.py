@@ -11,7 +11,8 @@ Hifumi, a multifunctional Discord bot.
 from collections import namedtuple
 
 from bot.hifumi import Hifumi
-from bot.session_manager import HTTPStatusError, SessionManager
+from bot.session_manager import CircuitOpenError, HTTPStatusError, \
+    RequestTimeoutError, SessionManager
 
 VersionInfo = namedtuple('VersionInfo', 'major minor micro releaselevel serial')
 
@@ -31,4 +32,4 @@ __version__ = '.'.join([str(i) for i in list(version_info)[:3]])
 __all__ = ['__title__', '__author__', '__author_plain__',
            '__helper__', '__helper_plain__', '__license__', '__copyright__',
            '__version__', 'version_info', 'Hifumi', 'SessionManager',
-           'HTTPStatusError']
+           'HTTPStatusError', 'CircuitOpenError', 'RequestTimeoutError']
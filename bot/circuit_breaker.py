@@ -0,0 +1,138 @@
+"""
+Circuit breakers for the hosts the bot makes HTTP requests to.
+"""
+from time import monotonic
+from typing import Dict
+
+__all__ = ['CircuitBreaker', 'CLOSED', 'OPEN', 'HALF_OPEN']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    """
+    The state of the circuit of one host.
+    """
+    __slots__ = ['state', 'failures', 'opened_at', 'trials']
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0
+
+
+class CircuitBreaker:
+    """
+    Stop making requests to a host after it failed too many times in a row.
+
+    After failure threshold failures in a row the circuit of a host opens,
+    and requests to that host fail right away. After the cool down the
+    circuit is half open and a limited number of trial requests are let
+    through, the circuit closes if one succeeds and opens again if one fails.
+    """
+    __slots__ = ['__threshold', '__cool_down', '__max_trials', '__circuits']
+
+    def __init__(self, failure_threshold: int = 5, cool_down: float = 30,
+                 max_trials: int = 1):
+        """
+        Initialize an instance of this class.
+        :param failure_threshold: the number of failures in a row that
+        opens a circuit.
+        :param cool_down: the time in seconds before an open circuit lets
+        trial requests through.
+        :param max_trials: the maximum number of trial requests running at
+        the same time in a half open circuit.
+        """
+        assert failure_threshold > 0 and cool_down >= 0 and max_trials > 0
+        self.__threshold = failure_threshold
+        self.__cool_down = cool_down
+        self.__max_trials = max_trials
+        self.__circuits: Dict[str, _Circuit] = {}
+
+    def state(self, host: str) -> str:
+        """
+        :param host: the host.
+        :return: the circuit state of the host.
+        """
+        circuit = self.__circuits.get(host)
+        if circuit is None:
+            return CLOSED
+        if (circuit.state == OPEN and
+                monotonic() - circuit.opened_at >= self.__cool_down):
+            circuit.state = HALF_OPEN
+            circuit.trials = 0
+        return circuit.state
+
+    @property
+    def states(self) -> Dict[str, str]:
+        """
+        :return: a dict of {host: circuit state} of the hosts whose circuit
+        is not closed.
+        """
+        states = {host: self.state(host) for host in self.__circuits}
+        return {h: s for h, s in states.items() if s != CLOSED}
+
+    def retry_in(self, host: str) -> float:
+        """
+        :param host: the host.
+        :return: the time in seconds until the circuit of the host lets
+        trial requests through, 0 if it's not open.
+        """
+        if self.state(host) != OPEN:
+            return 0
+        opened_at = self.__circuits[host].opened_at
+        return max(opened_at + self.__cool_down - monotonic(), 0)
+
+    def allow(self, host: str) -> bool:
+        """
+        Check if a request can be made to a host, a request that is allowed
+        must be followed by a call to success, failure or cancel.
+        :param host: the host.
+        :return: True if the request can be made.
+        """
+        state = self.state(host)
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        circuit = self.__circuits[host]
+        if circuit.trials >= self.__max_trials:
+            return False
+        circuit.trials += 1
+        return True
+
+    def success(self, host: str):
+        """
+        Record a request that succeeded.
+        :param host: the host.
+        """
+        circuit = self.__circuits.get(host)
+        if circuit is not None:
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.trials = 0
+
+    def failure(self, host: str):
+        """
+        Record a request that failed.
+        :param host: the host.
+        """
+        circuit = self.__circuits.setdefault(host, _Circuit())
+        circuit.failures += 1
+        if (circuit.state == HALF_OPEN or
+                circuit.failures >= self.__threshold):
+            circuit.state = OPEN
+            circuit.opened_at = monotonic()
+            circuit.trials = 0
+
+    def cancel(self, host: str):
+        """
+        Record a request that was cancelled before it finished.
+        :param host: the host.
+        """
+        circuit = self.__circuits.get(host)
+        if circuit is not None and circuit.state == HALF_OPEN:
+            circuit.trials = max(circuit.trials - 1, 0)
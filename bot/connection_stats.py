@@ -0,0 +1,70 @@
+"""
+Per host connection stats of the aiohttp client sessions.
+"""
+from collections import defaultdict
+from typing import Dict, Optional
+
+try:
+    from aiohttp import TraceConfig
+except ImportError:
+    # aiohttp < 3.0 has no request tracing.
+    TraceConfig = None
+
+__all__ = ['ConnectionStats']
+
+
+class ConnectionStats:
+    """
+    Count the requests, new connections and reused connections per host,
+    and the DNS cache hits and misses, using aiohttp request tracing.
+    """
+    __slots__ = ['__hosts']
+
+    def __init__(self):
+        self.__hosts = defaultdict(lambda: dict.fromkeys(
+            ('requests', 'created', 'reused', 'dns_hits', 'dns_misses'), 0))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: True if the installed aiohttp supports request tracing.
+        """
+        return TraceConfig is not None
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: a dict of {host: counts}
+        """
+        return {host: dict(counts) for host, counts in self.__hosts.items()}
+
+    def trace_config(self) -> Optional['TraceConfig']:
+        """
+        :return: a TraceConfig that records into this instance, None if the
+        installed aiohttp doesn't support request tracing.
+        """
+        if TraceConfig is None:
+            return None
+        trace = TraceConfig()
+        trace.on_request_start.append(self.__on_request_start)
+        trace.on_connection_create_end.append(self.__counter('created'))
+        trace.on_connection_reuseconn.append(self.__counter('reused'))
+        trace.on_dns_cache_hit.append(self.__counter('dns_hits'))
+        trace.on_dns_cache_miss.append(self.__counter('dns_misses'))
+        return trace
+
+    async def __on_request_start(self, session, ctx, params):
+        ctx.host = params.url.host
+        self.__hosts[ctx.host]['requests'] += 1
+
+    def __counter(self, name: str):
+        """
+        :param name: the name of the count.
+        :return: a trace signal handler that increments the count of the
+        host of the request.
+        """
+        async def handler(session, ctx, params):
+            host = getattr(ctx, 'host', None)
+            if host is not None:
+                self.__hosts[host][name] += 1
+        return handler
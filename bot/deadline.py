@@ -0,0 +1,42 @@
+"""
+Time budgets of commands.
+"""
+from time import monotonic
+from typing import Optional
+
+__all__ = ['Deadline']
+
+
+class Deadline:
+    """
+    The time by which a command has to be done. It's passed down to every
+    request the command makes, so retries and follow up requests only get
+    the time that is left.
+    """
+    __slots__ = ['budget', '__end']
+
+    def __init__(self, budget: float):
+        """
+        Initialize an instance of this class.
+        :param budget: the time budget in seconds, starting now.
+        """
+        self.budget = budget
+        self.__end = monotonic() + budget
+
+    def remaining(self) -> float:
+        """
+        :return: the time in seconds that is left, 0 if the deadline passed.
+        """
+        return max(self.__end - monotonic(), 0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, timeout: Optional[float] = None) -> float:
+        """
+        :param timeout: a timeout in seconds, optional.
+        :return: the timeout, capped to the time that is left.
+        """
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
@@ -1,23 +1,31 @@
 """
 The Hifumi bot object
 """
+from asyncio import Semaphore
+from collections import OrderedDict, defaultdict
+from functools import partial
 from pathlib import Path
 from time import time
 from traceback import format_exc
-from typing import Union
+from typing import Optional, Tuple, Union
 
-from aiohttp import ClientSession
 from discord import Message
 from discord.ext.commands import AutoShardedBot, Context
 
+from bot.circuit_breaker import CircuitBreaker
+from bot.deadline import Deadline
 from bot.hifumi_functions import (get_data_manager, handle_error)
+from bot.json_decoder import JsonDecoder
+from bot.rate_limiter import RateLimiter
+from bot.response_cache import ResponseCache
 from bot.session_manager import SessionManager
 from config import Config
 from core.listen_core import send_traceback
-from data_controller import DataManager, TagMatcher
+from core.post_pool import PostPool
+from data_controller import DataManager, RowNotLoadedError, TagMatcher
 from data_controller.data_utils import get_prefix
 from scripts.logger import get_console_handler, setup_logging
-from translations.translations import Translation
+from translations.translations import Translation, TranslationWatcher
 
 
 class Hifumi(AutoShardedBot):
@@ -32,6 +40,7 @@ class Hifumi(AutoShardedBot):
                  session_manager: SessionManager,
                  tag_matcher: TagMatcher,
                  data_manager: DataManager,
+                 post_pool: PostPool,
                  logger,
                  emojis: list):
         """
@@ -41,6 +50,7 @@ class Hifumi(AutoShardedBot):
         :param session_manager: the SessionManager instance.
         :param tag_matcher: the TagMatcher instance.
         :param data_manager: the DataManager instance.
+        :param post_pool: the PostPool instance.
         :param logger: the logger.
         :param emojis: the list of emojis.
         """
@@ -49,13 +59,35 @@ class Hifumi(AutoShardedBot):
         self.session_manager = session_manager
         self.tag_matcher = tag_matcher
         self.data_manager = data_manager
+        self.post_pool = post_pool
+        # Limits the nsfw search requests made to each site at the same time.
+        self.search_semaphores = defaultdict(partial(
+            Semaphore, (config.get('NSFW') or {}).get('site concurrency', 4)
+        ))
+        self.command_timeout = (
+            (config.get('HTTP') or {}).get('command timeout', 30))
         self.start_time = start_time
         self.language = Translation()
+        # Puts edited translation files live without a restart.
+        self.translation_watcher = TranslationWatcher(
+            self.language,
+            config['Bot'].get('translation reload interval'),
+            logger
+        )
+        if self.translation_watcher.interval:
+            self.translation_watcher.start()
         self.logger = logger
         self.all_emojis = emojis
         self.mention_regex = None
         self.mention_msg_regex = None
-        super().__init__(command_prefix=get_prefix)
+        # The prefix and command name of the latest messages, by message id.
+        self.__resolved = OrderedDict()
+        self.__default_start = config['Bot']['prefix'][:1]
+        super().__init__(
+            command_prefix=get_prefix,
+            shard_ids=config['Bot'].get('shard ids'),
+            shard_count=config['Bot'].get('shard count')
+        )
 
     @classmethod
     async def get_bot(cls):
@@ -72,17 +104,60 @@ class Hifumi(AutoShardedBot):
         logger = setup_logging(start_time, log_path)
         if config['Bot']['console logging']:
             logger.addHandler(get_console_handler())
-        session_manager = SessionManager(ClientSession(), logger)
+        http = config.get('HTTP') or {}
+        cache = ResponseCache(
+            http.get('cache rules') or [],
+            http.get('cache size', 1024),
+            data_path.joinpath('http_cache', 'responses')
+            if http.get('cache spill') else None
+        )
+        rate_limiter = RateLimiter(
+            http.get('rate limits') or {}, http.get('rate limit wait', 5))
+        circuit_breaker = CircuitBreaker(
+            http.get('failure threshold', 5),
+            http.get('circuit cool down', 30)
+        )
+        session_manager = SessionManager.create(
+            logger, cache, rate_limiter, circuit_breaker,
+            limit=http.get('connection limit', 100),
+            limit_per_host=http.get('connection limit per host', 0),
+            dns_cache_ttl=http.get('dns cache ttl', 300),
+            keepalive_timeout=http.get('keepalive timeout', 30),
+            separate_hosts=http.get('separate pool hosts') or (),
+            max_download_size=http.get('max download size', 8388608),
+            json_decoder=JsonDecoder(
+                http.get('json library'),
+                http.get('json executor threshold')
+            ),
+            request_timeout=http.get('request timeout', 10)
+        )
         data_manager, tag_matcher = await get_data_manager(
-            config.postgres(), logger
+            config.postgres(), logger,
+            config['Bot'].get('shard ids'), config['Bot'].get('shard count')
+        )
+        nsfw = config.get('NSFW') or {}
+        post_pool = PostPool(
+            logger,
+            depth=nsfw.get('pool depth', 50),
+            ttl=nsfw.get('pool ttl', 600),
+            low=nsfw.get('pool low', 10),
+            refill_limit=nsfw.get('refill limit', 2),
+            max_pools=nsfw.get('max pools', 256)
         )
         return cls(
             start_time=start_time, config=config,
             session_manager=session_manager, tag_matcher=tag_matcher,
-            data_manager=data_manager, logger=logger,
+            data_manager=data_manager, post_pool=post_pool, logger=logger,
             emojis=all_emojis
         )
 
+    def deadline(self) -> Deadline:
+        """
+        :return: a deadline for the requests of a command, command timeout
+        seconds from now.
+        """
+        return Deadline(self.command_timeout)
+
     @property
     def default_prefix(self):
         return self.config['Bot']['prefix']
@@ -115,6 +190,20 @@ class Hifumi(AutoShardedBot):
             self.get_channel(self.config['Bot']['error log']), header, tb
         )
 
+    async def close(self):
+        """
+        Write all pending data into the db before closing the bot.
+        Check :func:`discord.Client.close` for more details.
+        """
+        try:
+            await self.post_pool.close()
+            await self.data_manager.close()
+            await self.tag_matcher.close()
+            self.session_manager.cache.close()
+            self.translation_watcher.stop()
+        finally:
+            await super().close()
+
     async def process_commands(self, message):
         """
         Overwrites the process_commands method
@@ -123,11 +212,52 @@ class Hifumi(AutoShardedBot):
         """
         if message.author.bot:
             return
-        prefix = get_prefix(self, message)
-        name = message.content.split(' ')[0][len(prefix):]
+        first = message.content[:1]
+        starts = self.data_manager.prefix_starts
+        # Most messages are not commands, drop the ones that don't start
+        # with the first character of any prefix before looking anything up.
+        if starts is not None and '' not in starts and \
+                self.__default_start and first != self.__default_start and \
+                first not in starts:
+            return
+        if message.guild:
+            await self.data_manager.load_guild(message.guild.id)
+        if self.resolve_prefix(message)[1] is None:
+            return
         # TODO Implement command black list
         await super().process_commands(message)
 
+    def resolve_prefix(self, message) -> Tuple[str, Optional[str]]:
+        """
+        Get the command prefix and the command name of a message.
+        They are worked out once per message and shared by the prefix
+        lookups of process_commands, get_prefix and the message listener.
+        :param message: the discord message.
+        :return: the prefix and the command name, the name is None if the
+        message doesn't start with the prefix. The prefix is the default
+        prefix if the guild row of the message is not loaded.
+        """
+        content = message.content
+        resolved = self.__resolved.get(message.id)
+        if resolved is not None and resolved[0] == content:
+            return resolved[1], resolved[2]
+        prefix = get_prefix(self, message)
+        if content.startswith(prefix):
+            name = content[len(prefix):].split(' ', 1)[0]
+        else:
+            name = None
+        self.__resolved[message.id] = content, prefix, name
+        if len(self.__resolved) > 256:
+            self.__resolved.popitem(last=False)
+        return prefix, name
+
+    async def get_prefix(self, message):
+        """
+        Get the command prefix of a message from the resolved prefixes.
+        Check :func:`Bot.get_prefix` for more details.
+        """
+        return self.resolve_prefix(message)[0]
+
     def start_bot(self, cogs):
         """
         Start the bot.
@@ -142,11 +272,12 @@ class Hifumi(AutoShardedBot):
         """
         Get the language key of the context
         :param ctx_msg: the discord context object, or a message object
-        :return: the language key
+        :return: the language key, 'en' if there is no guild or the guild
+        row is not loaded
         """
         try:
             return self.data_manager.get_language(ctx_msg.guild.id)
-        except (TypeError, AttributeError):
+        except (TypeError, AttributeError, RowNotLoadedError):
             return 'en'
 
     def translate(self, ctx_msg: Union[Context, Message], file, key) -> str:
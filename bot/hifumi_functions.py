@@ -1,30 +1,51 @@
 from itertools import chain
 from logging import CRITICAL, ERROR, INFO
 
-from asyncpg import create_pool
 from discord.ext.commands import Context
 
-from data_controller import DataManager, TagMatcher
+from data_controller import DataManager, TagMatcher, WriteBuffer
 from data_controller.postgres import Postgres
 
 
-async def get_data_manager(pg_config: dict, logger) -> tuple:
+async def get_data_manager(
+        pg_config: dict, logger, shard_ids=None, shard_count=None) -> tuple:
     """
     Get an instance of DataManager and TagMatcher.
     :param pg_config: the postgres config info.
     :param logger: the logger.
+    :param shard_ids: the shard ids this process owns, optional.
+    :param shard_count: the total number of shards, optional.
     :return: a tuple of (DataManager, TagMatcher)
     """
-    pool = await create_pool(
+    post = await Postgres.create(
+        pg_config['schema'], logger,
         host=pg_config['host'], port=pg_config['port'], user=pg_config['user'],
-        database=pg_config['database'], password=pg_config['password']
+        database=pg_config['database'], password=pg_config['password'],
+        min_size=pg_config.get('pool min size', 10),
+        max_size=pg_config.get('pool max size', 10),
+        max_inactive_connection_lifetime=pg_config.get(
+            'pool max inactive connection lifetime', 300.0)
+    )
+    write_buffer = WriteBuffer(
+        post, logger,
+        interval=pg_config.get('flush interval', 5),
+        batch_size=pg_config.get('flush batch size', 500),
+        max_pending=pg_config.get('max pending writes', 5000)
+    )
+    data_manager = DataManager(
+        post, write_buffer,
+        cache_size=pg_config.get('cache size'),
+        cache_ttl=pg_config.get('cache ttl'),
+        preload_guilds=pg_config.get('preload guilds', True),
+        compact_rows=pg_config.get('compact rows', False)
+    )
+    tag_matcher = TagMatcher(
+        post, await post.get_tags(), pg_config.get('tag flush delay', 5),
+        pg_config.get('tag match cache size', 1024)
     )
-    post = Postgres(pool, pg_config['schema'], logger)
-    data_manager = DataManager(post)
-    tag_matcher = TagMatcher(post, await post.get_tags())
     logger.log(INFO, 'Connected to database: {}.{}'.format(
         pg_config['database'], pg_config['schema']))
-    await data_manager.init()
+    await data_manager.init(shard_ids, shard_count)
     return data_manager, tag_matcher
 
 
@@ -0,0 +1,84 @@
+"""
+Json decoding with the fastest json library installed.
+"""
+from asyncio import get_event_loop
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional, Tuple
+
+__all__ = ['JsonDecoder', 'find_loads']
+
+
+def find_loads(preferred: Optional[str] = None) -> Tuple[str, Callable]:
+    """
+    Find the json loads function to use.
+    :param preferred: the name of the json library to use, optional.
+    The fastest library installed is used if it's None or not installed.
+    :return: (the library name, its loads function)
+    """
+    names = ('orjson', 'ujson', 'rapidjson', 'json')
+    if preferred in names:
+        names = (preferred,) + names
+    for name in names:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        return name, module.loads
+
+
+class JsonDecoder:
+    """
+    Decode json content, content over the size threshold is decoded in an
+    executor.
+
+    The C decoders hold the GIL while they run, so decoding in a thread pool
+    only keeps the event loop free with a decoder that releases it or with a
+    process pool executor, see benchmarks/json_decode.py.
+    """
+    __slots__ = ['name', '__loads', '__threshold', '__executor',
+                 '__decoded', '__offloaded']
+
+    def __init__(self, preferred: Optional[str] = None,
+                 threshold: Optional[int] = None,
+                 executor: Optional[Executor] = None):
+        """
+        Initialize an instance of this class.
+        :param preferred: the name of the json library to use, the fastest
+        one installed is used if it's None or not installed.
+        :param threshold: the number of bytes over which content is decoded
+        in the executor, None to always decode on the event loop.
+        :param executor: the executor, the default executor of the event
+        loop is used if it's None.
+        """
+        self.name, self.__loads = find_loads(preferred)
+        self.__threshold = threshold
+        self.__executor = executor
+        self.__decoded = 0
+        self.__offloaded = 0
+
+    @property
+    def stats(self):
+        """
+        :return: a dict of the library name, the number of contents decoded
+        and the number of them decoded in the executor.
+        """
+        return {
+            'library': self.name,
+            'decoded': self.__decoded,
+            'offloaded': self.__offloaded
+        }
+
+    async def decode(self, content: bytes) -> Any:
+        """
+        Decode json content.
+        :param content: the content.
+        :return: the decoded content, None if the content is empty.
+        """
+        if not content:
+            return None
+        self.__decoded += 1
+        if self.__threshold is None or len(content) <= self.__threshold:
+            return self.__loads(content)
+        self.__offloaded += 1
+        return await get_event_loop().run_in_executor(
+            self.__executor, self.__loads, content)
@@ -0,0 +1,203 @@
+"""
+Client side rate limiting of HTTP requests.
+"""
+from asyncio import sleep
+from email.utils import parsedate_to_datetime
+from time import monotonic, time
+from typing import Dict, Optional, Tuple
+
+from bot.response_cache import SECRET_PARAMS
+
+__all__ = ['RateLimiter', 'parse_retry_after']
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header.
+    :param value: the header value, in seconds or as an HTTP date.
+    :return: the number of seconds to wait, None if the value is missing or
+    invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """
+    A token bucket, without a rate it only holds the time requests are
+    blocked until.
+    """
+    __slots__ = ['rate', 'burst', 'tokens', 'updated', 'blocked_until',
+                 'requests', 'waits', 'wait_time', 'rejected', 'limited']
+
+    def __init__(self, rate: Optional[float], burst: Optional[float]):
+        self.rate = rate
+        self.burst = burst or 1
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.rejected = 0
+        self.limited = 0
+
+    def refill(self, now: float):
+        if self.rate:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """
+        :param now: the current monotonic time.
+        :return: the time in seconds until a request can be made.
+        """
+        self.refill(now)
+        delay = self.blocked_until - now
+        if self.rate:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return max(delay, 0)
+
+    def block(self, now: float, seconds: float):
+        """
+        Block requests for some time.
+        :param now: the current monotonic time.
+        :param seconds: the time in seconds.
+        """
+        self.refill(now)
+        if self.rate:
+            # Requests already waiting keep their order after the block.
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+        else:
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimiter:
+    """
+    Rate limit requests with a token bucket per host and API key.
+
+    Requests wait for a token in order, a request that would have to wait
+    longer than the wait budget is rejected. A Retry-After sent by a host
+    blocks its requests for that long, for hosts without a configured rate
+    too.
+    """
+    __slots__ = ['__limits', '__wait_budget', '__buckets']
+
+    def __init__(self, limits: Dict[str, dict], wait_budget: float = 5):
+        """
+        Initialize an instance of this class.
+        :param limits: a dict of {host: {rate, burst}}, where rate is the
+        number of requests per second and burst is the number of requests
+        that can be made at once, which defaults to 1.
+        :param wait_budget: the maximum time in seconds a request waits.
+        """
+        self.__limits = limits
+        self.__wait_budget = wait_budget
+        self.__buckets: Dict[Tuple[str, str], _Bucket] = {}
+
+    @property
+    def wait_budget(self) -> float:
+        return self.__wait_budget
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: a dict of {host: stats} of the requests, the requests that
+        waited, the total wait time, the requests rejected for going over
+        the wait budget, and the responses with a status of 429.
+        The stats of different API keys of a host are added together.
+        """
+        res = {}
+        for (host, _), b in self.__buckets.items():
+            stats = res.setdefault(host, dict.fromkeys(
+                ('requests', 'waits', 'wait_time', 'rejected', 'limited'), 0))
+            stats['requests'] += b.requests
+            stats['waits'] += b.waits
+            stats['wait_time'] += b.wait_time
+            stats['rejected'] += b.rejected
+            stats['limited'] += b.limited
+        return res
+
+    @staticmethod
+    def __api_key(params: Optional[dict]) -> str:
+        """
+        :param params: the request parameters.
+        :return: the values of the secret parameters, which identify the API
+        key used.
+        """
+        if not params:
+            return ''
+        return ' '.join(
+            str(v) for k, v in sorted(params.items())
+            if k.lower() in SECRET_PARAMS and v is not None
+        )
+
+    def __bucket(self, host: str, params: Optional[dict],
+                 create: bool) -> Optional[_Bucket]:
+        """
+        Get the bucket of a request.
+        :param host: the host.
+        :param params: the request parameters.
+        :param create: True to create a bucket for hosts without a limit.
+        :return: the bucket if there is one.
+        """
+        key = host, self.__api_key(params)
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            limit = self.__limits.get(host)
+            if limit is None and not create:
+                return None
+            limit = limit or {}
+            bucket = self.__buckets[key] = _Bucket(
+                limit.get('rate'), limit.get('burst'))
+        return bucket
+
+    async def acquire(self, host: str, params: Optional[dict] = None,
+                      budget: Optional[float] = None) -> bool:
+        """
+        Wait until a request can be made.
+        :param host: the host of the request.
+        :param params: the request parameters.
+        :param budget: the maximum time in seconds to wait, defaults to the
+        wait budget.
+        :return: True if the request can be made, False if it would have to
+        wait longer than the budget.
+        """
+        bucket = self.__bucket(host, params, False)
+        if bucket is None:
+            return True
+        budget = self.__wait_budget if budget is None else budget
+        delay = bucket.delay(monotonic())
+        if delay > budget:
+            bucket.rejected += 1
+            return False
+        bucket.requests += 1
+        if bucket.rate:
+            bucket.tokens -= 1
+        if delay > 0:
+            bucket.waits += 1
+            bucket.wait_time += delay
+            await sleep(delay)
+        return True
+
+    def limited(self, host: str, params: Optional[dict],
+                retry_after: Optional[float]):
+        """
+        Record a response with a status of 429.
+        :param host: the host of the request.
+        :param params: the request parameters.
+        :param retry_after: the time in seconds the host asked to wait,
+        defaults to one second.
+        """
+        bucket = self.__bucket(host, params, True)
+        bucket.limited += 1
+        bucket.block(monotonic(), 1 if retry_after is None else retry_after)
@@ -0,0 +1,190 @@
+"""
+A cache for decoded HTTP responses.
+"""
+import shelve
+from collections import OrderedDict
+from hashlib import sha1
+from pathlib import Path
+from re import compile
+from time import time
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+__all__ = ['ResponseCache', 'SECRET_PARAMS']
+
+# Request parameters that are never part of a cache key.
+SECRET_PARAMS = frozenset(
+    ('appid', 'api_key', 'apikey', 'key', 'app_key', 'app_id', 'login',
+     'token', 'password')
+)
+
+
+class _Rule:
+    """
+    How long the responses of urls that match a pattern are cached.
+    """
+    __slots__ = ['pattern', 'ttl', 'stale']
+
+    def __init__(self, pattern: Pattern, ttl: float, stale: float):
+        self.pattern = pattern
+        self.ttl = ttl
+        self.stale = stale
+
+
+class ResponseCache:
+    """
+    A least recently used cache of decoded responses, only the urls that
+    match one of the cache rules are cached.
+
+    An entry is fresh for the ttl of its rule. After that it can still be
+    served for the stale time of its rule while it is fetched again in the
+    background. Entries pushed out of memory can be kept in a file on disk.
+    """
+    __slots__ = ['__rules', '__entries', '__max_size', '__spill',
+                 '__spill_path', '__hits', '__stale_hits', '__misses',
+                 '__spill_hits']
+
+    def __init__(self, rules: List[dict], max_size: int = 1024,
+                 spill_path: Optional[Path] = None):
+        """
+        Initialize an instance of this class.
+        :param rules: a list of dicts with a pattern, a regex matched
+        against the url, a ttl and optionally a stale time in seconds.
+        The first rule that matches a url is used.
+        :param max_size: the maximum number of entries kept in memory.
+        :param spill_path: the file entries pushed out of memory are kept
+        in, they are dropped if this is None.
+        """
+        assert max_size > 0
+        self.__rules = [
+            _Rule(compile(r['pattern']), r['ttl'], r.get('stale') or 0)
+            for r in rules
+        ]
+        self.__entries = OrderedDict()
+        self.__max_size = max_size
+        self.__spill = None
+        self.__spill_path = spill_path
+        self.__hits = 0
+        self.__stale_hits = 0
+        self.__misses = 0
+        self.__spill_hits = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: a dict of the cache size and its hit, stale hit, disk hit
+        and miss counts.
+        """
+        return {
+            'size': len(self.__entries),
+            'max_size': self.__max_size,
+            'hits': self.__hits,
+            'stale_hits': self.__stale_hits,
+            'spill_hits': self.__spill_hits,
+            'misses': self.__misses
+        }
+
+    def rule(self, url: str) -> Optional[_Rule]:
+        """
+        Get the cache rule of a url.
+        :param url: the url.
+        :return: the first rule that matches the url, None if the url is
+        not cached.
+        """
+        for rule in self.__rules:
+            if rule.pattern.search(url):
+                return rule
+        return None
+
+    @staticmethod
+    def key(url: str, params: Optional[dict]) -> str:
+        """
+        Get the cache key of a request, secret parameters in the url query
+        string and in the request parameters are left out.
+        :param url: the url.
+        :param params: the request parameters.
+        :return: the cache key.
+        """
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, True)
+        if params:
+            query.extend((k, str(v)) for k, v in params.items()
+                         if v is not None)
+        query = sorted(
+            (k, v) for k, v in query if k.lower() not in SECRET_PARAMS)
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def __spill_file(self) -> Optional[shelve.Shelf]:
+        """
+        :return: the shelf entries are spilled into, opened on first use.
+        None if there is no spill path.
+        """
+        if self.__spill is None and self.__spill_path is not None:
+            self.__spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self.__spill = shelve.open(str(self.__spill_path))
+        return self.__spill
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """
+        Get a cached response.
+        :param key: the cache key.
+        :return: (the response, True if it's fresh else False) if the
+        response is cached and not past its stale time, else None.
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            spill = self.__spill_file()
+            hashed = sha1(key.encode()).hexdigest()
+            if spill is not None and hashed in spill:
+                entry = spill.pop(hashed)
+                self.__spill_hits += 1
+                self.__put_entry(key, entry)
+        if entry is None:
+            self.__misses += 1
+            return None
+        value, fresh_until, stale_until = entry
+        now = time()
+        if now < fresh_until:
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return value, True
+        if now < stale_until:
+            self.__stale_hits += 1
+            self.__entries.move_to_end(key)
+            return value, False
+        del self.__entries[key]
+        self.__misses += 1
+        return None
+
+    def put(self, key: str, rule: _Rule, value):
+        """
+        Cache a response.
+        :param key: the cache key.
+        :param rule: the cache rule of the url.
+        :param value: the decoded response.
+        """
+        fresh_until = time() + rule.ttl
+        self.__put_entry(key, (value, fresh_until, fresh_until + rule.stale))
+
+    def __put_entry(self, key: str, entry: tuple):
+        """
+        Put an entry in memory, spill the least recently used entry if there
+        are too many.
+        :param key: the cache key.
+        :param entry: (value, fresh until, stale until)
+        """
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.__max_size:
+            old_key, old_entry = self.__entries.popitem(last=False)
+            spill = self.__spill_file()
+            if spill is not None and old_entry[2] > time():
+                spill[sha1(old_key.encode()).hexdigest()] = old_entry
+
+    def close(self):
+        """
+        Close the spill file.
+        """
+        if self.__spill is not None:
+            self.__spill.close()
+            self.__spill = None
@@ -1,8 +1,27 @@
+from asyncio import CancelledError, TimeoutError, ensure_future, wait_for
+from collections import Counter
 from http import HTTPStatus
 from io import BytesIO
-from json import loads
+from logging import WARN
+from math import ceil
+from typing import AsyncIterator, Awaitable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession, TCPConnector
+
+from bot.circuit_breaker import CircuitBreaker
+from bot.connection_stats import ConnectionStats
+from bot.deadline import Deadline
+from bot.json_decoder import JsonDecoder
+from bot.rate_limiter import RateLimiter, parse_retry_after
+from bot.response_cache import ResponseCache
+from bot.single_flight import SingleFlight
+
+try:
+    from aiohttp import ClientTimeout
+except ImportError:
+    # aiohttp < 3.3 takes the timeout in seconds.
+    ClientTimeout = None
 
 
 class HTTPStatusError(Exception):
@@ -17,28 +36,296 @@ class HTTPStatusError(Exception):
         return f'HTTPStatusError({self.code}, {self.msg})'
 
 
+class CircuitOpenError(HTTPStatusError):
+    """
+    Raised instead of making a request to a host whose circuit is open.
+    """
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(
+            503, f'{host} is unavailable, retry in {ceil(retry_in)} seconds')
+        self.host = host
+
+
+class RequestTimeoutError(HTTPStatusError):
+    """
+    Raised when a request runs out of time.
+    """
+
+    def __init__(self, host: str):
+        super().__init__(504, f'{host} did not answer in time')
+        self.host = host
+
+
 class SessionManager:
     """
     An aiohttp client session manager.
     """
-    __slots__ = ('session', 'logger', 'codes')
+    __slots__ = ('session', 'logger', 'codes', 'cache', 'single_flight',
+                 'connection_stats', 'rate_limiter', 'circuit_breaker',
+                 'max_download_size', 'json_decoder', 'request_timeout',
+                 '__host_sessions', '__revalidating',
+                 '__timeouts')
 
-    def __init__(self, session: ClientSession, logger):
+    def __init__(self, session: ClientSession, logger,
+                 cache: ResponseCache = None,
+                 host_sessions: Dict[str, ClientSession] = None,
+                 connection_stats: ConnectionStats = None,
+                 rate_limiter: RateLimiter = None,
+                 circuit_breaker: CircuitBreaker = None,
+                 max_download_size: int = 8 * 1024 * 1024,
+                 json_decoder: JsonDecoder = None,
+                 request_timeout: float = 10):
         """
         Initialize the instance of this class.
+        :param session: the aiohttp client session.
+        :param logger: the logger.
+        :param cache: the cache for json responses, optional.
+        :param host_sessions: a dict of {host: client session} for hosts that
+        have their own connection pool, optional.
+        :param connection_stats: the connection stats the sessions record
+        into, optional.
+        :param rate_limiter: the rate limiter for requests, optional.
+        :param circuit_breaker: the circuit breaker for requests, optional.
+        :param max_download_size: the default maximum number of bytes of a
+        download.
+        :param json_decoder: the decoder for json responses, a JsonDecoder
+        with the default settings is used if it's None.
+        :param request_timeout: the maximum time in seconds of each step of a
+        request, the time left before the deadline of the request is used if
+        it's shorter.
         """
         self.session = session
+        self.__host_sessions = host_sessions or {}
+        self.connection_stats = connection_stats
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.max_download_size = max_download_size
+        self.json_decoder = json_decoder or JsonDecoder()
+        self.request_timeout = request_timeout
+        self.__timeouts = Counter()
         self.logger = logger
         self.codes = {
             val.value: key
             for key, val in HTTPStatus.__members__.items()
         }
+        self.cache = cache
+        self.single_flight = SingleFlight()
+        self.__revalidating = set()
+
+    @classmethod
+    def create(cls, logger, cache: ResponseCache = None,
+               rate_limiter: RateLimiter = None,
+               circuit_breaker: CircuitBreaker = None, *,
+               limit: int = 100, limit_per_host: int = 0,
+               dns_cache_ttl: int = 300, keepalive_timeout: float = 30,
+               separate_hosts: Iterable[str] = (),
+               max_download_size: int = 8 * 1024 * 1024,
+               json_decoder: JsonDecoder = None,
+               request_timeout: float = 10):
+        """
+        Create an instance of this class with configured connection pools.
+        :param logger: the logger.
+        :param cache: the cache for json responses, optional.
+        :param rate_limiter: the rate limiter for requests, optional.
+        :param circuit_breaker: the circuit breaker for requests, optional.
+        :param limit: the maximum number of connections per pool, 0 for no
+        limit.
+        :param limit_per_host: the maximum number of connections per host in
+        a pool, 0 for no limit.
+        :param dns_cache_ttl: the time in seconds DNS lookups are cached for,
+        None to cache them forever.
+        :param keepalive_timeout: the time in seconds an idle connection is
+        kept open for reuse.
+        :param separate_hosts: the hosts that get their own connection pool.
+        :param max_download_size: the default maximum number of bytes of a
+        download.
+        :param json_decoder: the decoder for json responses, optional.
+        :param request_timeout: the maximum time in seconds of each step of a
+        request.
+        :return: an instance of this class.
+        """
+        stats = ConnectionStats()
+        trace = stats.trace_config()
+
+        def make_session():
+            connector = TCPConnector(
+                limit=limit, limit_per_host=limit_per_host,
+                use_dns_cache=True, ttl_dns_cache=dns_cache_ttl,
+                keepalive_timeout=keepalive_timeout
+            )
+            if trace is None:
+                return ClientSession(connector=connector)
+            return ClientSession(connector=connector, trace_configs=[trace])
+
+        host_sessions = {host: make_session() for host in separate_hosts}
+        return cls(
+            make_session(), logger, cache, host_sessions, stats,
+            rate_limiter, circuit_breaker, max_download_size, json_decoder,
+            request_timeout
+        )
 
     def __del__(self):
         """
-        Class destructor, close the client session.
+        Class destructor, close the client sessions.
         """
         self.session.close()
+        for session in self.__host_sessions.values():
+            session.close()
+
+    @property
+    def timeouts(self) -> Dict[str, int]:
+        """
+        :return: a dict of {host: the number of requests that timed out}
+        """
+        return dict(self.__timeouts)
+
+    def __timeout(self, deadline: Optional[Deadline]) -> float:
+        """
+        :param deadline: the deadline of the request, optional.
+        :return: the timeout in seconds of the next step of a request.
+        """
+        if deadline is None:
+            return self.request_timeout
+        return deadline.timeout(self.request_timeout)
+
+    def __timed_out(self, host: str) -> RequestTimeoutError:
+        """
+        Record a request that timed out.
+        :param host: the host of the request.
+        :return: the error to raise.
+        """
+        self.__timeouts[host] += 1
+        return RequestTimeoutError(host)
+
+    def record_timeout(self, host: str) -> RequestTimeoutError:
+        """
+        Record a request to a host that timed out as a timeout and a failure
+        of the host, for requests that are not made by this class.
+        :param host: the host of the request.
+        :return: the error to raise.
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.failure(host)
+        return self.__timed_out(host)
+
+    async def __within(self, host: str, aw: Awaitable, timeout: float):
+        """
+        Wait for an awaitable, it's cancelled if it takes longer than the
+        timeout.
+        :param host: the host of the request the awaitable is part of.
+        :param aw: the awaitable.
+        :param timeout: the timeout in seconds.
+        :return: the result of the awaitable.
+        :raises RequestTimeoutError: if the awaitable took too long.
+        """
+        if timeout <= 0:
+            if hasattr(aw, 'close'):
+                aw.close()
+            raise self.__timed_out(host)
+        try:
+            return await wait_for(aw, timeout)
+        except TimeoutError:
+            raise self.__timed_out(host) from None
+
+    async def __request(self, method: str, url, retry: bool,
+                        deadline: Optional[Deadline], **kwargs):
+        """
+        Make an HTTP request, unless the circuit of the host is open.
+        Connection errors, timeouts and statuses of 500 and up count as
+        failures of the host.
+        :param method: the name of the client session method.
+        :param url: the url.
+        :param retry: True to retry once if the host answers with a status
+        of 429 and asks to wait less than the wait budget.
+        :param deadline: the deadline of the request, optional.
+        :param kwargs: the request kwargs.
+        :return: the client response.
+        :raises CircuitOpenError: if the circuit of the host is open.
+        :raises RequestTimeoutError: if the request timed out.
+        """
+        host = urlsplit(str(url)).hostname
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow(host):
+            raise CircuitOpenError(host, breaker.retry_in(host))
+        try:
+            resp = await self.__limited_request(
+                method, host, url, retry, deadline, **kwargs)
+        except TimeoutError:
+            raise self.record_timeout(host) from None
+        except RequestTimeoutError:
+            # The deadline passed waiting for the rate limit, it's already
+            # counted as a timeout.
+            if breaker is not None:
+                breaker.failure(host)
+            raise
+        except (ClientError, OSError):
+            if breaker is not None:
+                breaker.failure(host)
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.cancel(host)
+            raise
+        if breaker is not None:
+            if resp.status >= 500:
+                breaker.failure(host)
+            else:
+                breaker.success(host)
+        return resp
+
+    async def __limited_request(
+            self, method: str, host: str, url, retry: bool,
+            deadline: Optional[Deadline], **kwargs):
+        """
+        Make an HTTP request, rate limited by the rate limiter. Every
+        attempt gets the time left before the deadline as its timeout.
+        :param method: the name of the client session method.
+        :param host: the host of the url.
+        :param url: the url.
+        :param retry: True to retry once if the host answers with a status
+        of 429 and asks to wait less than the wait budget.
+        :param deadline: the deadline of the request, optional.
+        :param kwargs: the request kwargs.
+        :return: the client response.
+        :raises HTTPStatusError: if the request would wait longer than the
+        wait budget.
+        :raises RequestTimeoutError: if the deadline passed.
+        """
+        session = self.__host_sessions.get(host, self.session)
+        limiter = self.rate_limiter
+        params = kwargs.get('params')
+        while True:
+            timeout = self.__timeout(deadline)
+            if limiter is not None:
+                budget = min(limiter.wait_budget, timeout)
+                if not await limiter.acquire(host, params, budget):
+                    if budget < limiter.wait_budget:
+                        raise self.__timed_out(host)
+                    raise HTTPStatusError(429, self.codes.get(429))
+                timeout = self.__timeout(deadline)
+            if timeout <= 0:
+                raise self.__timed_out(host)
+            resp = await getattr(session, method)(
+                url, timeout=self.__client_timeout(timeout), **kwargs)
+            if limiter is None or resp.status != 429:
+                return resp
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            limiter.limited(host, params, retry_after)
+            if not retry or (retry_after or 0) > limiter.wait_budget:
+                return resp
+            resp.release()
+            retry = False
+
+    @staticmethod
+    def __client_timeout(timeout: float):
+        """
+        :param timeout: the timeout in seconds.
+        :return: the timeout argument of a client session request.
+        """
+        if ClientTimeout is None:
+            return timeout
+        return ClientTimeout(total=timeout)
 
     def return_response(self, res, code):
         """
@@ -52,34 +339,99 @@ class SessionManager:
             return res
         raise HTTPStatusError(code, self.codes.get(code, None))
 
-    async def __json_async(self, url, params, **kwargs):
+    async def __json_async(self, url, params, deadline=None, **kwargs):
         """
         Return the json content from an HTTP request using Aiohttp.
         :param url: the url.
         :param params: the request params.
+        :param deadline: the deadline of the request, optional.
         :return: the json content in a python dict.
         :raises HTTPStatusError: if the status code isn't in the 200s
         """
-        try:
-            res = await self.get(url, params=params, **kwargs)
-        except HTTPStatusError as e:
-            raise e
+        res = await self.get(url, params=params, deadline=deadline, **kwargs)
         async with res:
-            content = await res.read()
-            return loads(content) if content else None
+            content = await self.__within(
+                urlsplit(str(url)).hostname, res.read(),
+                self.__timeout(deadline)
+            )
+        return await self.json_decoder.decode(content)
+
+    async def __fetch_json(self, url, params, kwargs, deadline):
+        """
+        Get the json content from an HTTP request, concurrent requests with
+        the same url and params share one request.
+        :param url: the url.
+        :param params: the request params.
+        :param kwargs: the request kwargs, requests with kwargs are not
+        shared.
+        :param deadline: the deadline of the request, optional. A shared
+        request runs without it, callers stop waiting for it when their own
+        deadline passes.
+        :return: the json content in a python dict.
+        :raises HTTPStatusError: if the status code isn't in the 200s
+        """
+        if kwargs:
+            return await self.__json_async(url, params, deadline, **kwargs)
+        key = url, tuple(sorted(
+            (k, str(v)) for k, v in (params or {}).items()))
+        shared = self.single_flight.do(
+            key, lambda: self.__json_async(url, params))
+        if deadline is None:
+            return await shared
+        return await self.__within(
+            urlsplit(str(url)).hostname, shared, deadline.remaining())
 
-    async def get_json(self, url: str, params: dict = None, **kwargs):
+    async def get_json(self, url: str, params: dict = None,
+                       deadline: Deadline = None, **kwargs):
         """
         Get the json content from an HTTP request.
+        Responses of urls that match a cache rule are served from the cache,
+        concurrent requests with the same url and params share one request.
         :param url: the url.
         :param params: the request params.
+        :param deadline: the deadline of the request, optional.
         :return: the json content in a dict if success, else the error message.
         :raises HTTPStatusError: if the status code isn't in the 200s
+        :raises RequestTimeoutError: if the request timed out.
         """
-        return await self.__json_async(url, params, **kwargs)
+        rule = self.cache.rule(url) if self.cache is not None else None
+        if rule is None:
+            return await self.__fetch_json(url, params, kwargs, deadline)
+        key = self.cache.key(url, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            value, fresh = cached
+            if not fresh and key not in self.__revalidating:
+                self.__revalidating.add(key)
+                ensure_future(
+                    self.__revalidate(key, rule, url, params, kwargs))
+            return value
+        value = await self.__fetch_json(url, params, kwargs, deadline)
+        self.cache.put(key, rule, value)
+        return value
 
-    async def get(
-            self, url, *, allow_redirects=True, **kwargs) -> ClientResponse:
+    async def __revalidate(self, key, rule, url, params, kwargs):
+        """
+        Fetch a stale cached response again in the background.
+        :param key: the cache key.
+        :param rule: the cache rule of the url.
+        :param url: the url.
+        :param params: the request params.
+        :param kwargs: the request kwargs.
+        """
+        try:
+            value = await self.__fetch_json(url, params, kwargs, None)
+        except CancelledError:
+            raise
+        except Exception as e:
+            self.logger.log(WARN, f'Revalidating {url} failed: {e}')
+        else:
+            self.cache.put(key, rule, value)
+        finally:
+            self.__revalidating.discard(key)
+
+    async def get(self, url, *, allow_redirects=True,
+                  deadline: Deadline = None, **kwargs) -> ClientResponse:
         """
         Make HTTP GET request
 
@@ -88,6 +440,8 @@ class SessionManager:
         :param allow_redirects: If set to False, do not follow redirects.
         True by default (optional).
 
+        :param deadline: the deadline of the request (optional).
+
         :param kwargs: In order to modify inner request parameters,
         provide kwargs.
 
@@ -95,11 +449,14 @@ class SessionManager:
 
         :raises: HTTPStatusError if status code isn't between 200-299
         """
-        r = await self.session.get(
-            url, allow_redirects=allow_redirects, **kwargs)
+        r = await self.__request(
+            'get', url, True, deadline,
+            allow_redirects=allow_redirects, **kwargs
+        )
         return self.return_response(r, r.status)
 
-    async def post(self, url, *, data=None, **kwargs) -> ClientResponse:
+    async def post(self, url, *, data=None, deadline: Deadline = None,
+                   **kwargs) -> ClientResponse:
         """
         Make HTTP POST request.
 
@@ -108,6 +465,8 @@ class SessionManager:
         :param data: Dictionary, bytes, or file-like object to send in the
         body of the request (optional)
 
+        :param deadline: the deadline of the request (optional).
+
         :param kwargs: In order to modify inner request parameters,
         provide kwargs.
 
@@ -115,21 +474,74 @@ class SessionManager:
 
         :raises: HTTPStatusError if status code isn't between 200-299
         """
-        resp = await self.session.post(url, data=data, **kwargs)
+        resp = await self.__request(
+            'post', url, False, deadline, data=data, **kwargs)
         return self.return_response(resp, resp.status)
 
-    async def bytes_img(self, url) -> BytesIO:
+    def __too_large(self, max_size: int) -> HTTPStatusError:
+        """
+        :param max_size: the maximum number of bytes of the download.
+        :return: the error raised for a download that is too large.
         """
-        Convert an url image to BytesIO
+        return HTTPStatusError(
+            413, f'{self.codes[413]}, the limit is {max_size} bytes')
+
+    async def stream(self, url, max_size: int = None,
+                     chunk_size: int = 64 * 1024,
+                     deadline: Deadline = None) -> AsyncIterator[bytes]:
+        """
+        Download the content of an url in chunks.
         :param url: the url.
-        :return: a BytesIO object from the get request of the url.
+        :param max_size: the maximum number of bytes to download, defaults
+        to max_download_size.
+        :param chunk_size: the maximum number of bytes per chunk.
+        :param deadline: the deadline of the download, optional.
+        :return: an async iterator of the chunks of the content.
+        :raises HTTPStatusError: if status code isn't between 200-299, or
+        with a status of 413 if the content is larger than max_size.
+        :raises RequestTimeoutError: if the download timed out.
         """
-        resp = await self.get(url)
+        max_size = max_size or self.max_download_size
+        host = urlsplit(str(url)).hostname
+        resp = await self.get(url, deadline=deadline)
         async with resp:
-            try:
-                content = await resp.read()
-            except Exception as e:
+            length = resp.content_length
+            if length is not None and length > max_size:
+                raise self.__too_large(max_size)
+            read = 0
+            while True:
+                chunk = await self.__within(
+                    host, resp.content.read(chunk_size),
+                    self.__timeout(deadline)
+                )
+                if not chunk:
+                    break
+                read += len(chunk)
+                if read > max_size:
+                    raise self.__too_large(max_size)
+                yield chunk
+
+    async def bytes_img(self, url, max_size: int = None,
+                        deadline: Deadline = None) -> BytesIO:
+        """
+        Download an url image into a BytesIO, the download stops as soon as
+        it's larger than max_size.
+        :param url: the url.
+        :param max_size: the maximum number of bytes to download, defaults
+        to max_download_size.
+        :param deadline: the deadline of the download, optional.
+        :return: a BytesIO of the image, at position 0.
+        :raises HTTPStatusError: if status code isn't between 200-299, or
+        with a status of 413 if the image is larger than max_size.
+        """
+        buffer = BytesIO()
+        try:
+            async for chunk in self.stream(url, max_size, deadline=deadline):
+                buffer.write(chunk)
+        except BaseException as e:
+            buffer.close()
+            if not isinstance(e, (HTTPStatusError, CancelledError)):
                 self.logger.warn(str(e))
-                raise e
-            else:
-                return BytesIO(content)
+            raise
+        buffer.seek(0)
+        return buffer
@@ -0,0 +1,82 @@
+"""
+Coalescing of identical concurrent calls.
+"""
+from asyncio import CancelledError, Future, ensure_future, shield
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+__all__ = ['SingleFlight']
+
+
+class _Call:
+    """
+    A running call and the number of callers waiting for it.
+    """
+    __slots__ = ['task', 'waiters']
+
+    def __init__(self, task: Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Make concurrent calls with the same key share one running call, every
+    caller gets the result, or the exception, of that call.
+
+    A caller that is cancelled stops waiting without cancelling the shared
+    call, unless it was the last caller waiting for it.
+    """
+    __slots__ = ['__calls', '__started', '__coalesced']
+
+    def __init__(self):
+        self.__calls: Dict[Hashable, _Call] = {}
+        self.__started = 0
+        self.__coalesced = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: a dict of the number of calls started, the number of calls
+        that shared a running call, and the number of calls running.
+        """
+        return {
+            'started': self.__started,
+            'coalesced': self.__coalesced,
+            'in_flight': len(self.__calls)
+        }
+
+    def __done(self, key: Hashable, call: _Call):
+        """
+        Forget a call that is done.
+        :param key: the key of the call.
+        :param call: the call.
+        """
+        if self.__calls.get(key) is call:
+            del self.__calls[key]
+
+    async def do(self, key: Hashable,
+                 func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a call, or wait for the running call with the same key.
+        :param key: the key of the call.
+        :param func: a callable that returns the awaitable call.
+        :return: the result of the call.
+        :raises: any exception raised by the call.
+        """
+        call = self.__calls.get(key)
+        if call is None:
+            call = _Call(ensure_future(func()))
+            call.task.add_done_callback(lambda _: self.__done(key, call))
+            self.__calls[key] = call
+            self.__started += 1
+        else:
+            self.__coalesced += 1
+        call.waiters += 1
+        try:
+            return await shield(call.task)
+        except CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
@@ -29,6 +29,8 @@ class ChannelReader:
         ) or check_message(
             self.bot, message, self.bot.mention_nick + ' prefix'
         ):
+            if message.guild:
+                await self.bot.data_manager.load_guild(message.guild.id)
             prefix = get_prefix(self.bot, message)
             localize = self.bot.localize(message)
             await self.bot.send_message(
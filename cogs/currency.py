@@ -49,6 +49,7 @@ class Currency:
             member_id = int(member.id)
             localize_key = 'balance_other'
             name = member.display_name
+        await self.bot.data_manager.load_user(member_id)
         balance = self.bot.data_manager.get_user_balance(member_id) or 0
         await self.bot.say(
             (self.bot.localize(ctx))[localize_key].format(
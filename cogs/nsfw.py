@@ -35,7 +35,42 @@ class Nsfw:
             site, query, localize,
             self.bot.tag_matcher,
             str(dan['username']),
-            str(dan['key'])
+            str(dan['key']),
+            self.bot.post_pool,
+            self.bot.search_semaphores,
+            self.bot.deadline()
+        )
+        await self.bot.say(res)
+        if tags:
+            await self.bot.tag_matcher.add_tags(site, tags)
+
+    @commands.command(pass_context=True)
+    @commands.check(is_nsfw)
+    @commands.check(no_badword)
+    @commands.cooldown(rate=1, per=5, type=commands.BucketType.server)
+    async def lewd(self, ctx, *query: str):
+        """
+        Search several sites at once and show the first result found.
+        :param ctx: the discord context
+        :param query: the sarch queries
+        """
+        dan = self.bot.config['API keys']['danbooru']
+        nsfw = self.bot.config.get('NSFW') or {}
+        # Danbooru needs an API key and allows two tags at most.
+        use_dan = dan['username'] and dan['key'] and len(query) <= 2
+        sites = [
+            site for site in nsfw.get('fan out sites') or ()
+            if use_dan or site != 'danbooru'
+        ] or ['konachan', 'yandere']
+        res, site, tags = await get_lewd_any(
+            self.bot.session_manager,
+            sites, query, self.bot.localize(ctx),
+            self.bot.tag_matcher,
+            str(dan['username']),
+            str(dan['key']),
+            self.bot.post_pool,
+            self.bot.search_semaphores,
+            self.bot.deadline()
         )
         await self.bot.say(res)
         if tags:
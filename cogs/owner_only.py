@@ -39,6 +39,8 @@ class OwnerOnly:
         Events for reading messages
         :param message: the message
         """
+        if message.guild:
+            await self.bot.data_manager.load_guild(message.guild.id)
         prefix = get_prefix(self.bot, message)
         token = str(self.bot.config['Bot']['token'])
         if check_message_startwith(self.bot, message, '{}eval'.format(prefix)):
@@ -102,7 +102,8 @@ class Utilities:
         """
         res = await imdb(
             ' '.join(query), self.imdb_api,
-            self.bot.localize(ctx)
+            self.bot.localize(ctx), self.bot.session_manager,
+            self.bot.deadline()
         )
         if isinstance(res, Embed):
             await self.bot.say(embed=res)
@@ -127,4 +127,14 @@ async def build_info_embed(ctx, bot):
     embed.add_field(name=lan['users'], value=user_count)
     embed.add_field(name=lan['text_channels'], value=text_count)
     embed.add_field(name=lan['voice_channels'], value=voice_count)
+
+    breaker = bot.session_manager.circuit_breaker
+    states = breaker.states if breaker is not None else None
+    if states:
+        embed.add_field(
+            name=lan['api_status'],
+            value='\n'.join(f'{host}: {state}'
+                            for host, state in sorted(states.items())),
+            inline=False
+        )
     return embed
@@ -18,6 +18,7 @@ async def daily(data_manager: DataManager, user_id: int, localize):
     :param localize: the localization strings
     :return: the daily command message
     """
+    await data_manager.load_user(user_id)
     current_daily = data_manager.get_user_daily(user_id)
     first_time = current_daily is None
     delta = 500 if first_time else 200
@@ -124,6 +125,7 @@ async def determine_slot_result(
     else:
         res = localize['slots_draw']
         await change_balance(data_manager, user_id, amount)
+    await data_manager.load_user(user_id)
     return res + '\n' + localize['new_balance'].format(
         data_manager.get_user_balance(user_id)
     )
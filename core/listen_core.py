@@ -8,7 +8,6 @@ from discord.abc import Messageable
 from discord.ext.commands import Context
 
 from bot import HTTPStatusError
-from data_controller.data_utils import get_prefix
 
 
 async def try_change_presence(
@@ -196,7 +195,9 @@ async def process_message(bot, message):
     author = message.author
     content = message.content
     channel = message.channel
-    prefix = get_prefix(bot, message)
+    if message.guild:
+        await bot.data_manager.load_guild(message.guild.id)
+    prefix, _ = bot.resolve_prefix(message)
     if (author.bot or
             content.startswith(prefix) or
             not isinstance(content, str) or
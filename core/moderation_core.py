@@ -184,6 +184,7 @@ async def send_mod_log(ctx, bot: Hifumi, action: str, member: Member,
     """
     localize = bot.localize(ctx)
     # FIXME Remove type casting when library rewrite is finished
+    await bot.data_manager.load_guild(int(ctx.message.server.id))
     mod_log = bot.data_manager.get_mod_log(int(ctx.message.server.id))
     if mod_log:
         entry = generate_mod_log_entry(
@@ -211,6 +212,7 @@ async def warn_pardon(bot: Hifumi, ctx, reason: str, member: Member,
     guild_id = int(ctx.message.server.id)
     member_id = int(ctx.message.author.id)
     data_manager = bot.data_manager
+    await data_manager.load_member(member_id, guild_id)
     warn_count = data_manager.get_member_warns(member_id, guild_id) or 0
     if is_warn:
         new_warn_count = warn_count + 1
@@ -1,14 +1,20 @@
 """
 NSFW functions
 """
+from asyncio import FIRST_COMPLETED, Future, Semaphore, TimeoutError, \
+    ensure_future, wait, wait_for
 from random import choice
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from bot import HTTPStatusError, SessionManager
+from bot import HTTPStatusError, RequestTimeoutError, SessionManager
+from bot.deadline import Deadline
+from core.post_pool import PostPool
 from data_controller.tag_matcher import TagMatcher
 from scripts.helpers import flatten
 
-__all__ = ['get_lewd', 'greenteaneko']
+__all__ = ['get_lewd', 'get_lewd_any', 'greenteaneko']
+
+__SITES = ('danbooru', 'konachan', 'yandere', 'e621', 'gelbooru', 'rule34')
 
 
 def __parse_query(query: Tuple[str]) -> tuple:
@@ -62,29 +68,43 @@ def __process_queries(
 
 
 async def __request_lewd(
-        tags: List[str], rating: Optional[str], url: str,
-        param: dict, site: str, session_manager: SessionManager,
-        tag_matcher: TagMatcher) -> tuple:
+        tags: List[str], rating: Optional[str], url: str, param: dict,
+        session_manager: SessionManager,
+        semaphore: Optional[Semaphore], deadline: Optional[Deadline]) -> list:
     """
     Make an HTTP request to a lewd site.
     :param tags: the list of tags for the search.
     :param rating: the rating of the search.
     :param url: the request url.
     :param param: the request parameters.
-    :param site: the site name.
     :param session_manager: the aiohttp session manager
-    :param tag_matcher: the TagMatcher object.
-    :return: a tuple of
-    (request response, tags that are in the TagMatcher db,
-    tags that are not in the TagMatcher db)
-    :raises: ClientResponseError if the status code isnt 200
+    :param semaphore: the semaphore that limits the requests to the site,
+    optional.
+    :param deadline: the deadline of the search, optional.
+    :return: the request response.
+    :raises: HTTPStatusError if the status code isnt 200
     """
-    safe_queries, unsafe_queries = __process_queries(
-        site, tags, tag_matcher)
-    combined = __combine(rating, '%20', safe_queries, unsafe_queries)
-    param['tags'] = combined
-    res = await session_manager.get_json(url, param)
-    return res, safe_queries, unsafe_queries
+    param = dict(param, tags=__combine(rating, '%20', tags))
+    if semaphore is None:
+        return await session_manager.get_json(url, param, deadline)
+    async with semaphore:
+        return await session_manager.get_json(url, param, deadline)
+
+
+async def __cancel(tasks: Iterable[Future]):
+    """
+    Cancel tasks and wait for them to finish, ignoring their results.
+    :param tasks: the tasks.
+    """
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await wait(tasks)
+    for task in tasks:
+        if not task.cancelled():
+            # Retrieve the exception so it's not logged as never retrieved.
+            task.exception()
 
 
 def __parse_post_list(
@@ -104,6 +124,75 @@ def __parse_post_list(
         return None, None
 
 
+def __parse_posts(
+        post_list: list, url_formatter: callable, tag_key) -> list:
+    """
+    Parse every post in the post list, posts that can't be parsed are
+    skipped.
+    :param post_list: the post list.
+    :param url_formatter: a callable to get the file url.
+    :param tag_key: the key to get the tag string.
+    :return: a list of (file url, list of tags)
+    """
+    posts = []
+    for post in post_list:
+        try:
+            posts.append((url_formatter(post), post[tag_key].split(' ')))
+        except KeyError:
+            continue
+    return posts
+
+
+async def __fetch_posts(
+        tags: List[str], rating: Optional[str], site: str, site_params,
+        session_manager: SessionManager, limit: int) -> list:
+    """
+    Get a page of parsed posts from a site.
+    :param tags: the search tags.
+    :param rating: the rating of the search.
+    :param site: the site name.
+    :param site_params: the function call parameters for the site.
+    :param session_manager: the aiohttp SessionManager.
+    :param limit: the number of posts to request.
+    :return: a list of (file url, list of tags)
+    """
+    url, url_formatter, tag_key, param = site_params
+    param = dict(param, limit=str(limit))
+    param['tags'] = __combine(rating, '%20', tags)
+    post_list = await session_manager.get_json(url, param)
+    if not post_list:
+        return []
+    return __parse_posts(post_list, url_formatter, tag_key)
+
+
+async def __pooled_lewd(
+        tags: List[str], rating: Optional[str], site: str, site_params,
+        tag_matcher: TagMatcher, session_manager: SessionManager,
+        post_pool: PostPool) -> tuple:
+    """
+    Get lewds from the pool of a search. Only searches with tags that are
+    all in the db are pooled, so misspelled searches don't fill the pools.
+    :param tags: the search tags.
+    :param rating: the rating of the search.
+    :param site: the site name.
+    :param site_params: the function call parameters for the site.
+    :param tag_matcher: the TagMatcher object.
+    :param session_manager: the aiohttp SessionManager.
+    :param post_pool: the PostPool object.
+    :return: a tuple of (file url, tags to write to the db) if there was a
+    post in the pool, else (None, None)
+    """
+    if not all(tag_matcher.tag_exist(site, t) for t in tags):
+        return None, None
+    post = await post_pool.take(
+        post_pool.key(site, tags, rating),
+        lambda: __fetch_posts(
+            tags, rating, site, site_params,
+            session_manager, post_pool.depth)
+    )
+    return post or (None, None)
+
+
 def __retry_search(
         site: str, safe_queries: List[str],
         unsafe_queries: List[str], tag_matcher: TagMatcher) -> list:
@@ -173,43 +262,115 @@ def __get_site_params(
 async def __get_lewd(
         tags: Optional[list], rating: Optional[str], site: str, site_params,
         tag_matcher: TagMatcher, session_manager: SessionManager,
-        limit=0, fuzzy=False) -> tuple:
+        semaphore: Optional[Semaphore] = None,
+        deadline: Optional[Deadline] = None) -> tuple:
     """
-    Get lewds from a site.
+    Get lewds from a site. If some of the tags are not in the db, a fuzzy
+    search with the tags matched from the db is made at the same time as the
+    search with the given tags, and is only used if the later finds nothing.
     :param tags: the search tags.
     :param rating: the rating of the search.
     :param site: the site name.
     :param site_params: the function call parameters for the site.
     :param tag_matcher: the TagMatcher object.
     :param session_manager: the aiohttp SessionManager.
-    :param limit: maximum recursion depth
-    :param fuzzy: whether the search was fuzzy or not.
+    :param semaphore: the semaphore that limits the requests to the site,
+    optional.
+    :param deadline: the deadline of the search, optional.
     :return: a tuple of
     (file url, tags used in the search, fuzzy, tags to write to the db)
     """
-    if limit > 2:
-        return (None,) * 4
     url, url_formatter, tag_key, param = site_params
-    post_list, safe_queries, unsafe_queries = await __request_lewd(
-        tags, rating, url, param, site, session_manager, tag_matcher)
-
-    if post_list:
-        file_url, tags_to_write = __parse_post_list(
-            post_list, url_formatter, tag_key)
-        return file_url, safe_queries + unsafe_queries, fuzzy, tags_to_write
-    retry = __retry_search(site, safe_queries, unsafe_queries, tag_matcher)
-    if retry:
-        return await __get_lewd(
-            retry, rating, site, site_params,
-            tag_matcher, session_manager, limit + 1, True
-        )
+    safe_queries, unsafe_queries = __process_queries(site, tags, tag_matcher)
+    searches = [(safe_queries + unsafe_queries, False)]
+    if unsafe_queries:
+        retry = __retry_search(site, safe_queries, unsafe_queries, tag_matcher)
+        if retry:
+            searches.append((retry, True))
+    tasks = [
+        ensure_future(__request_lewd(
+            search_tags, rating, url, param, session_manager, semaphore,
+            deadline
+        ))
+        for search_tags, _ in searches
+    ]
+    try:
+        for task, (search_tags, fuzzy) in zip(tasks, searches):
+            post_list = await task
+            if post_list:
+                file_url, tags_to_write = __parse_post_list(
+                    post_list, url_formatter, tag_key)
+                return file_url, search_tags, fuzzy, tags_to_write
+    finally:
+        await __cancel(t for t in tasks if not t.done())
     return (None,) * 4
 
 
+async def __search_site(
+        site: str, tags: List[str], rating: Optional[str],
+        tag_matcher: TagMatcher, session_manager: SessionManager,
+        user: Optional[str], api_key: Optional[str],
+        post_pool: Optional[PostPool],
+        semaphores: Optional[Dict[str, Semaphore]],
+        deadline: Optional[Deadline]) -> tuple:
+    """
+    Search a site, from the pool of the search if there is one.
+    :param site: the site name.
+    :param tags: the search tags.
+    :param rating: the rating of the search.
+    :param tag_matcher: the TagMatcher object.
+    :param session_manager: the aiohttp SessionManager.
+    :param user: the danbooru username, not required for other sites.
+    :param api_key: the danbooru api key, not required for other sites.
+    :param post_pool: the PostPool object, optional.
+    :param semaphores: the semaphores that limit the requests to each site,
+    optional.
+    :param deadline: the deadline of the search, optional.
+    :return: a tuple of
+    (file url, tags used in the search, fuzzy, tags to write to the db)
+    """
+    site_params = __get_site_params(site, api_key, user)
+    if post_pool is not None:
+        file_url, tags_to_write = await __pooled_lewd(
+            tags, rating, site, site_params, tag_matcher,
+            session_manager, post_pool
+        )
+        if file_url:
+            return file_url, tags, False, tags_to_write
+    semaphore = semaphores[site] if semaphores is not None else None
+    return await __get_lewd(
+        tags, rating, site, site_params, tag_matcher,
+        session_manager, semaphore, deadline
+    )
+
+
+def __lewd_message(
+        site: str, search_query: tuple, localize: dict, file_url: str,
+        searched_tags: List[str], fuzzy: bool) -> str:
+    """
+    Get the message to send for a search result.
+    :param site: the site name.
+    :param search_query: the search query.
+    :param localize: the localization strings.
+    :param file_url: the file url.
+    :param searched_tags: the tags used in the search.
+    :param fuzzy: whether the search was fuzzy or not.
+    :return: the message with the file url.
+    """
+    if fuzzy:
+        return localize['nsfw_fuzzy'].format(
+            site.title(), ', '.join(searched_tags)) + file_url
+    if not search_query:
+        return localize['random_nsfw'] + '\n' + file_url
+    return file_url
+
+
 async def get_lewd(
         session_manager: SessionManager, site: str, search_query: tuple,
         localize: dict, tag_matcher: TagMatcher, user=None,
-        api_key=None) -> tuple:
+        api_key=None, post_pool: PostPool = None,
+        semaphores: Dict[str, Semaphore] = None,
+        deadline: Deadline = None) -> tuple:
     """
     Get lewd picture you fucking perverts.
     :param session_manager: the aiohttp SessionManager.
@@ -219,28 +380,34 @@ async def get_lewd(
     :param tag_matcher: the TagMatcher object.
     :param user: the danbooru username, not required for other sites.
     :param api_key: the danbooru api key, not required for other sites.
+    :param post_pool: the PostPool object, searches are not pooled if this
+    is None.
+    :param semaphores: the semaphores that limit the requests to each site,
+    optional.
+    :param deadline: the deadline of the search, the search is cancelled
+    when it passes, optional.
     :return: a tuple of
     (the message with the file url to send, a list of tags to write to the db)
     """
-    assert (
-        site in (
-            'danbooru', 'konachan', 'yandere', 'e621', 'gelbooru', 'rule34'
-        )
-    )
+    assert site in __SITES
     assert (user and api_key) or site != 'danbooru'
     tags, rating = __parse_query(search_query)
-    site_params = __get_site_params(site, api_key, user)
-
+    search = __search_site(
+        site, tags, rating, tag_matcher, session_manager, user, api_key,
+        post_pool, semaphores, deadline
+    )
     try:
-        file_url, searched_tags, fuzzy, tags_to_write = await __get_lewd(
-            tags, rating, site, site_params, tag_matcher, session_manager)
+        if deadline is not None:
+            # Also cancels the search while it waits for the pool or for
+            # the semaphore of the site.
+            search = wait_for(search, deadline.remaining())
+        try:
+            file_url, searched_tags, fuzzy, tags_to_write = await search
+        except TimeoutError:
+            raise RequestTimeoutError(site) from None
         if file_url:
-            msg = file_url
-            if fuzzy:
-                msg = localize['nsfw_fuzzy'].format(
-                    site.title(), ', '.join(searched_tags)) + file_url
-            elif not search_query:
-                msg = localize['random_nsfw'] + '\n' + file_url
+            msg = __lewd_message(
+                site, search_query, localize, file_url, searched_tags, fuzzy)
             return msg, tags_to_write
         else:
             return localize['nothing_found'], None
@@ -249,6 +416,73 @@ async def get_lewd(
         return error, None
 
 
+async def get_lewd_any(
+        session_manager: SessionManager, sites: List[str],
+        search_query: tuple, localize: dict, tag_matcher: TagMatcher,
+        user=None, api_key=None, post_pool: PostPool = None,
+        semaphores: Dict[str, Semaphore] = None,
+        deadline: Deadline = None) -> tuple:
+    """
+    Search several sites at the same time and use the first result found,
+    the searches that are still running are cancelled.
+    :param session_manager: the aiohttp SessionManager.
+    :param sites: the site names.
+    :param search_query: the search query.
+    :param localize: the localization strings.
+    :param tag_matcher: the TagMatcher object.
+    :param user: the danbooru username, not required for other sites.
+    :param api_key: the danbooru api key, not required for other sites.
+    :param post_pool: the PostPool object, searches are not pooled if this
+    is None.
+    :param semaphores: the semaphores that limit the requests to each site,
+    optional.
+    :param deadline: the deadline of the searches, the searches that are
+    still running are cancelled when it passes, optional.
+    :return: a tuple of (the message with the file url to send,
+    the site of the result, a list of tags to write to the db)
+    """
+    assert sites and all(site in __SITES for site in sites)
+    assert (user and api_key) or 'danbooru' not in sites
+    tags, rating = __parse_query(search_query)
+    pending = {
+        ensure_future(__search_site(
+            site, tags, rating, tag_matcher, session_manager, user, api_key,
+            post_pool, semaphores, deadline
+        )): site for site in sites
+    }
+    timeout = deadline.remaining if deadline is not None else lambda: None
+    error = None
+    try:
+        while pending:
+            done, _ = await wait(
+                pending, timeout=timeout(), return_when=FIRST_COMPLETED)
+            if not done:
+                site = next(iter(pending.values()))
+                error = error or (site, RequestTimeoutError(site))
+                break
+            for task in done:
+                site = pending.pop(task)
+                try:
+                    file_url, searched_tags, fuzzy, tags_to_write = \
+                        task.result()
+                except HTTPStatusError as e:
+                    error = error or (site, e)
+                    continue
+                if file_url:
+                    msg = __lewd_message(
+                        site, search_query, localize, file_url,
+                        searched_tags, fuzzy
+                    )
+                    return msg, site, tags_to_write
+    finally:
+        await __cancel(pending)
+    if error:
+        site, e = error
+        return localize['api_error'].format(site.title()) + f'\n{e}', \
+            None, None
+    return localize['nothing_found'], None, None
+
+
 async def greenteaneko(localize, session_manager: SessionManager):
     """
     Get a random green tea neko comic
@@ -0,0 +1,212 @@
+"""
+Pools of prefetched nsfw posts.
+"""
+from asyncio import CancelledError, Semaphore, ensure_future, shield
+from collections import OrderedDict
+from logging import WARN
+from random import randrange
+from time import monotonic
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, \
+    Tuple
+
+__all__ = ['PostPool']
+
+# (site, search tags, rating)
+PoolKey = Tuple[str, FrozenSet[str], Optional[str]]
+# (file url, list of tags)
+Post = Tuple[str, List[str]]
+
+
+class _Pool:
+    """
+    The posts of one search and the task refilling them.
+    """
+    __slots__ = ['posts', 'expires', 'task']
+
+    def __init__(self):
+        self.posts: List[Post] = []
+        self.expires = 0.0
+        self.task = None
+
+
+class PostPool:
+    """
+    Keep the parsed posts of a search page in memory, so a search is served
+    from memory until its pool runs low and is refilled in the background.
+
+    Pools are keyed by (site, search tags, rating), only the most recently
+    used pools are kept.
+    """
+    __slots__ = ['__logger', '__depth', '__ttl', '__low', '__max_pools',
+                 '__refill_limit', '__pools', '__semaphores', '__hits',
+                 '__misses', '__refills']
+
+    def __init__(self, logger, depth: int = 50, ttl: float = 600,
+                 low: int = 10, refill_limit: int = 2, max_pools: int = 256):
+        """
+        Initialize an instance of this class.
+        :param logger: the logger.
+        :param depth: the number of posts requested per refill.
+        :param ttl: the time in seconds before the posts of a refill expire.
+        :param low: the number of posts left in a pool that starts a refill.
+        :param refill_limit: the maximum number of refills running at the
+        same time per site.
+        :param max_pools: the maximum number of pools kept in memory.
+        """
+        assert depth > 0 and ttl > 0 and refill_limit > 0 and max_pools > 0
+        self.__logger = logger
+        self.__depth = depth
+        self.__ttl = ttl
+        self.__low = low
+        self.__max_pools = max_pools
+        self.__refill_limit = refill_limit
+        self.__pools: Dict[PoolKey, _Pool] = OrderedDict()
+        self.__semaphores: Dict[str, Semaphore] = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__refills = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: the number of posts requested per refill.
+        """
+        return self.__depth
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: a dict of the number of pools, the number of posts in them,
+        and the hit, miss and refill counts.
+        """
+        return {
+            'pools': len(self.__pools),
+            'posts': sum(len(p.posts) for p in self.__pools.values()),
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'refills': self.__refills
+        }
+
+    @staticmethod
+    def key(site: str, tags: List[str], rating: Optional[str]) -> PoolKey:
+        """
+        Get the pool key of a search.
+        :param site: the site name.
+        :param tags: the search tags.
+        :param rating: the rating of the search.
+        :return: the pool key.
+        """
+        return site, frozenset(t.lower() for t in tags), rating
+
+    def __get_pool(self, key: PoolKey) -> _Pool:
+        """
+        Get the pool of a key, make one if there is none.
+        :param key: the pool key.
+        :return: the pool.
+        """
+        try:
+            pool = self.__pools[key]
+        except KeyError:
+            pool = self.__pools[key] = _Pool()
+            if len(self.__pools) > self.__max_pools:
+                self.__drop_oldest()
+        else:
+            self.__pools.move_to_end(key)
+        if pool.posts and pool.expires <= monotonic():
+            pool.posts.clear()
+        return pool
+
+    def __drop_oldest(self):
+        """
+        Drop the least recently used pool that is not being refilled.
+        """
+        for key, pool in self.__pools.items():
+            if pool.task is None:
+                del self.__pools[key]
+                return
+
+    async def __refill(
+            self, key: PoolKey, pool: _Pool,
+            fetch: Callable[[], Awaitable[List[Post]]]):
+        """
+        Refill a pool.
+        :param key: the pool key.
+        :param pool: the pool.
+        :param fetch: a callable that returns the awaitable list of posts.
+        """
+        site = key[0]
+        if site not in self.__semaphores:
+            self.__semaphores[site] = Semaphore(self.__refill_limit)
+        try:
+            async with self.__semaphores[site]:
+                posts = await fetch()
+            self.__refills += 1
+            if posts:
+                pool.posts = posts
+                pool.expires = monotonic() + self.__ttl
+        except CancelledError:
+            raise
+        except Exception as e:
+            self.__logger.log(WARN, f'Refilling {site} posts failed: {e}')
+        finally:
+            pool.task = None
+
+    def __start_refill(self, key: PoolKey, pool: _Pool, fetch):
+        """
+        Start refilling a pool if it's not being refilled already.
+        :param key: the pool key.
+        :param pool: the pool.
+        :param fetch: a callable that returns the awaitable list of posts.
+        """
+        if pool.task is None:
+            pool.task = ensure_future(self.__refill(key, pool, fetch))
+
+    async def take(
+            self, key: PoolKey,
+            fetch: Callable[[], Awaitable[List[Post]]]) -> Optional[Post]:
+        """
+        Take a random post out of a pool. If the pool is empty, wait for it
+        to be refilled, if it's running low, start refilling it.
+        :param key: the pool key.
+        :param fetch: a callable that returns the awaitable list of the
+        posts of a search, with at most depth posts.
+        :return: a post if there is any, else None.
+        """
+        pool = self.__get_pool(key)
+        if pool.posts:
+            self.__hits += 1
+        else:
+            self.__misses += 1
+            self.__start_refill(key, pool, fetch)
+            task = pool.task
+            # The refill is shared by every caller waiting on the pool, so a
+            # cancelled caller must not cancel it for the others.
+            try:
+                await shield(task)
+            except CancelledError:
+                if not task.cancelled():
+                    raise
+                # The refill itself was cancelled by close.
+                return None
+            if not pool.posts:
+                return None
+        posts = pool.posts
+        i = randrange(len(posts))
+        posts[i], posts[-1] = posts[-1], posts[i]
+        post = posts.pop()
+        if len(posts) <= self.__low:
+            self.__start_refill(key, pool, fetch)
+        return post
+
+    async def close(self):
+        """
+        Cancel all running refills.
+        """
+        tasks = [p.task for p in self.__pools.values() if p.task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except CancelledError:
+                pass
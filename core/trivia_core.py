@@ -346,5 +346,6 @@ async def _handle_bet(**kwargs):
     else:
         delta = amount
     key = 'trivia_correct_balance' if correct else 'trivia_wrong_balance'
+    await data_manager.load_user(user_id)
     return localize[key].format(
         delta, data_manager.get_user_balance(user_id))
@@ -1,6 +1,7 @@
 """
 Functions for Utilities commands
 """
+from asyncio import TimeoutError, get_event_loop, wait_for
 from json import JSONDecodeError
 from random import randint
 
@@ -8,6 +9,7 @@ from discord.embeds import Embed, EmptyEmbed
 from imdbpie import Imdb
 
 from bot import HTTPStatusError, SessionManager
+from bot.deadline import Deadline
 from scripts.helpers import code_block
 
 
@@ -37,21 +39,36 @@ async def number_fact(num, localize, session_manager: SessionManager):
         return localize['api_error'].format('Numbers Fact') + f'\n{e}'
 
 
-async def imdb(query, api: Imdb, localize):
+async def imdb(query, api: Imdb, localize, session_manager: SessionManager,
+               deadline: Deadline = None):
     """
     Send an api request to imdb using the search query
     :param query: the search query
     :param api: the imdb api object
     :param localize: the localization strings
+    :param session_manager: the SessionManager, timeouts are recorded in it
+    :param deadline: the deadline of the search, optional
     :return: the result
     """
     # FIXME: Use Aiohttp instead of this api wrapper
+    loop = get_event_loop()
+
+    async def call(func, *args):
+        # The api wrapper blocks, so it runs in the default executor. A call
+        # that runs past the deadline can't be stopped, it's left to finish
+        # in its thread while the command stops waiting for it.
+        fut = loop.run_in_executor(None, func, *args)
+        if deadline is None:
+            return await fut
+        return await wait_for(fut, deadline.remaining())
+
     try:
         names = lambda x: ', '.join((p.name for p in x)) if x else 'N/A'
         null_check = lambda x: x if x and not isinstance(x, int) else 'N/A'
-        id_ = api.search_for_title(query)[0]['imdb_id']
-        res = api.get_title_by_id(id_)
-        eps = api.get_episodes(id_) if res.type == 'tv_series' else None
+        id_ = (await call(api.search_for_title, query))[0]['imdb_id']
+        res = await call(api.get_title_by_id, id_)
+        eps = await call(api.get_episodes, id_) \
+            if res.type == 'tv_series' else None
         ep_count = len(eps) if eps is not None else None
         season_count = eps[-1].season if eps is not None else None
         title = null_check(res.title)
@@ -98,6 +115,9 @@ async def imdb(query, api: Imdb, localize):
 
     except (JSONDecodeError, IndexError):
         return localize['title_not_found']
+    except TimeoutError:
+        return localize['api_error'].format('IMDb') + \
+            f'\n{session_manager.record_timeout("imdb.com")}'
 
 
 async def recipe_search(
@@ -1,6 +1,7 @@
 from data_controller.data_manager import DataManager
 from data_controller.errors import *
 from data_controller.tag_matcher import TagMatcher
+from data_controller.write_buffer import WriteBuffer
 
-__all__ = ['DataManager', 'TagMatcher', 'LowBalanceError',
-           'NegativeTransferError']
+__all__ = ['DataManager', 'TagMatcher', 'WriteBuffer', 'LowBalanceError',
+           'NegativeTransferError', 'RowNotLoadedError']
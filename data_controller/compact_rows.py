@@ -0,0 +1,204 @@
+"""
+Compact storage for the rows in the member_info and user_info tables.
+"""
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Sequence
+
+from data_controller.compact_table import CompactTable, NULL
+from data_controller.data_rows import _MemberRow, _UserRow
+
+__all__ = ['CompactMemberRows', 'CompactUserRows']
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_int(val: Optional[int]) -> int:
+    return NULL if val is None else val
+
+
+def _from_int(val: int) -> Optional[int]:
+    return None if val == NULL else val
+
+
+def _to_micros(time_stamp: Optional[datetime]) -> int:
+    """
+    :param time_stamp: a naive datetime.
+    :return: the microseconds since the epoch, NULL if time_stamp is None.
+    """
+    if time_stamp is None:
+        return NULL
+    return (time_stamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> Optional[datetime]:
+    """
+    :param micros: the microseconds since the epoch.
+    :return: the naive datetime, None if micros is NULL.
+    """
+    if micros == NULL:
+        return None
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class _CompactRows:
+    """
+    A dict like container of rows that keeps the row values in a
+    CompactTable and makes the row objects on access.
+
+    The rows made by this class write through this class, so their new
+    values are stored in the table before they are passed on to the writer.
+    """
+    __slots__ = ['_table', '_writer']
+
+    def __init__(self, writer, key_width: int, column_count: int):
+        """
+        Initialize an instance of this class.
+        :param writer: the postgres controller, or a WriteBuffer.
+        :param key_width: the number of ints in a key.
+        :param column_count: the number of value columns.
+        """
+        self._writer = writer
+        self._table = CompactTable(key_width, column_count)
+
+    def __len__(self):
+        return len(self._table)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: the number of bytes used to store the rows.
+        """
+        return self._table.nbytes
+
+    def _key(self, key) -> tuple:
+        """
+        :param key: a DataManager row key.
+        :return: the key in the table.
+        """
+        raise NotImplementedError
+
+    def _row(self, key: tuple, values: tuple):
+        """
+        Make a row object.
+        :param key: the key in the table.
+        :param values: the values in the table.
+        :return: the row object.
+        """
+        raise NotImplementedError
+
+    def _store(self, row_val: Sequence):
+        """
+        Store the values of a row into the table.
+        :param row_val: the row values, as they are stored in the db.
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        k = self._key(key)
+        values = self._table.get(k)
+        if values is None:
+            raise KeyError(key)
+        return self._row(k, values)
+
+    def __setitem__(self, key, row):
+        self._store(row._row)
+
+    def __contains__(self, key):
+        return self._key(key) in self._table
+
+    def pop(self, key, default=None):
+        k = self._key(key)
+        values = self._table.pop(k)
+        return default if values is None else self._row(k, values)
+
+    def keys(self) -> Iterator:
+        raise NotImplementedError
+
+
+class CompactMemberRows(_CompactRows):
+    """
+    Compact storage for rows in the member_info table, keyed by
+    (member id, guild id).
+    """
+    __slots__ = []
+
+    def __init__(self, writer):
+        """
+        Initialize an instance of this class.
+        :param writer: the postgres controller, or a WriteBuffer.
+        """
+        super().__init__(writer, 2, 1)
+
+    def _key(self, key) -> tuple:
+        return key
+
+    def _row(self, key: tuple, values: tuple) -> _MemberRow:
+        row_val = (str(key[0]), str(key[1]), _from_int(values[0]))
+        return _MemberRow(self, row_val)
+
+    def _store(self, row_val: Sequence):
+        key = (int(row_val[0]), int(row_val[1]))
+        self._table.put(key, (_to_int(row_val[2]),))
+
+    def keys(self) -> Iterator[tuple]:
+        return self._table.keys()
+
+    async def set_member(self, values: Sequence):
+        """
+        Store a member row and pass it on to the writer.
+        :param values: the values of that row.
+        """
+        self._store(values)
+        await self._writer.set_member(values)
+
+
+class CompactUserRows(_CompactRows):
+    """
+    Compact storage for rows in the user_info table, keyed by user id.
+    """
+    __slots__ = []
+
+    def __init__(self, writer):
+        """
+        Initialize an instance of this class.
+        :param writer: the postgres controller, or a WriteBuffer.
+        """
+        super().__init__(writer, 1, 2)
+
+    def _key(self, key) -> tuple:
+        return key,
+
+    def _row(self, key: tuple, values: tuple) -> _UserRow:
+        row_val = (
+            str(key[0]), _from_int(values[0]), _from_micros(values[1])
+        )
+        return _UserRow(self, row_val)
+
+    def _store(self, row_val: Sequence):
+        self._table.put(
+            (int(row_val[0]),),
+            (_to_int(row_val[1]), _to_micros(row_val[2]))
+        )
+
+    def keys(self) -> Iterator[int]:
+        return (k[0] for k in self._table.keys())
+
+    async def set_user(self, values: Sequence):
+        """
+        Store a user row and pass it on to the writer.
+        :param values: the values of that row.
+        """
+        self._store(values)
+        await self._writer.set_user(values)
+
+    async def set_balance(self, user_id: str, balance: int):
+        """
+        Store the balance of a user and pass it on to the writer.
+        :param user_id: the user id.
+        :param balance: the balance to set to.
+        """
+        key = (int(user_id),)
+        values = self._table.get(key)
+        daily = NULL if values is None else values[1]
+        self._table.put(key, (_to_int(balance), daily))
+        await self._writer.set_balance(user_id, balance)
@@ -0,0 +1,176 @@
+"""
+A compact, array backed hash table for rows with integer keys and values.
+"""
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+__all__ = ['CompactTable', 'NULL']
+
+# Value used for None in integer columns, and for empty slots in the keys.
+NULL = -2 ** 63
+_DELETED = NULL + 1
+_MASK_64 = (1 << 64) - 1
+# 2 ** 64 divided by the golden ratio, used for Fibonacci hashing.
+_GOLDEN = 11400714819323198485
+
+
+class CompactTable:
+    """
+    An open addressing hash table with linear probing.
+
+    Keys are tuples of one or more non negative int64 and values are tuples of
+    int64, each part of a key and each value column is stored in its own
+    ``array`` so a row costs a few machine words instead of several Python
+    objects. ``None`` values are stored as ``NULL``.
+    """
+    __slots__ = ['__keys', '__columns', '__bits', '__size', '__used']
+
+    def __init__(self, key_width: int, column_count: int, capacity: int = 8):
+        """
+        Initialize an instance of this class.
+        :param key_width: the number of ints in a key.
+        :param column_count: the number of value columns.
+        :param capacity: the initial number of rows to make room for.
+        """
+        assert key_width > 0 and column_count > 0
+        bits = 3
+        while (1 << bits) * 0.7 < capacity:
+            bits += 1
+        self.__bits = bits
+        self.__keys = [array('q', [NULL]) * (1 << bits)
+                       for _ in range(key_width)]
+        self.__columns = [array('q', [NULL]) * (1 << bits)
+                          for _ in range(column_count)]
+        self.__size = 0
+        # Number of slots that are not empty, including deleted ones.
+        self.__used = 0
+
+    def __len__(self):
+        return self.__size
+
+    def __hash(self, key: Sequence[int]) -> int:
+        """
+        :param key: the key.
+        :return: the first slot to probe for the key.
+        """
+        h = 0
+        for k in key:
+            h = ((h ^ k) * _GOLDEN) & _MASK_64
+        return h >> (64 - self.__bits)
+
+    def __find(self, key: Sequence[int]) -> Tuple[int, bool]:
+        """
+        Find the slot of a key.
+        :param key: the key.
+        :return: (slot index, True) if the key is in the table, else
+        (the slot the key should go into, False).
+        """
+        mask = (1 << self.__bits) - 1
+        first = self.__keys[0]
+        i = self.__hash(key)
+        free = None
+        while True:
+            k = first[i]
+            if k == NULL:
+                return (i if free is None else free), False
+            if k == _DELETED:
+                if free is None:
+                    free = i
+            elif k == key[0] and all(
+                    arr[i] == part
+                    for arr, part in zip(self.__keys[1:], key[1:])):
+                return i, True
+            i = (i + 1) & mask
+
+    def __resize(self, bits: int):
+        """
+        Move all rows into new arrays with 2 ** bits slots.
+        :param bits: the new number of bits of the slot index.
+        """
+        rows = list(self.items())
+        self.__bits = bits
+        self.__keys = [array('q', [NULL]) * (1 << bits) for _ in self.__keys]
+        self.__columns = [array('q', [NULL]) * (1 << bits)
+                          for _ in self.__columns]
+        self.__size = 0
+        self.__used = 0
+        for key, values in rows:
+            self.put(key, values)
+
+    def get(self, key: Sequence[int]) -> Optional[Tuple[int, ...]]:
+        """
+        Get the values of a key.
+        :param key: the key.
+        :return: the values if the key is in the table, else None.
+        """
+        i, found = self.__find(key)
+        if found:
+            return tuple(col[i] for col in self.__columns)
+
+    def put(self, key: Sequence[int], values: Sequence[int]):
+        """
+        Set the values of a key.
+        :param key: the key.
+        :param values: the values.
+        """
+        assert len(key) == len(self.__keys)
+        assert len(values) == len(self.__columns)
+        assert all(k >= 0 for k in key)
+        i, found = self.__find(key)
+        if not found:
+            if self.__keys[0][i] == NULL:
+                self.__used += 1
+            self.__size += 1
+            for arr, part in zip(self.__keys, key):
+                arr[i] = part
+        for col, val in zip(self.__columns, values):
+            col[i] = val
+        if self.__used > (1 << self.__bits) * 0.7:
+            # Grow if the table is mostly live rows, else just clean out
+            # the deleted slots.
+            grow = self.__size > (1 << self.__bits) * 0.35
+            self.__resize(self.__bits + 1 if grow else self.__bits)
+
+    def pop(self, key: Sequence[int]) -> Optional[Tuple[int, ...]]:
+        """
+        Remove a key from the table.
+        :param key: the key.
+        :return: the values of the key if it was in the table, else None.
+        """
+        i, found = self.__find(key)
+        if not found:
+            return None
+        res = tuple(col[i] for col in self.__columns)
+        self.__keys[0][i] = _DELETED
+        self.__size -= 1
+        return res
+
+    def __contains__(self, key: Sequence[int]):
+        return self.__find(key)[1]
+
+    def keys(self) -> Iterator[Tuple[int, ...]]:
+        """
+        :return: an iterator of all keys in the table.
+        """
+        first = self.__keys[0]
+        for i, k in enumerate(first):
+            if k != NULL and k != _DELETED:
+                yield tuple(arr[i] for arr in self.__keys)
+
+    def items(self) -> Iterator[Tuple[Tuple[int, ...], Tuple[int, ...]]]:
+        """
+        :return: an iterator of all (key, values) in the table.
+        """
+        first = self.__keys[0]
+        for i, k in enumerate(first):
+            if k != NULL and k != _DELETED:
+                yield (tuple(arr[i] for arr in self.__keys),
+                       tuple(col[i] for col in self.__columns))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: the number of bytes used by the arrays of this table.
+        """
+        arrays: List[array] = self.__keys + self.__columns
+        return sum(a.itemsize * len(a) for a in arrays)
@@ -1,8 +1,13 @@
 from datetime import datetime
-from typing import List, Optional, Type, Union
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, \
+    Tuple, Type, Union
 
+from data_controller.compact_rows import CompactMemberRows, CompactUserRows
 from data_controller.data_rows import *
+from data_controller.errors import LowBalanceError, RowNotLoadedError
 from data_controller.postgres import Postgres
+from data_controller.row_cache import RowCache
+from data_controller.write_buffer import WriteBuffer
 from scripts.helpers import assert_types
 
 __all__ = ['DataManager']
@@ -13,55 +18,251 @@ class DataManager:
     """
     A class that layer between the bot and the sqlite db. The bot should
     read/write to this class and the class will write to the db.
+
+    By default every row in the db is loaded on init. If a cache size is
+    given, rows are loaded on first use with the load_* methods instead and
+    the least recently used rows are evicted when the cache is full, and
+    the get_* methods raise RowNotLoadedError for rows that are not loaded.
+    Member and user rows loaded on init can be kept in compact arrays
+    instead of row objects to save memory.
     """
-    __slots__ = ['__postgres', '__guilds', '__members', '__users',
-                 '__initializers']
+    __slots__ = ['__postgres', '__write_buffer', '__writer', '__guilds',
+                 '__members', '__users', '__initializers', '__lazy',
+                 '__preload_guilds', '__tables', '__shard_ids',
+                 '__prefix_starts']
 
-    def __init__(self, postgres: Postgres):
+    def __init__(self, postgres: Postgres,
+                 write_buffer: Optional[WriteBuffer] = None,
+                 cache_size: Optional[int] = None,
+                 cache_ttl: Optional[float] = None,
+                 preload_guilds: bool = True,
+                 compact_rows: bool = False):
         """
         Initialize an instance of this class.
         :param postgres: the postgres controller.
-        """
+        :param write_buffer: the write buffer for row writes, optional.
+        If not provided, every row write goes straight into the db.
+        :param cache_size: the maximum number of rows kept in memory per
+        table, optional. If not provided every row is loaded on init.
+        :param cache_ttl: the time in seconds a cached row is kept before it
+        is read from the db again, only used with cache_size.
+        :param preload_guilds: whether to load all guild rows on init when
+        cache_size is provided.
+        :param compact_rows: whether to store member and user rows in
+        compact arrays, can't be used with cache_size.
+        """
+        assert not (compact_rows and cache_size is not None)
         self.__postgres = postgres
-        self.__guilds = {}
-        self.__members = {}
-        self.__users = {}
+        self.__write_buffer = write_buffer
+        self.__writer = write_buffer or postgres
+        self.__lazy = cache_size is not None
+        self.__preload_guilds = preload_guilds or not self.__lazy
+        if self.__lazy:
+            self.__members = RowCache(cache_size, cache_ttl)
+            self.__users = RowCache(cache_size, cache_ttl)
+        elif compact_rows:
+            self.__members = CompactMemberRows(self.__writer)
+            self.__users = CompactUserRows(self.__writer)
+        else:
+            self.__members = {}
+            self.__users = {}
+        if self.__preload_guilds:
+            self.__guilds = {}
+        else:
+            self.__guilds = RowCache(cache_size, cache_ttl)
         self.__initializers = {
             _UserRow: get_user_row,
             _MemberRow: get_member_row,
             _GuildRow: get_guild_row
         }
+        self.__tables = {
+            _UserRow: 'user',
+            _MemberRow: 'member',
+            _GuildRow: 'guild'
+        }
+        self.__shard_ids = set()
+        self.__prefix_starts = set()
+
+    async def init(self, shard_ids: Optional[Iterable[int]] = None,
+                   shard_count: Optional[int] = None):
+        """
+        Initialize the rows that are loaded on startup.
 
-    async def init(self):
+        :param shard_ids: the shard ids this process owns, optional.
+        If provided along with shard_count, only the guild and member rows
+        of guilds in those shards are loaded.
+
+        :param shard_count: the total number of shards, optional.
+        User rows don't belong to a guild so they are not split by shard.
+        """
+        if shard_ids is not None and shard_count:
+            self.__shard_ids = set(shard_ids)
+            ids = sorted(self.__shard_ids)
+            if self.__preload_guilds:
+                self.__put_guilds(
+                    await self.__postgres.get_shard_guild(ids, shard_count))
+            if not self.__lazy:
+                self.__put_members(
+                    await self.__postgres.get_shard_member(ids, shard_count))
+        else:
+            if self.__preload_guilds:
+                self.__put_guilds(await self.__postgres.get_all_guild())
+            if not self.__lazy:
+                self.__put_members(await self.__postgres.get_all_member())
+        if not self.__lazy:
+            for user in await self.__postgres.get_all_user():
+                row = _UserRow(self.__writer, user)
+                key = int(user[0])
+                self.__users[key] = row
+        if self.__write_buffer:
+            self.__write_buffer.start()
+
+    def __put_guilds(self, guilds: List[tuple]):
         """
-        Initialize self.__guilds with some values.
+        Put guild rows read from the db into memory.
+        :param guilds: the guild rows.
         """
-        guilds = await self.__postgres.get_all_guild()
-        members = await self.__postgres.get_all_member()
-        users = await self.__postgres.get_all_user()
         for guild in guilds:
-            row = _GuildRow(self.__postgres, guild)
+            row = _GuildRow(self.__writer, guild)
             key = int(guild[0])
             self.__guilds[key] = row
+            self.__track_prefix(row.prefix)
+
+    def __track_prefix(self, prefix: Optional[str]):
+        """
+        Keep the first character of a guild prefix.
+        :param prefix: the guild prefix, None for the default prefix.
+        """
+        if prefix is not None:
+            self.__prefix_starts.add(prefix[:1])
+
+    def __put_members(self, members: List[tuple]):
+        """
+        Put member rows read from the db into memory.
+        :param members: the member rows.
+        """
         for member in members:
-            row = _MemberRow(self.__postgres, member)
+            row = _MemberRow(self.__writer, member)
             key = int(member[0]), int(member[1])
             self.__members[key] = row
-        for user in users:
-            row = _UserRow(self.__postgres, user)
-            key = int(user[0])
-            self.__users[key] = row
+
+    @property
+    def prefix_starts(self) -> Optional[set]:
+        """
+        The first characters of every guild prefix, an empty prefix is kept
+        as ''. Prefixes that were changed since are not removed, so a
+        message that starts with none of them is not a command in any guild.
+        :return: the set of first characters, None if the guild rows are
+        loaded on first use so the prefixes of some guilds are not known.
+        """
+        return self.__prefix_starts if self.__preload_guilds else None
+
+    @property
+    def shard_ids(self) -> List[int]:
+        """
+        :return: the sorted list of shard ids whose rows are loaded.
+        """
+        return sorted(self.__shard_ids)
+
+    async def flush(self):
+        """
+        Write all buffered row writes into the db.
+        """
+        if self.__write_buffer:
+            await self.__write_buffer.flush()
+
+    async def close(self):
+        """
+        Stop the write buffer and write everything left in it into the db.
+        """
+        if self.__write_buffer:
+            await self.__write_buffer.close()
+
+    @property
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: a dict of {table name: cache stats} for the cached tables.
+        """
+        tables = {
+            'guild': self.__guilds,
+            'member': self.__members,
+            'user': self.__users
+        }
+        return {
+            name: cache.stats for name, cache in tables.items()
+            if isinstance(cache, RowCache)
+        }
+
+    def __new_row(self, class_: Type[_row_types], key, row_val=None):
+        """
+        Make a new row.
+        :param class_: the row class.
+        :param key: the row key.
+        :param row_val: the row values, optional.
+        :return: the new row.
+        """
+        keys = key if isinstance(key, tuple) else (key,)
+        return self.__initializers[class_](self.__writer, *keys, row_val)
 
     def __get_row(self, dict_: dict, class_: Type[_row_types], key):
+        """
+        Get a row that is in memory.
+        :param dict_: the dict or RowCache that holds the rows.
+        :param class_: the row class.
+        :param key: the row key.
+        :return: the row, a new default row for tables that are fully loaded.
+        :raises RowNotLoadedError: if the table is loaded on first use and
+        the row was not loaded with the load_* methods.
+        """
         try:
             return dict_[key]
         except KeyError:
-            if isinstance(key, tuple):
-                new = self.__initializers[class_](self.__postgres, *key)
-            else:
-                new = self.__initializers[class_](self.__postgres, key)
+            # A cache miss doesn't mean the row isn't in the db, so the
+            # default row would hide the stored values.
+            if isinstance(dict_, RowCache):
+                raise RowNotLoadedError(
+                    f'{self.__tables[class_]} row {key} is not loaded'
+                ) from None
+            new = self.__new_row(class_, key)
             dict_[key] = new
-            return new
+            return dict_[key]
+
+    async def __load_row(self, dict_: dict, class_: Type[_row_types], key):
+        """
+        Get a row, read it from the db first if it's not in memory.
+        :param dict_: the dict or RowCache that holds the rows.
+        :param class_: the row class.
+        :param key: the row key.
+        :return: the row.
+        """
+        if not isinstance(dict_, RowCache):
+            return self.__get_row(dict_, class_, key)
+        try:
+            return dict_[key]
+        except KeyError:
+            pass
+        db_key = tuple(str(k) for k in key) if isinstance(key, tuple) \
+            else str(key)
+        row_val = None
+        if self.__write_buffer:
+            row_val = self.__write_buffer.pending(
+                self.__tables[class_], db_key)
+        if row_val is None:
+            getter = {
+                _GuildRow: self.__postgres.get_guild,
+                _MemberRow: self.__postgres.get_member,
+                _UserRow: self.__postgres.get_user
+            }[class_]
+            args = db_key if isinstance(db_key, tuple) else (db_key,)
+            row_val = await getter(*args)
+        # Another coroutine might have loaded the row while this one was
+        # waiting on the db, keep that one since it might have new writes.
+        if key in dict_:
+            return dict_[key]
+        new = self.__new_row(
+            class_, key, row_val if row_val[0] is not None else None)
+        dict_[key] = new
+        return new
 
     def __get_guild_row(self, guild_id: int) -> _GuildRow:
         """
@@ -91,6 +292,32 @@ class DataManager:
         """
         return self.__get_row(self.__users, _UserRow, user_id)
 
+    async def load_guild(self, guild_id: int) -> _GuildRow:
+        """
+        Make sure a row in the guild_info table is in memory.
+        :param guild_id: the guild id.
+        :return: the row with the id guild_id.
+        """
+        return await self.__load_row(self.__guilds, _GuildRow, guild_id)
+
+    async def load_member(self, member_id: int, guild_id: int) -> _MemberRow:
+        """
+        Make sure a row in the member_info table is in memory.
+        :param member_id: the member id
+        :param guild_id: the guild id
+        :return: the row with id (member_id, guild_id)
+        """
+        key = (member_id, guild_id)
+        return await self.__load_row(self.__members, _MemberRow, key)
+
+    async def load_user(self, user_id: int) -> _UserRow:
+        """
+        Make sure a row in the user_info table is in memory.
+        :param user_id: the user id.
+        :return: the row with id user_id.
+        """
+        return await self.__load_row(self.__users, _UserRow, user_id)
+
     def get_prefix(self, guild_id: int) -> str:
         """
         Get the prefix of the guild
@@ -104,7 +331,8 @@ class DataManager:
         :param guild_id: the guild id.
         :param prefix: the prefix to set to.
         """
-        row = self.__get_guild_row(guild_id)
+        row = await self.load_guild(guild_id)
+        self.__track_prefix(prefix)
         await row.set_prefix(prefix)
 
     def get_language(self, guild_id: int) -> str:
@@ -120,7 +348,7 @@ class DataManager:
         :param guild_id: the guild id of the guild.
         :param language: the language to set to.
         """
-        row = self.__get_guild_row(guild_id)
+        row = await self.load_guild(guild_id)
         await row.set_language(language)
 
     def get_mod_log(self, guild_id: int) -> int:
@@ -136,7 +364,7 @@ class DataManager:
         :param guild_id: the guild id.
         :param channel_id: the channel id of the mod log.
         """
-        row = self.__get_guild_row(guild_id)
+        row = await self.load_guild(guild_id)
         await row.set_mod_log(channel_id)
 
     def get_roles(self, guild_id: int) -> List[str]:
@@ -157,7 +385,7 @@ class DataManager:
         :param roles: the list of roles.
         """
         assert_types(roles, str, False)
-        row = self.__get_guild_row(guild_id)
+        row = await self.load_guild(guild_id)
         await row.set_roles(roles)
 
     def get_member_warns(self, member_id: int, guild_id: int) -> int:
@@ -177,7 +405,7 @@ class DataManager:
         :param warns: the number of warns to set to.
         """
         assert warns >= 0
-        row = self.__get_member_row(member_id, guild_id)
+        row = await self.load_member(member_id, guild_id)
         await row.set_warns(warns)
 
     def get_user_balance(self, user_id: int) -> int:
@@ -195,7 +423,7 @@ class DataManager:
         :param balance: the balance to set to.
         """
         assert 0 <= balance < 9223372036854775807
-        row = self.__get_user_row(user_id)
+        row = await self.load_user(user_id)
         await row.set_balance(balance)
 
     def get_user_daily(self, user_id: int) -> datetime:
@@ -212,5 +440,96 @@ class DataManager:
         :param user_id: the user id.
         :param time_stamp: the timestamp for the daily.
         """
-        row = self.__get_user_row(user_id)
+        row = await self.load_user(user_id)
         await row.set_daily(time_stamp)
+
+    async def __write_balances(
+            self, user_ids: List[int], call: Callable[[], Awaitable]):
+        """
+        Run a db call that writes balances of some users directly into the
+        db, without going through the write buffer.
+        :param user_ids: the user ids.
+        :param call: a callable that returns the awaitable db call.
+        :return: the result of the db call.
+        """
+        if not self.__write_buffer:
+            return await call()
+        keys = [str(i) for i in user_ids]
+        return await self.__write_buffer.write_through('user', keys, call)
+
+    def __update_balance(self, user_id: int, balance: int):
+        """
+        Update the balance of a user in memory after it was written into the
+        db, along with any buffered write of that user.
+        :param user_id: the user id.
+        :param balance: the balance in the db.
+        """
+        if user_id in self.__users:
+            row = self.__users[user_id]
+            row.update_balance(balance)
+            self.__users[user_id] = row
+        if not self.__write_buffer:
+            return
+        pending = self.__write_buffer.pending('user', str(user_id))
+        if pending:
+            self.__write_buffer.refresh(
+                'user', str(user_id), (pending[0], balance, pending[2]))
+
+    async def __low_balance(self, user_id: int) -> LowBalanceError:
+        """
+        Read the balance of a user from the db after a failed balance change.
+        :param user_id: the user id.
+        :return: a LowBalanceError with the current balance of the user.
+        """
+        balance = (await self.__postgres.get_user(str(user_id)))[1] or 0
+        self.__update_balance(user_id, balance)
+        return LowBalanceError(str(balance))
+
+    async def change_user_balance(self, user_id: int, delta: int) -> int:
+        """
+        Atomically add to the balance of a user in the db.
+        :param user_id: the user id.
+        :param delta: the amount to add, can be negative.
+        :return: the new balance of the user.
+        :raises LowBalanceError: if the balance would go below 0.
+        """
+        await self.load_user(user_id)
+
+        async def call():
+            res = await self.__postgres.change_balance(str(user_id), delta)
+            if res is not None:
+                self.__update_balance(user_id, res)
+            return res
+
+        balance = await self.__write_balances([user_id], call)
+        if balance is None:
+            raise await self.__low_balance(user_id)
+        return balance
+
+    async def transfer_user_balance(
+            self, from_id: int, to_id: int, amount: int) -> Tuple[int, int]:
+        """
+        Atomically transfer balance from one user to another in the db.
+        :param from_id: the user id to transfer from.
+        :param to_id: the user id to transfer to.
+        :param amount: the amount to transfer.
+        :return: the new balances of the two users.
+        :raises LowBalanceError: if the user to transfer from doesn't have
+        enough balance.
+        """
+        assert amount >= 0
+        await self.load_user(from_id)
+        await self.load_user(to_id)
+
+        async def call():
+            res = await self.__postgres.transfer_balance(
+                str(from_id), str(to_id), amount)
+            if res is not None:
+                self.__update_balance(from_id, res[0])
+                self.__update_balance(to_id, res[1])
+            return res
+
+        balances = await self.__write_balances([from_id, to_id], call)
+        if balances is None:
+            raise await self.__low_balance(from_id)
+        return balances
@@ -16,7 +16,7 @@ class _Row:
     def __init__(self, postgres: Postgres, row=None):
         """
         Initialize an instance of _Row
-        :param postgres: the postgres controller.
+        :param postgres: the postgres controller, or a WriteBuffer.
         :param row: the row value for the row, optional parameter.
         """
         self._postgres = postgres
@@ -163,11 +163,26 @@ class _UserRow(_Row):
         return self._row[2]
 
     async def set_balance(self, balance: int):
-        await self._set(1, balance)
+        """
+        Set the balance, it's written on its own since the row upsert
+        leaves the balance of existing rows alone.
+        :param balance: the balance to set to.
+        """
+        if self._row[1] != balance:
+            self._row[1] = balance
+            await self._postgres.set_balance(self._row[0], balance)
 
     async def set_daily(self, daily: datetime):
         await self._set(2, daily)
 
+    def update_balance(self, balance: int):
+        """
+        Update the balance in memory only, for when it was already written
+        into the db.
+        :param balance: the balance in the db.
+        """
+        self._row[1] = balance
+
 
 def get_guild_row(postgres: Postgres, guild_id: int, row_val=None):
     default = (str(guild_id), None, None, None, None)
@@ -3,11 +3,11 @@ Utility functions to interact with the database
 """
 from typing import List
 
-from discord import Server
+from discord import Guild
 from discord.utils import get
 
 from data_controller.data_manager import DataManager
-from data_controller.errors import LowBalanceError, NegativeTransferError
+from data_controller.errors import NegativeTransferError, RowNotLoadedError
 from scripts.discord_functions import get_server_role
 from scripts.language_support import generate_language_entry
 
@@ -36,30 +36,27 @@ def get_prefix(bot, message):
     Get the command prefix based on a discord message.
     :param bot: the bot.
     :param message: the discord message.
-    :return: the command prefix.
+    :return: the command prefix, the default prefix if the message is not
+    in a guild or the guild row is not loaded.
     """
     try:
-        server_id = int(message.server.id)
-    except AttributeError:
+        r = bot.data_manager.get_prefix(message.guild.id)
+    except (AttributeError, RowNotLoadedError):
         return bot.default_prefix
-    else:
-        r = bot.data_manager.get_prefix(server_id)
-        return r if r else bot.default_prefix
+    return r if r else bot.default_prefix
 
 
-async def change_balance(data_manager: DataManager, user_id: int, delta: int):
+async def change_balance(
+        data_manager: DataManager, user_id: int, delta: int) -> int:
     """
     Change the balance of a user.
     :param data_manager: the data manager.
     :param user_id: the user id.
     :param delta: the amout to change.
+    :return: the new balance of the user.
     :raises LowBalanceError: if the user doesnt have enough balance.
     """
-    current_balance = data_manager.get_user_balance(user_id) or 0
-    new_balance = current_balance + delta
-    if new_balance < 0:
-        raise LowBalanceError(str(current_balance))
-    await data_manager.set_user_balance(user_id, new_balance)
+    return await data_manager.change_user_balance(user_id, delta)
 
 
 async def transfer_balance(
@@ -81,8 +78,9 @@ async def transfer_balance(
     if amount < 0:
         raise NegativeTransferError
     if amount > 0:
-        await change_balance(data_manager, from_id, -amount)
-        await change_balance(data_manager, to_id, amount)
+        return await data_manager.transfer_user_balance(from_id, to_id, amount)
+    await data_manager.load_user(from_id)
+    await data_manager.load_user(to_id)
     return (data_manager.get_user_balance(from_id),
             data_manager.get_user_balance(to_id))
 
@@ -94,6 +92,7 @@ async def add_self_role(data_manager: DataManager, guild_id: int, role):
     :param guild_id: the guild id.
     :param role: the role name.
     """
+    await data_manager.load_guild(guild_id)
     lst = data_manager.get_roles(guild_id) or []
     if role not in lst:
         lst.append(role)
@@ -107,14 +106,14 @@ async def remove_self_role(data_manager: DataManager, guild_id: int, role):
     :param guild_id: the guild id.
     :param role: the role name.
     """
+    await data_manager.load_guild(guild_id)
     lst = data_manager.get_roles(guild_id) or []
     new = [s for s in lst if s != role]
     await data_manager.set_roles(guild_id, new)
 
 
-# FIXME Change Server to Guild after lib rewrite
 async def self_role_names(
-        guild: Server, data_manager: DataManager) -> List[str]:
+        guild: Guild, data_manager: DataManager) -> List[str]:
     """
     Get the role list of the server
 
@@ -126,6 +125,7 @@ async def self_role_names(
     """
     # FIXME Remove casting after lib rewrite
     guild_id = int(guild.id)
+    await data_manager.load_guild(guild_id)
     lst = data_manager.get_roles(guild_id) or []
     # Check for any non-existing roles and remove them from the db
     new = [r for r in lst if get_server_role(r, guild)]
@@ -143,6 +143,7 @@ async def get_modlog(data_manager: DataManager, guild):
     :return: the mod log channel id
     """
     # FIXME Remove casting after library rewrite
+    await data_manager.load_guild(int(guild.id))
     modlog = data_manager.get_mod_log(int(guild.id))
     guild_channel = get(guild.channels, id=str(modlog))
     if guild_channel:
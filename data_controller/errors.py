@@ -4,3 +4,10 @@ class LowBalanceError(ValueError):
 
 class NegativeTransferError(ValueError):
     pass
+
+
+class RowNotLoadedError(KeyError):
+    """
+    Raised when a row is read before it was loaded, in the modes where rows
+    are loaded on first use.
+    """
@@ -0,0 +1,113 @@
+"""
+A trigram index for fuzzy string matching.
+"""
+from collections import Counter
+from difflib import SequenceMatcher
+from heapq import nlargest
+from typing import Iterable, List, Optional, Tuple
+
+__all__ = ['TrigramIndex', 'trigrams']
+
+
+def trigrams(s: str) -> set:
+    """
+    Get the trigrams of a string, padded so short strings and the start and
+    end of a string have trigrams too.
+    :param s: the string.
+    :return: the set of trigrams of the string.
+    >>> sorted(trigrams('ab'))
+    ['  a', ' ab', 'ab ']
+    """
+    padded = f'  {s} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    An inverted index from trigrams to strings, used to find a short list of
+    candidates for a fuzzy match before scoring them with difflib.
+    """
+    __slots__ = ['__strings', '__sizes', '__postings', '__ids', '__shortlist']
+
+    def __init__(self, strings: Iterable[str] = (), shortlist: int = 64):
+        """
+        Initialize an instance of this class.
+        :param strings: the strings to index.
+        :param shortlist: the number of candidates scored per match.
+        """
+        self.__strings = []
+        self.__sizes = []
+        self.__postings = {}
+        self.__ids = {}
+        self.__shortlist = shortlist
+        for s in strings:
+            self.add(s)
+
+    def __len__(self):
+        return len(self.__strings)
+
+    def __contains__(self, s: str):
+        return s in self.__ids
+
+    def add(self, s: str):
+        """
+        Add a string to the index.
+        :param s: the string.
+        """
+        if s in self.__ids:
+            return
+        id_ = len(self.__strings)
+        self.__ids[s] = id_
+        self.__strings.append(s)
+        grams = trigrams(s)
+        self.__sizes.append(len(grams))
+        postings = self.__postings
+        for gram in grams:
+            try:
+                postings[gram].append(id_)
+            except KeyError:
+                postings[gram] = [id_]
+
+    def candidates(self, s: str) -> List[str]:
+        """
+        Get the indexed strings that share the most trigrams with a string.
+        :param s: the string.
+        :return: at most shortlist strings, the most similar ones first.
+        """
+        grams = trigrams(s)
+        counts = Counter()
+        postings = self.__postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids:
+                counts.update(ids)
+        if not counts:
+            return []
+        size = len(grams)
+        sizes = self.__sizes
+        best = nlargest(
+            self.__shortlist, counts.items(),
+            key=lambda x: x[1] / (size + sizes[x[0]] - x[1])
+        )
+        return [self.__strings[id_] for id_, _ in best]
+
+    def match(self, s: str, cutoff: float) -> Optional[Tuple[str, float]]:
+        """
+        Find the best fuzzy match of a string, scored the same way as
+        ``difflib.get_close_matches``.
+        :param s: the string.
+        :param cutoff: the minimum similarity ratio, between 0 and 1.
+        :return: (the best match, its similarity ratio) if there is a match
+        with a ratio of at least cutoff, else None.
+        """
+        matcher = SequenceMatcher()
+        matcher.set_seq2(s)
+        best = None
+        for x in self.candidates(s):
+            matcher.set_seq1(x)
+            if (matcher.real_quick_ratio() >= cutoff and
+                    matcher.quick_ratio() >= cutoff):
+                score = matcher.ratio()
+                if score >= cutoff and (best is None or (score, x) > best):
+                    best = score, x
+        return (best[1], best[0]) if best else None
@@ -1,8 +1,9 @@
 from datetime import datetime
-from typing import Dict, List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from asyncpg import Record
+from asyncpg import Connection, Record, create_pool
 from asyncpg.pool import Pool
+from asyncpg.prepared_stmt import PreparedStatement
 
 from scripts.helpers import assert_types
 
@@ -33,7 +34,8 @@ class Postgres:
     __slots__ = ['logger', 'pool', '__get_guild', '__set_guild', '__get_member',
                  '__set_member', '__get_user', '__set_user', '__get_tags',
                  '__set_tags', '__get_all_guild', '__get_all_member',
-                 '__get_all_user']
+                 '__get_all_user', '__get_shard_guild', '__get_shard_member',
+                 '__change_balance', '__prepared']
 
     def __init__(self, pool: Pool, schema, logger):
         """
@@ -43,6 +45,8 @@ class Postgres:
         """
         self.logger = logger
         self.pool = pool
+        # {server pid: (connection, {sql: prepared statement})}
+        self.__prepared = {}
         self.__get_guild = (
             'SELECT * FROM {}.guild_info WHERE guild_id = $1'.format(schema)
         )
@@ -67,7 +71,20 @@ class Postgres:
         self.__set_user = (
             'INSERT INTO {}.user_info VALUES ($1, $2, $3) '
             'ON CONFLICT (user_id) '
-            'DO UPDATE SET balance=$2, daily=$3'.format(schema)
+            'DO UPDATE SET daily=$3'.format(schema)
+        )
+        self.__set_balance = (
+            'INSERT INTO {}.user_info (user_id, balance) VALUES ($1, $2) '
+            'ON CONFLICT (user_id) '
+            'DO UPDATE SET balance=$2'.format(schema)
+        )
+        self.__change_balance = (
+            'INSERT INTO {}.user_info AS u (user_id, balance) '
+            'SELECT $1::VARCHAR, $2::BIGINT WHERE $2::BIGINT >= 0 '
+            'ON CONFLICT (user_id) '
+            'DO UPDATE SET balance=COALESCE(u.balance, 0) + $2 '
+            'WHERE COALESCE(u.balance, 0) + $2 >= 0 '
+            'RETURNING balance'.format(schema)
         )
         self.__get_tags = 'SELECT * FROM {}.nsfw_tags'.format(schema)
         self.__set_tags = (
@@ -78,6 +95,98 @@ class Postgres:
         self.__get_all_guild = 'SELECT * FROM {}.guild_info'.format(schema)
         self.__get_all_member = 'SELECT * FROM {}.member_info'.format(schema)
         self.__get_all_user = 'SELECT * FROM {}.user_info'.format(schema)
+        self.__get_shard_guild = (
+            'SELECT * FROM {}.guild_info '
+            'WHERE (guild_id::BIGINT >> 22) % $2 = ANY($1::BIGINT[])'.format(
+                schema)
+        )
+        self.__get_shard_member = (
+            'SELECT * FROM {}.member_info '
+            'WHERE (guild_id::BIGINT >> 22) % $2 = ANY($1::BIGINT[])'.format(
+                schema)
+        )
+
+    @classmethod
+    async def create(cls, schema, logger, **pool_kwargs):
+        """
+        Create a connection pool that prepares the statements of this class
+        on every new connection, and an instance of this class that uses it.
+        :param schema: the schema name.
+        :param logger: the logger.
+        :param pool_kwargs: keyword arguments for asyncpg.create_pool
+        :return: the instance of this class.
+        """
+        self = cls(None, schema, logger)
+        self.pool = await create_pool(init=self.init_connection, **pool_kwargs)
+        return self
+
+    @property
+    def __hot_statements(self) -> List[str]:
+        """
+        :return: the statements that get prepared on every new connection.
+        """
+        return [
+            self.__get_guild, self.__set_guild, self.__get_member,
+            self.__set_member, self.__get_user, self.__set_user,
+            self.__change_balance
+        ]
+
+    async def init_connection(self, conn: Connection):
+        """
+        Prepare the hot statements on a new connection, meant to be the
+        ``init`` of the connection pool.
+        :param conn: the new connection.
+        """
+        # Forget the statements of connections that were closed.
+        self.__prepared = {
+            pid: val for pid, val in self.__prepared.items()
+            if not val[0].is_closed()
+        }
+        statements = {
+            sql: await conn.prepare(sql) for sql in self.__hot_statements
+        }
+        self.__prepared[conn.get_server_pid()] = conn, statements
+
+    async def __statement(self, conn, sql: str) -> PreparedStatement:
+        """
+        Get the prepared statement of a query on a connection, prepare it if
+        the connection doesn't have it yet.
+        :param conn: the connection.
+        :param sql: the query.
+        :return: the prepared statement.
+        """
+        pid = conn.get_server_pid()
+        try:
+            return self.__prepared[pid][1][sql]
+        except KeyError:
+            pass
+        stmt = await conn.prepare(sql)
+        if pid not in self.__prepared:
+            self.__prepared[pid] = conn, {}
+        self.__prepared[pid][1][sql] = stmt
+        return stmt
+
+    async def __fetchrow(self, sql: str, *args) -> Record:
+        """
+        Run a prepared statement and return the first row.
+        :param sql: the query.
+        :param args: the query arguments.
+        :return: the first row.
+        """
+        async with self.pool.acquire() as conn:
+            stmt = await self.__statement(conn, sql)
+            return await stmt.fetchrow(*args)
+
+    async def __fetchval(self, sql: str, *args):
+        """
+        Run a prepared statement and return the first value of the first row.
+        :param sql: the query.
+        :param args: the query arguments.
+        :return: the value.
+        """
+        async with self.pool.acquire() as conn:
+            stmt = await self.__statement(conn, sql)
+            return await stmt.fetchval(*args)
 
     async def get_guild(self, guild_id: str) -> tuple:
         """
@@ -85,7 +194,7 @@ class Postgres:
         :param guild_id: the guild id.
         :return: the guild row.
         """
-        _res = await self.pool.fetchrow(self.__get_guild, guild_id)
+        _res = await self.__fetchrow(self.__get_guild, guild_id)
         res = _parse_record(_res) or (None,) * len(_guild_types)
         assert_types(res, _guild_types, True)
         return res
@@ -98,13 +207,34 @@ class Postgres:
         res = await self.pool.fetch(self.__get_all_guild)
         return [_parse_record(r) for r in res]
 
+    async def get_shard_guild(
+            self, shard_ids: List[int], shard_count: int) -> List[tuple]:
+        """
+        Get all guild rows that belong to some shards.
+        :param shard_ids: the shard ids.
+        :param shard_count: the total number of shards.
+        :return: A list of guild rows
+        """
+        res = await self.pool.fetch(
+            self.__get_shard_guild, shard_ids, shard_count)
+        return [_parse_record(r) for r in res]
+
     async def set_guild(self, values: Sequence):
         """
         Set a guild row.
         :param values: the values of that row.
         """
         assert_types(values, _guild_types, True)
-        await self.pool.execute(self.__set_guild, *values)
+        await self.__fetchval(self.__set_guild, *values)
+
+    async def set_guilds(self, rows: List[Sequence]):
+        """
+        Set multiple guild rows in one batch.
+        :param rows: a list of row values.
+        """
+        for values in rows:
+            assert_types(values, _guild_types, True)
+        await self.pool.executemany(self.__set_guild, rows)
 
     async def get_member(self, member_id: str, guild_id: str) -> tuple:
         """
@@ -113,7 +243,8 @@ class Postgres:
         :param guild_id: the guild id.
         :return: the member row.
         """
-        _res = await self.pool.fetchrow(self.__get_member, member_id, guild_id)
+        _res = await self.__fetchrow(
+            self.__get_member, member_id, guild_id)
         res = _parse_record(_res) or (None,) * len(_member_types)
         assert_types(res, _member_types, True)
         return res
@@ -126,13 +257,34 @@ class Postgres:
         res = await self.pool.fetch(self.__get_all_member)
         return [_parse_record(r) for r in res]
 
+    async def get_shard_member(
+            self, shard_ids: List[int], shard_count: int) -> List[tuple]:
+        """
+        Get all member rows in guilds that belong to some shards.
+        :param shard_ids: the shard ids.
+        :param shard_count: the total number of shards.
+        :return: A list of member rows.
+        """
+        res = await self.pool.fetch(
+            self.__get_shard_member, shard_ids, shard_count)
+        return [_parse_record(r) for r in res]
+
     async def set_member(self, values: Sequence):
         """
         Set a member row.
         :param values: the values of that row.
         """
         assert_types(values, _member_types, True)
-        await self.pool.execute(self.__set_member, *values)
+        await self.__fetchval(self.__set_member, *values)
+
+    async def set_members(self, rows: List[Sequence]):
+        """
+        Set multiple member rows in one batch.
+        :param rows: a list of row values.
+        """
+        for values in rows:
+            assert_types(values, _member_types, True)
+        await self.pool.executemany(self.__set_member, rows)
 
     async def get_user(self, user_id: str) -> tuple:
         """
@@ -140,7 +292,7 @@ class Postgres:
         :param user_id: the user id. 
         :return: the values of that row.
         """
-        _res = await self.pool.fetchrow(self.__get_user, user_id)
+        _res = await self.__fetchrow(self.__get_user, user_id)
         res = _parse_record(_res) or (None,) * len(_user_types)
         assert_types(res, _user_types, True)
         return res
@@ -155,11 +307,74 @@ class Postgres:
 
     async def set_user(self, values: Sequence):
         """
-        Set a user row.
+        Set a user row. The balance is only written if the row is new, so
+        a row written from memory can't undo an atomic balance change, use
+        set_balance to overwrite it.
         :param values: the values of that row.
         """
         assert_types(values, _user_types, True)
-        await self.pool.execute(self.__set_user, *values)
+        await self.__fetchval(self.__set_user, *values)
+
+    async def set_users(self, rows: List[Sequence]):
+        """
+        Set multiple user rows in one batch.
+        :param rows: a list of row values.
+        """
+        for values in rows:
+            assert_types(values, _user_types, True)
+        await self.pool.executemany(self.__set_user, rows)
+
+    async def set_balance(self, user_id: str, balance: int):
+        """
+        Set the balance of a user.
+        :param user_id: the user id.
+        :param balance: the balance to set to.
+        """
+        await self.__fetchval(self.__set_balance, user_id, balance)
+
+    async def change_balance(self, user_id: str, delta: int) -> Optional[int]:
+        """
+        Atomically add to the balance of a user.
+        :param user_id: the user id.
+        :param delta: the amount to add, can be negative.
+        :return: the new balance, None if the balance would go below 0, in
+        which case nothing is changed.
+        """
+        return await self.__fetchval(self.__change_balance, user_id, delta)
+
+    async def transfer_balance(
+            self, from_id: str, to_id: str,
+            amount: int) -> Optional[Tuple[int, int]]:
+        """
+        Atomically transfer balance from one user to another in a single
+        transaction.
+        :param from_id: the user id to transfer from.
+        :param to_id: the user id to transfer to.
+        :param amount: the amount to transfer, must not be negative.
+        :return: the new balances of the two users, None if the sending user
+        doesn't have enough balance, in which case nothing is changed.
+        """
+        assert amount >= 0
+        # Update the rows in a fixed order so two transfers in opposite
+        # directions can't deadlock each other.
+        updates = sorted(((from_id, -amount), (to_id, amount)))
+        res = {}
+        async with self.pool.acquire() as conn:
+            tr = conn.transaction()
+            await tr.start()
+            stmt = await self.__statement(conn, self.__change_balance)
+            try:
+                for user_id, delta in updates:
+                    balance = await stmt.fetchval(user_id, delta)
+                    if balance is None:
+                        await tr.rollback()
+                        return None
+                    res[user_id, delta] = balance
+            except BaseException:
+                await tr.rollback()
+                raise
+            await tr.commit()
+        return res[from_id, -amount], res[to_id, amount]
 
     async def get_tags(self) -> Dict[str, List[str]]:
         """
@@ -0,0 +1,121 @@
+"""
+A bounded, least recently used cache for db rows.
+"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Optional
+
+__all__ = ['RowCache']
+
+
+class RowCache:
+    """
+    A mapping of row keys to rows that holds at most a fixed number of rows.
+    The least recently used row is evicted when the cache is full, rows
+    older than the time to live are dropped on access.
+    """
+    __slots__ = ['__rows', '__max_size', '__ttl', '__hits', '__misses',
+                 '__evictions', '__expirations']
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        Initialize an instance of this class.
+        :param max_size: the maximum number of rows in the cache.
+        :param ttl: the time to live of a row in seconds, optional.
+        If not provided rows never expire.
+        """
+        assert max_size > 0
+        self.__rows = OrderedDict()
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __contains__(self, key):
+        """
+        Check if a key is in the cache without updating its recency or the
+        counters.
+        :param key: the row key.
+        :return: True if the key is in the cache and not expired.
+        """
+        try:
+            loaded, _ = self.__rows[key]
+        except KeyError:
+            return False
+        return not self.__expired(loaded)
+
+    def __expired(self, loaded: float) -> bool:
+        """
+        :param loaded: the time a row was put into the cache.
+        :return: True if the row has expired.
+        """
+        return self.__ttl is not None and monotonic() - loaded > self.__ttl
+
+    def __getitem__(self, key):
+        """
+        Get a row from the cache and mark it as recently used.
+        :param key: the row key.
+        :return: the row.
+        :raises KeyError: if the key is not in the cache or it has expired.
+        """
+        try:
+            loaded, row = self.__rows[key]
+        except KeyError:
+            self.__misses += 1
+            raise
+        if self.__expired(loaded):
+            del self.__rows[key]
+            self.__expirations += 1
+            self.__misses += 1
+            raise KeyError(key)
+        self.__rows.move_to_end(key)
+        self.__hits += 1
+        return row
+
+    def __setitem__(self, key, row):
+        """
+        Put a row into the cache, evict the least recently used rows if the
+        cache is full.
+        :param key: the row key.
+        :param row: the row.
+        """
+        self.__rows[key] = (monotonic(), row)
+        self.__rows.move_to_end(key)
+        while len(self.__rows) > self.__max_size:
+            self.__rows.popitem(last=False)
+            self.__evictions += 1
+
+    def pop(self, key, default=None):
+        """
+        Remove a row from the cache.
+        :param key: the row key.
+        :param default: the value to return if the key is not in the cache.
+        :return: the row if the key was in the cache, else default.
+        """
+        try:
+            return self.__rows.pop(key)[1]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.__rows.keys()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: a dict of the cache size and its hit, miss, eviction and
+        expiration counts.
+        """
+        return {
+            'size': len(self.__rows),
+            'max_size': self.__max_size,
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'evictions': self.__evictions,
+            'expirations': self.__expirations
+        }
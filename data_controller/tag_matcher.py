@@ -1,6 +1,10 @@
-from difflib import get_close_matches
-from typing import List, Optional, Union
+from asyncio import CancelledError, ensure_future, sleep
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from logging import WARN
+from typing import Dict, List, Optional, Union
 
+from data_controller.fuzzy_index import TrigramIndex, trigrams
 from data_controller.postgres import Postgres
 
 
@@ -9,36 +13,193 @@ class TagMatcher:
     A class that holds all the tags and attempt to fuzzy match user inputs
     with exsiting tags in the db.
     """
-    __slots__ = ['__postgres', '__tags']
+    __slots__ = ['__postgres', '__tags', '__pending', '__flush_delay',
+                 '__flush_task', '__indexes', '__matches', '__match_grams',
+                 '__match_cache_size', '__hits', '__misses', '__invalidations']
 
-    def __init__(self, postgres: Postgres, tags: dict):
+    # Minimum similarity ratio of a fuzzy match.
+    cutoff = 0.4
+
+    def __init__(self, postgres: Postgres, tags: Dict[str, List[str]],
+                 flush_delay: float = 5, match_cache_size: int = 1024):
         """
         Initialize an instance of this class.
         :param postgres: the postgres controller.
         :param tags: the list of tags in the db on startup.
+        :param flush_delay: the time in seconds new tags are collected for
+        before they are written into the db, 0 to write them right away.
+        :param match_cache_size: the maximum number of fuzzy match results
+        kept in memory, 0 to not keep any.
         """
         self.__postgres = postgres
-        self.__tags = tags
+        self.__tags = {site: set(lst) for site, lst in tags.items()}
+        self.__pending = {}
+        self.__flush_delay = flush_delay
+        self.__flush_task = None
+        self.__indexes = {}
+        self.__matches = OrderedDict()
+        # {(site, trigram): the keys of the cached matches with the trigram}
+        self.__match_grams = {}
+        self.__match_cache_size = match_cache_size
+        self.__hits = 0
+        self.__misses = 0
+        self.__invalidations = 0
+
+    @property
+    def match_stats(self) -> Dict[str, Union[int, float]]:
+        """
+        :return: a dict of the match cache size, its hit, miss and
+        invalidation counts, and its hit rate.
+        """
+        lookups = self.__hits + self.__misses
+        return {
+            'size': len(self.__matches),
+            'max_size': self.__match_cache_size,
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'invalidations': self.__invalidations,
+            'hit_rate': self.__hits / lookups if lookups else 0.0
+        }
+
+    def __cache_match(self, key: tuple, res: tuple):
+        """
+        Cache the result of a fuzzy match.
+        :param key: (site, user input tag)
+        :param res: (the match, its score), (None, 0) for no match.
+        """
+        self.__matches[key] = res
+        site = key[0]
+        for gram in trigrams(key[1]):
+            self.__match_grams.setdefault((site, gram), set()).add(key)
+        if len(self.__matches) > self.__match_cache_size:
+            self.__drop_match(next(iter(self.__matches)))
+
+    def __drop_match(self, key: tuple):
+        """
+        Drop a cached fuzzy match.
+        :param key: (site, user input tag)
+        """
+        del self.__matches[key]
+        site = key[0]
+        for gram in trigrams(key[1]):
+            keys = self.__match_grams[site, gram]
+            keys.discard(key)
+            if not keys:
+                del self.__match_grams[site, gram]
+
+    def __invalidate(self, site: str, new: set):
+        """
+        Drop the cached matches of a site that a new tag would change, which
+        are the ones the new tag scores at least as high as the cached match.
+        Only the cached inputs that share a trigram with a new tag are
+        scored, the index never matches an input with a tag that shares
+        none.
+        :param site: the site of the new tags.
+        :param new: the new tags.
+        """
+        cutoff = self.cutoff
+        grams = self.__match_grams
+        # {cached key: the new tags that share a trigram with it}
+        candidates = {}
+        for x in new:
+            for gram in trigrams(x):
+                for key in grams.get((site, gram), ()):
+                    candidates.setdefault(key, set()).add(x)
+        matcher = SequenceMatcher()
+        stale = []
+        for key, tags in candidates.items():
+            tag = key[1]
+            if tag in tags:
+                stale.append(key)
+                continue
+            match, score = self.__matches[key]
+            best = (score, match) if match is not None else None
+            # The quick ratios are upper bounds of the ratio, a tag whose
+            # bound is below the score of the cached match can't beat it.
+            bound = max(cutoff, score)
+            size = len(tag)
+            matcher.set_seq2(tag)
+            for x in tags:
+                # The real quick ratio, without setting up the matcher.
+                if 2.0 * min(size, len(x)) / (size + len(x)) < bound:
+                    continue
+                matcher.set_seq1(x)
+                if matcher.quick_ratio() < bound:
+                    continue
+                new_score = matcher.ratio()
+                if new_score >= cutoff and (best is None or
+                                            (new_score, x) > best):
+                    stale.append(key)
+                    break
+        for key in stale:
+            self.__drop_match(key)
+        self.__invalidations += len(stale)
 
     async def add_tags(self, site: str, tags: Union[str, List[str]]):
         """
-        Add tag(s) to the db.
+        Add tag(s) to the db. Only tags that are not in the db already are
+        written, after the flush delay.
         :param site: the site of the tag.
         :param tags: a single tag or a list of tags.
         """
-        written = False
         if site not in self.__tags:
-            self.__tags[site] = []
-        if isinstance(tags, str) and tags not in self.__tags[site] and tags:
-            self.__tags[site].append(tags)
-            written = True
-        elif isinstance(tags, list):
-            for tag in tags:
-                if tag not in self.__tags[site] and tag:
-                    self.__tags[site].append(tag)
-                    written = True
-        if written:
-            await self.__postgres.set_tags(site, self.__tags[site])
+            self.__tags[site] = set()
+        known = self.__tags[site]
+        tags = [tags] if isinstance(tags, str) else tags
+        new = {tag for tag in tags if tag and tag not in known}
+        if not new:
+            return
+        known.update(new)
+        if site in self.__indexes:
+            for tag in new:
+                self.__indexes[site].add(tag)
+        if self.__matches:
+            self.__invalidate(site, new)
+        self.__pending.setdefault(site, set()).update(new)
+        if not self.__flush_delay:
+            await self.flush()
+        elif self.__flush_task is None:
+            self.__flush_task = ensure_future(self.__delayed_flush())
+
+    async def __delayed_flush(self):
+        """
+        Flush the new tags after the flush delay.
+        """
+        await sleep(self.__flush_delay)
+        self.__flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self.__postgres.logger.log(WARN, f'Writing tags failed: {e}')
+
+    async def flush(self):
+        """
+        Write all new tags into the db.
+        :raises: any exception raised by the db, the tags that were not
+        written are kept for the next flush.
+        """
+        pending, self.__pending = self.__pending, {}
+        sites = list(pending)
+        for i, site in enumerate(sites):
+            try:
+                await self.__postgres.set_tags(site, list(pending[site]))
+            except BaseException:
+                for s in sites[i:]:
+                    self.__pending.setdefault(s, set()).update(pending[s])
+                raise
+
+    async def close(self):
+        """
+        Cancel the delayed flush and write all new tags into the db.
+        """
+        if self.__flush_task is not None:
+            self.__flush_task.cancel()
+            try:
+                await self.__flush_task
+            except CancelledError:
+                pass
+            self.__flush_task = None
+        await self.flush()
 
     def match_tag(self, site: str, tag: str) -> Optional[str]:
         """
@@ -51,7 +212,22 @@ class TagMatcher:
             return
         if self.tag_exist(site, tag):
             return tag
-        res = get_close_matches(tag, self.__tags[site], 1, cutoff=0.4)
+        key = site, tag
+        try:
+            match, _ = self.__matches[key]
+        except KeyError:
+            self.__misses += 1
+        else:
+            self.__hits += 1
+            self.__matches.move_to_end(key)
+            return match
+        if site not in self.__indexes:
+            # Sort so the index doesn't depend on the set order.
+            self.__indexes[site] = TrigramIndex(sorted(self.__tags[site]))
+        res = self.__indexes[site].match(tag, self.cutoff)
+        if self.__match_cache_size > 0:
+            # Cache no match too, as (None, 0).
+            self.__cache_match(key, res or (None, 0))
         return res[0] if res else None
 
     def tag_exist(self, site: str, tag: str) -> bool:
@@ -0,0 +1,263 @@
+"""
+A write-behind buffer that sits between the rows and the postgres db.
+"""
+from asyncio import CancelledError, Lock, ensure_future, sleep
+from logging import INFO, WARN
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, \
+    Optional, Sequence
+
+from data_controller.postgres import Postgres, _guild_types, _member_types, \
+    _user_types
+from scripts.helpers import assert_types
+
+__all__ = ['WriteBuffer']
+
+
+class WriteBuffer:
+    """
+    Collect row writes in memory and flush them into the db in batches.
+
+    Writes to the same row are coalesced so only the latest values of a row
+    are written, this class has the same setter interface as the Postgres
+    class so the rows can write to it directly.
+    """
+    __slots__ = ['__postgres', '__logger', '__interval', '__batch_size',
+                 '__max_pending', '__pending', '__lock', '__key_locks',
+                 '__task', '__writes', '__flushed']
+
+    def __init__(self, postgres: Postgres, logger, interval: float = 5,
+                 batch_size: int = 500, max_pending: int = 5000):
+        """
+        Initialize an instance of this class.
+        :param postgres: the postgres controller.
+        :param logger: the logger.
+        :param interval: the time in seconds between each periodic flush.
+        :param batch_size: the maximum number of rows per db call.
+        :param max_pending: the maximum number of unflushed rows, a write
+        that goes over this limit will wait for a flush.
+        """
+        assert interval > 0 and batch_size > 0 and max_pending > 0
+        self.__postgres = postgres
+        self.__logger = logger
+        self.__interval = interval
+        self.__batch_size = batch_size
+        self.__max_pending = max_pending
+        self.__pending = {'guild': {}, 'member': {}, 'user': {}}
+        self.__lock = Lock()
+        # {(table, key): [lock, number of calls using it]}
+        self.__key_locks = {}
+        self.__task = None
+        self.__writes = 0
+        self.__flushed = 0
+
+    def __len__(self):
+        """
+        :return: the number of rows waiting to be flushed.
+        """
+        return sum(len(d) for d in self.__pending.values())
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: a dict of {row writes received, rows written to the db,
+        rows waiting to be flushed}
+        """
+        return {
+            'writes': self.__writes,
+            'flushed': self.__flushed,
+            'pending': len(self)
+        }
+
+    def pending(self, table: str, key) -> Optional[tuple]:
+        """
+        Get the unflushed values of a row.
+        :param table: the table name, one of guild, member, user.
+        :param key: the key of the row, as it is stored in the db.
+        :return: the unflushed row values if there are any, else None.
+        """
+        return self.__pending[table].get(key)
+
+    def refresh(self, table: str, key, values: Sequence):
+        """
+        Replace the unflushed values of a row if it has any, the row is not
+        marked as dirty if it's not already.
+        :param table: the table name, one of guild, member, user.
+        :param key: the key of the row, as it is stored in the db.
+        :param values: the new values of the row.
+        """
+        if key in self.__pending[table]:
+            self.__pending[table][key] = tuple(values)
+
+    async def write_through(
+            self, table: str, keys: Iterable,
+            call: Callable[[], Awaitable[Any]]):
+        """
+        Run a db call that writes the balances of some users directly into
+        the db. Calls for the same rows run one at a time, so their results
+        are put into memory in the order they were written, calls for other
+        rows and flushes are not held up.
+        Buffered user rows leave the balance of existing rows alone, so
+        their writes don't need to go first and can't overwrite what the
+        call wrote.
+        :param table: the table name, one of guild, member, user.
+        :param keys: the keys of the rows, as they are stored in the db.
+        :param call: a callable that returns the awaitable db call.
+        :return: the result of the db call.
+        """
+        # Sorted, so two calls on the same rows can't wait on each other.
+        keys = [(table, k) for k in sorted(set(keys))]
+        locks = []
+        for key in keys:
+            entry = self.__key_locks.setdefault(key, [Lock(), 0])
+            entry[1] += 1
+            locks.append(entry[0])
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            return await call()
+        finally:
+            for lock in acquired:
+                lock.release()
+            for key in keys:
+                entry = self.__key_locks[key]
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.__key_locks[key]
+
+    async def __add(self, table: str, key, values: Sequence):
+        """
+        Mark a row as dirty, flush if there are too many dirty rows.
+        :param table: the table name.
+        :param key: the key of the row.
+        :param values: the values of the row.
+        """
+        self.__pending[table][key] = tuple(values)
+        self.__writes += 1
+        if len(self) >= self.__max_pending:
+            await self.flush()
+
+    async def set_guild(self, values: Sequence):
+        """
+        Buffer a guild row.
+        :param values: the values of that row.
+        """
+        assert_types(values, _guild_types, True)
+        await self.__add('guild', values[0], values)
+
+    async def set_member(self, values: Sequence):
+        """
+        Buffer a member row.
+        :param values: the values of that row.
+        """
+        assert_types(values, _member_types, True)
+        await self.__add('member', (values[0], values[1]), values)
+
+    async def set_user(self, values: Sequence):
+        """
+        Buffer a user row.
+        :param values: the values of that row.
+        """
+        assert_types(values, _user_types, True)
+        await self.__add('user', values[0], values)
+
+    async def set_balance(self, user_id: str, balance: int):
+        """
+        Write the balance of a user straight into the db, the buffered row of
+        that user gets the new balance too.
+        :param user_id: the user id.
+        :param balance: the balance to set to.
+        """
+        await self.write_through(
+            'user', [user_id],
+            lambda: self.__postgres.set_balance(user_id, balance)
+        )
+        pending = self.__pending['user'].get(user_id)
+        if pending:
+            self.refresh('user', user_id, (pending[0], balance, pending[2]))
+
+    async def __write(self, table: str, rows: List[tuple]):
+        """
+        Write a batch of rows into the db.
+        :param table: the table name.
+        :param rows: the rows to write.
+        """
+        writer = {
+            'guild': self.__postgres.set_guilds,
+            'member': self.__postgres.set_members,
+            'user': self.__postgres.set_users
+        }[table]
+        await writer(rows)
+
+    def __requeue(self, table: str, batch: dict):
+        """
+        Put rows that failed to write back into the buffer, rows that got
+        written to after the flush started are kept as is.
+        :param table: the table name.
+        :param batch: the rows that failed to write.
+        """
+        pending = self.__pending[table]
+        for key, values in batch.items():
+            if key not in pending:
+                pending[key] = values
+
+    async def flush(self) -> int:
+        """
+        Write all buffered rows into the db.
+        :return: the number of rows written.
+        :raises: any exception raised by the db, the rows that were not
+        written will stay in the buffer.
+        """
+        written = 0
+        async with self.__lock:
+            for table in self.__pending:
+                batch = self.__pending[table]
+                if not batch:
+                    continue
+                self.__pending[table] = {}
+                keys = list(batch)
+                for i in range(0, len(keys), self.__batch_size):
+                    chunk = keys[i:i + self.__batch_size]
+                    try:
+                        await self.__write(table, [batch[k] for k in chunk])
+                    except BaseException:
+                        self.__requeue(table, {k: batch[k] for k in keys[i:]})
+                        raise
+                    written += len(chunk)
+        self.__flushed += written
+        return written
+
+    async def __run(self):
+        """
+        Flush the buffer periodically.
+        """
+        while True:
+            await sleep(self.__interval)
+            try:
+                await self.flush()
+            except CancelledError:
+                raise
+            except Exception as e:
+                self.__logger.log(WARN, f'Write buffer flush failed: {e}')
+
+    def start(self):
+        """
+        Start flushing the buffer periodically.
+        """
+        if self.__task is None:
+            self.__task = ensure_future(self.__run())
+
+    async def close(self):
+        """
+        Stop the periodic flush and write everything left in the buffer.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except CancelledError:
+                pass
+            self.__task = None
+        written = await self.flush()
+        self.__logger.log(INFO, f'Write buffer flushed {written} rows.')
@@ -1,6 +1,7 @@
 """
 Checks for commands
 """
+from re import compile, escape
 
 from discord import ChannelType
 from discord.ext.commands import CommandError
@@ -14,6 +15,37 @@ BAD_WORD = ['loli', 'l0l1', 'lol1', 'l0li', '7071', 'lolii', 'looli', 'lolli',
             'pico', 'ショタコン', 'ショタ']
 
 
+def _trie_pattern(words) -> str:
+    """
+    Build a regex that matches any of the words. The words are merged into a
+    trie, so at each position of a string the regex engine follows one
+    branch per character instead of trying every word.
+    :param words: the words.
+    :return: the regex pattern.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for c in word:
+            node = node.setdefault(c, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [escape(c) + build(child)
+                    for c, child in sorted(node.items()) if c]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if '' in node else pattern
+
+    return build(trie)
+
+
+__BAD_WORD_REGEX = compile(_trie_pattern(BAD_WORD))
+
+
 class NsfwError(CommandError):
     pass
 
@@ -56,12 +88,19 @@ def no_badword(ctx):
     :param ctx: the context
     :return: True if it doesnt have bad words
     """
-    input_words = str.split(ctx.message.content, ' ')
-    for badword in BAD_WORD:
-        for s in input_words:
-            if badword in s.lower():
-                raise BadWordError(s)
-    return True
+    content = ctx.message.content
+    lowered = content.lower()
+    match = __BAD_WORD_REGEX.search(lowered)
+    if match is None:
+        return True
+    pos = match.start()
+    if len(lowered) != len(content):
+        # Lowercasing changed the length of some characters, but it doesn't
+        # add or remove spaces, so count them to find the word.
+        raise BadWordError(content.split(' ')[lowered.count(' ', 0, pos)])
+    end = content.find(' ', pos)
+    raise BadWordError(
+        content[content.rfind(' ', 0, pos) + 1:end if end >= 0 else None])
 
 
 def __try_get_member(ctx, ex):
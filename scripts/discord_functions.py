@@ -3,7 +3,7 @@ A collection of functions that's related to discord
 """
 from typing import Optional
 
-from discord import Channel, Forbidden, HTTPException, Role, Server
+from discord import Forbidden, Guild, HTTPException, Role, TextChannel
 from discord.utils import get
 
 
@@ -53,7 +53,7 @@ def clense_prefix(message, prefix: str):
 
 
 async def handle_forbidden_http(
-        ex: Exception, bot, channel: Channel, localize: dict, action: str):
+        ex: Exception, bot, channel: TextChannel, localize: dict, action: str):
     """
     Exception handling for Forbidden and HTTPException
     :param ex: the exception raised
@@ -89,8 +89,7 @@ def get_name_with_discriminator(member):
     return member.display_name + '#' + member.discriminator
 
 
-# FIXME Change Server to Guild after lib rewrite
-def get_server_role(role_name: str, guild: Server) -> Optional[Role]:
+def get_server_role(role_name: str, guild: Guild) -> Optional[Role]:
     """
     Get a role by name from a guild.
     :param role_name: the role name.
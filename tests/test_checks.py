@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+from scripts.checks import BAD_WORD, BadWordError, no_badword
+
+
+def _ctx(content: str):
+    return SimpleNamespace(message=SimpleNamespace(content=content))
+
+
+@pytest.mark.parametrize('word', BAD_WORD)
+def test_every_bad_word(word):
+    """
+    Test every bad word is found, in any case and inside other words.
+    """
+    with pytest.raises(BadWordError) as e:
+        no_badword(_ctx(f'some words x{word.upper()}y more words'))
+    assert str(e.value) == f'x{word.upper()}y'
+
+
+def test_offending_word():
+    """
+    Test the error has the word with the bad word as it was written.
+    """
+    with pytest.raises(BadWordError) as e:
+        no_badword(_ctx('İİ  a\tb Pretty\nKIDDO words'))
+    assert str(e.value) == 'Pretty\nKIDDO'
+
+
+def test_clean():
+    assert no_badword(_ctx('nothing to see here, move along'))
+    assert no_badword(_ctx(''))
+    assert no_badword(_ctx('lo li sho ta c p'))
+
+
+@pytest.mark.parametrize('content, word', [
+    ('Loli', 'Loli'),
+    ('first xGORE', 'xGORE'),
+    ('xkid last', 'xkid'),
+])
+def test_word_position(content, word):
+    with pytest.raises(BadWordError) as e:
+        no_badword(_ctx(content))
+    assert str(e.value) == word
@@ -0,0 +1,43 @@
+from time import sleep
+
+from bot.circuit_breaker import CLOSED, CircuitBreaker, HALF_OPEN, OPEN
+
+
+def test_open():
+    """
+    Test a circuit opens after the failure threshold, and a success resets
+    the failure count.
+    """
+    breaker = CircuitBreaker(2, 60)
+    breaker.failure('a')
+    breaker.success('a')
+    breaker.failure('a')
+    assert breaker.allow('a')
+    breaker.failure('a')
+    assert breaker.state('a') == OPEN
+    assert not breaker.allow('a')
+    assert breaker.allow('b')
+    assert breaker.states == {'a': OPEN}
+    assert 59 < breaker.retry_in('a') <= 60
+
+
+def test_half_open():
+    """
+    Test a half open circuit lets one trial through, and closes or opens
+    again depending on the trial.
+    """
+    breaker = CircuitBreaker(1, 0.05)
+    breaker.failure('a')
+    sleep(0.06)
+    assert breaker.state('a') == HALF_OPEN
+    assert breaker.allow('a')
+    assert not breaker.allow('a')
+    breaker.cancel('a')
+    assert breaker.allow('a')
+    breaker.failure('a')
+    assert breaker.state('a') == OPEN
+    sleep(0.06)
+    assert breaker.allow('a')
+    breaker.success('a')
+    assert breaker.state('a') == CLOSED
+    assert breaker.states == {}
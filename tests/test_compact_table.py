@@ -0,0 +1,78 @@
+from datetime import datetime
+from random import randint, random
+
+import pytest
+
+from data_controller.compact_rows import CompactMemberRows, CompactUserRows
+from data_controller.compact_table import CompactTable
+from data_controller.data_rows import _MemberRow, _UserRow
+
+
+def test_table():
+    """
+    Test CompactTable against a dict.
+    """
+    table = CompactTable(2, 2)
+    expected = {}
+    for _ in range(5000):
+        if expected and random() < 0.3:
+            key = next(iter(expected))
+            assert table.pop(key) == expected.pop(key)
+        else:
+            key = randint(0, 1 << 62), randint(0, 3)
+            values = randint(-100, 100), randint(-100, 100)
+            table.put(key, values)
+            expected[key] = values
+    assert len(table) == len(expected)
+    assert dict(table.items()) == expected
+    assert set(table.keys()) == set(expected)
+    for key, values in expected.items():
+        assert key in table
+        assert table.get(key) == values
+
+
+def test_rows():
+    """
+    Test rows go in and out of the compact storage unchanged.
+    """
+    members = CompactMemberRows(None)
+    users = CompactUserRows(None)
+    daily = datetime(2017, 8, 1, 12, 30, 15, 123456)
+    members[1, 2] = _MemberRow(None, ('1', '2', 3))
+    members[1, 3] = _MemberRow(None, ('1', '3', None))
+    users[1] = _UserRow(None, ('1', 100, daily))
+    users[2] = _UserRow(None, ('2', None, None))
+
+    assert members[1, 2]._row == ['1', '2', 3]
+    assert members[1, 3]._row == ['1', '3', None]
+    assert users[1]._row == ['1', 100, daily]
+    assert users[2]._row == ['2', None, None]
+    assert sorted(members.keys()) == [(1, 2), (1, 3)]
+    assert sorted(users.keys()) == [1, 2]
+    assert 3 not in users
+    users.pop(2)
+    assert len(users) == 1
+
+
+@pytest.mark.asyncio
+async def test_store_before_write():
+    """
+    Test a row is stored before it's passed on to the writer, so memory has
+    the new values while the write is pending or if it fails.
+    """
+    stored = []
+
+    class Writer:
+        async def set_user(self, values):
+            stored.append(users[1]._row)
+            raise ValueError
+
+    users = CompactUserRows(Writer())
+    try:
+        await users.set_user(('1', 100, None))
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert stored == [['1', 100, None]]
+    assert users[1]._row == ['1', 100, None]
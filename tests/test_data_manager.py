@@ -1,4 +1,4 @@
-from asyncio import coroutine
+from asyncio import coroutine, gather
 from datetime import datetime
 from random import randint
 from string import printable
@@ -7,6 +7,7 @@ from time import time as now
 import pytest
 
 from data_controller.data_manager import DataManager
+from data_controller.errors import LowBalanceError
 from data_controller.postgres import Postgres
 from scripts.helpers import random_word
 from tests import *
@@ -24,6 +25,16 @@ async def manager():
     await pool.close()
 
 
+@pytest.fixture(scope='function')
+async def manager_postgres():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    yield DataManager(pos), pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
 async def __simple_test(
         getter: coroutine, setter: coroutine, ids: tuple, values: tuple):
     """
@@ -120,6 +131,23 @@ async def test_prefix(manager):
         assert test
 
 
+async def test_prefix_starts(manager_postgres):
+    """
+    Test the first characters of the guild prefixes are kept.
+    """
+    manager, pos = manager_postgres
+    await pos.set_guild(('0', '!', None, None, None))
+    await pos.set_guild(('1', None, None, None, None))
+    await manager.init()
+    assert manager.prefix_starts == {'!'}
+    await manager.set_prefix(2, '?help')
+    await manager.set_prefix(0, '')
+    assert manager.prefix_starts == {'!', '?', ''}
+    lazy = DataManager(pos, cache_size=10, preload_guilds=False)
+    await lazy.init()
+    assert lazy.prefix_starts is None
+
+
 async def test_language(manager):
     """
     Test getting and setting language
@@ -241,3 +269,68 @@ async def test_daily(manager):
             (day0, day1)
     ):
         assert test
+
+
+async def test_shards(manager_postgres):
+    """
+    Test only rows of guilds in the owned shards are loaded.
+    """
+    manager, pos = manager_postgres
+    guild0, guild1 = 0, 1 << 22
+    await pos.set_guild((str(guild0), '!', None, None, None))
+    await pos.set_guild((str(guild1), '?', None, None, None))
+    await pos.set_member(('1', str(guild0), 1))
+    await pos.set_member(('1', str(guild1), 2))
+
+    await manager.init([0], 2)
+    assert manager.shard_ids == [0]
+    assert manager.get_prefix(guild0) == '!'
+    assert manager.get_member_warns(1, guild0) == 1
+    assert manager.get_prefix(guild1) is None
+    assert manager.get_member_warns(1, guild1) is None
+
+
+async def test_change_balance(manager_postgres):
+    """
+    Test atomic balance changes don't lose updates.
+    """
+    manager, pos = manager_postgres
+    await gather(*[manager.change_user_balance(1, 10) for _ in range(50)])
+    assert manager.get_user_balance(1) == 500
+    assert (await pos.get_user('1'))[1] == 500
+    assert await manager.change_user_balance(1, -500) == 0
+    try:
+        await manager.change_user_balance(1, -1)
+    except LowBalanceError as e:
+        assert str(e) == '0'
+    else:
+        assert False
+    try:
+        await manager.change_user_balance(2, -1)
+    except LowBalanceError:
+        assert not any(await pos.get_user('2'))
+    else:
+        assert False
+
+
+async def test_transfer_balance(manager_postgres):
+    """
+    Test atomic balance transfers.
+    """
+    manager, pos = manager_postgres
+    await manager.change_user_balance(1, 100)
+    await manager.change_user_balance(2, 100)
+    await gather(
+        *[manager.transfer_user_balance(1, 2, 1) for _ in range(20)],
+        *[manager.transfer_user_balance(2, 1, 2) for _ in range(20)]
+    )
+    assert manager.get_user_balance(1) == 120
+    assert manager.get_user_balance(2) == 80
+    try:
+        await manager.transfer_user_balance(2, 1, 81)
+    except LowBalanceError as e:
+        assert str(e) == '80'
+    else:
+        assert False
+    assert (await pos.get_user('1'))[1] == 120
+    assert (await pos.get_user('2'))[1] == 80
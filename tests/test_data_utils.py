@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+from data_controller.data_manager import DataManager
+from data_controller.data_utils import get_prefix
+from data_controller.postgres import Postgres
+from tests import *
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='function')
+async def postgres():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    yield pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
+async def test_get_prefix(postgres):
+    """
+    Test get_prefix reads the prefix of the guild of the message.
+    """
+    manager = DataManager(postgres)
+    await manager.init()
+    bot = SimpleNamespace(data_manager=manager, default_prefix='~')
+    message = SimpleNamespace(guild=SimpleNamespace(id=1))
+    assert get_prefix(bot, message) == '~'
+    await manager.set_prefix(1, '!')
+    assert get_prefix(bot, message) == '!'
+    assert get_prefix(bot, SimpleNamespace(guild=None)) == '~'
+
+
+async def test_get_prefix_not_loaded(postgres):
+    """
+    Test get_prefix falls back to the default prefix when the guild row
+    is not loaded.
+    """
+    manager = DataManager(postgres, cache_size=1, preload_guilds=False)
+    await manager.init()
+    bot = SimpleNamespace(data_manager=manager, default_prefix='~')
+    message = SimpleNamespace(guild=SimpleNamespace(id=1))
+    assert get_prefix(bot, message) == '~'
+    await manager.set_prefix(1, '!')
+    assert get_prefix(bot, message) == '!'
+    await manager.load_guild(2)
+    assert get_prefix(bot, message) == '~'
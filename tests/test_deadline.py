@@ -0,0 +1,25 @@
+from time import sleep
+
+from bot.deadline import Deadline
+
+
+def test_remaining():
+    """
+    Test the time left of a deadline goes down to 0.
+    """
+    deadline = Deadline(0.05)
+    assert 0 < deadline.remaining() <= 0.05
+    assert not deadline.expired
+    sleep(0.06)
+    assert deadline.remaining() == 0
+    assert deadline.expired
+
+
+def test_timeout():
+    """
+    Test a timeout is capped to the time left.
+    """
+    deadline = Deadline(10)
+    assert deadline.timeout(1) == 1
+    assert 9 < deadline.timeout(30) <= 10
+    assert 9 < deadline.timeout() <= 10
@@ -0,0 +1,61 @@
+from time import sleep
+from types import SimpleNamespace
+
+import pytest
+
+from bot.hifumi import Hifumi
+from data_controller.data_manager import DataManager
+from data_controller.postgres import Postgres
+from tests import *
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='function')
+async def postgres():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    yield pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
+def _mock_bot(manager):
+    bot = SimpleNamespace(
+        data_manager=manager,
+        language=SimpleNamespace(get=lambda lan, file, key: lan)
+    )
+    bot.lan = lambda ctx_msg: Hifumi.lan(bot, ctx_msg)
+    return bot
+
+
+async def test_lan_evicted(postgres):
+    """
+    Test lan falls back to en when the guild row is evicted.
+    """
+    manager = DataManager(postgres, cache_size=1, preload_guilds=False)
+    await manager.init()
+    bot = _mock_bot(manager)
+    message = SimpleNamespace(guild=SimpleNamespace(id=1))
+    await manager.set_language(1, 'ja')
+    assert Hifumi.lan(bot, message) == 'ja'
+    await manager.load_guild(2)
+    assert Hifumi.lan(bot, message) == 'en'
+    assert Hifumi.translate(bot, message, 'sentence', 'ex_error') == 'en'
+
+
+async def test_lan_expired(postgres):
+    """
+    Test lan falls back to en when the guild row expires.
+    """
+    manager = DataManager(
+        postgres, cache_size=8, cache_ttl=0.1, preload_guilds=False)
+    await manager.init()
+    bot = _mock_bot(manager)
+    message = SimpleNamespace(guild=SimpleNamespace(id=1))
+    await manager.set_language(1, 'ja')
+    assert Hifumi.translate(bot, message, 'sentence', 'ex_error') == 'ja'
+    sleep(0.2)
+    assert Hifumi.lan(bot, message) == 'en'
+    assert Hifumi.translate(bot, message, 'sentence', 'ex_error') == 'en'
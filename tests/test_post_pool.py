@@ -0,0 +1,48 @@
+from asyncio import CancelledError, ensure_future, gather, sleep
+
+import pytest
+
+from core.post_pool import PostPool
+from tests import MockLogger
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_cancelled_waiter():
+    """
+    Test cancelling one caller waiting on a refill doesn't cancel the refill
+    for the other callers.
+    """
+    pool = PostPool(MockLogger(), low=0)
+    key = PostPool.key('site', ['tag'], None)
+
+    async def fetch():
+        await sleep(0.01)
+        return [('url0', ['tag']), ('url1', ['tag'])]
+
+    first = ensure_future(pool.take(key, fetch))
+    second = ensure_future(pool.take(key, fetch))
+    await sleep(0)
+    first.cancel()
+    with pytest.raises(CancelledError):
+        await first
+    assert (await second)[0] in ('url0', 'url1')
+    assert pool.stats['refills'] == 1
+    assert pool.stats['posts'] == 1
+
+
+async def test_close():
+    """
+    Test callers waiting on a refill get None when the pool is closed.
+    """
+    pool = PostPool(MockLogger())
+    key = PostPool.key('site', ['tag'], None)
+
+    async def fetch():
+        await sleep(1)
+        return [('url', ['tag'])]
+
+    waiters = [ensure_future(pool.take(key, fetch)) for _ in range(2)]
+    await sleep(0)
+    await pool.close()
+    assert await gather(*waiters) == [None, None]
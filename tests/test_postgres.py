@@ -102,6 +102,8 @@ async def test_user_row(postgres):
     assert await postgres.get_user(user_id) == none_val
 
     await postgres.set_user(expected)
+    assert await postgres.get_user(user_id) == (user_id, 0, daily)
+    await postgres.set_balance(user_id, balance)
     assert await postgres.get_user(user_id) == expected
 
     try:
@@ -138,3 +140,25 @@ async def test_tags(postgres):
         await postgres.set_tags(site, tags)
 
     assert await postgres.get_tags() == expected
+
+
+async def test_prepared_pool():
+    """
+    Test Postgres with statements prepared by the pool init.
+    """
+    pool = await _get_pool()
+    await pool.close()
+    pos = await Postgres.create(
+        SCHEMA, MockLogger(), database='hifumi_testing', user='postgres',
+        min_size=2, max_size=2
+    )
+    try:
+        vals = ('1', '?', 'en', '2', ['3'])
+        await pos.set_guild(vals)
+        assert await pos.get_guild('1') == vals
+        assert await pos.change_balance('1', 10) == 10
+        assert await pos.get_user('1') == ('1', 10, None)
+    finally:
+        async with pos.pool.acquire() as conn:
+            await _clear_db(conn)
+        await pos.pool.close()
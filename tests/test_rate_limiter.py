@@ -0,0 +1,48 @@
+from asyncio import gather
+from time import monotonic
+
+import pytest
+
+from bot.rate_limiter import RateLimiter, parse_retry_after
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_rate():
+    """
+    Test requests over the burst wait for the rate, and requests that would
+    wait longer than the budget are rejected.
+    """
+    limiter = RateLimiter({'a.com': {'rate': 20, 'burst': 2}}, 0.12)
+    start = monotonic()
+    res = await gather(*(limiter.acquire('a.com') for _ in range(6)))
+    assert res == [True] * 4 + [False] * 2
+    assert 0.09 <= monotonic() - start < 0.2
+    stats = limiter.stats['a.com']
+    assert (stats['requests'], stats['waits'], stats['rejected']) == (4, 2, 2)
+    assert await limiter.acquire('b.com')
+
+
+async def test_api_keys():
+    """
+    Test each API key has its own bucket.
+    """
+    limiter = RateLimiter({'a.com': {'rate': 1}}, 0)
+    assert await limiter.acquire('a.com', {'api_key': 'foo', 'q': 'a'})
+    assert not await limiter.acquire('a.com', {'api_key': 'foo', 'q': 'b'})
+    assert await limiter.acquire('a.com', {'api_key': 'bar'})
+
+
+async def test_retry_after():
+    """
+    Test a Retry-After blocks the requests to a host.
+    """
+    limiter = RateLimiter({}, 0.5)
+    limiter.limited('a.com', None, parse_retry_after('0.05'))
+    start = monotonic()
+    assert await limiter.acquire('a.com')
+    assert monotonic() - start >= 0.04
+    limiter.limited('a.com', None, 1)
+    assert not await limiter.acquire('a.com')
+    assert limiter.stats['a.com']['limited'] == 2
+    assert parse_retry_after('foo') is None
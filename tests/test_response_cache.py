@@ -0,0 +1,59 @@
+from pathlib import Path
+from time import sleep
+
+from bot.response_cache import ResponseCache
+
+
+def test_key():
+    """
+    Test cache keys ignore parameter order and leave out secrets.
+    """
+    a = ResponseCache.key(
+        'http://a.com/b?appid=1&q=x', {'api_key': 'foo', 'n': 1})
+    b = ResponseCache.key('http://a.com/b', {'n': '1', 'q': 'x', 'key': 'k'})
+    assert a == b == 'http://a.com/b?n=1&q=x'
+
+
+def test_rules():
+    """
+    Test only urls that match a rule are cached, with the first rule used.
+    """
+    cache = ResponseCache([
+        {'pattern': r'^http://a\.com/\d+', 'ttl': 1},
+        {'pattern': r'^http://a\.com/', 'ttl': 2}
+    ])
+    assert cache.rule('http://a.com/1').ttl == 1
+    assert cache.rule('http://a.com/random').ttl == 2
+    assert cache.rule('http://b.com/1') is None
+
+
+def test_stale():
+    """
+    Test entries are fresh for their ttl, then stale until they expire.
+    """
+    cache = ResponseCache([{'pattern': '', 'ttl': 0.05, 'stale': 0.1}])
+    cache.put('a', cache.rule('a'), {'foo': 1})
+    assert cache.get('a') == ({'foo': 1}, True)
+    sleep(0.06)
+    assert cache.get('a') == ({'foo': 1}, False)
+    sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats['stale_hits'] == 1
+
+
+def test_spill(tmpdir):
+    """
+    Test entries pushed out of memory are read back from disk.
+    """
+    cache = ResponseCache(
+        [{'pattern': '', 'ttl': 60}], 1,
+        Path(str(tmpdir)).joinpath('cache', 'responses')
+    )
+    rule = cache.rule('')
+    cache.put('a', rule, 1)
+    cache.put('b', rule, 2)
+    assert cache.stats['size'] == 1
+    assert cache.get('a') == (1, True)
+    assert cache.get('b') == (2, True)
+    assert cache.stats['spill_hits'] == 2
+    cache.close()
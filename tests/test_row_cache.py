@@ -0,0 +1,84 @@
+from time import sleep
+
+import pytest
+
+from data_controller.data_manager import DataManager
+from data_controller.errors import RowNotLoadedError
+from data_controller.postgres import Postgres
+from data_controller.row_cache import RowCache
+from tests import *
+
+
+@pytest.fixture(scope='function')
+async def postgres():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    yield pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
+def test_lru():
+    """
+    Test the least recently used row is evicted.
+    """
+    cache = RowCache(2)
+    cache[0] = 'a'
+    cache[1] = 'b'
+    assert cache[0] == 'a'
+    cache[2] = 'c'
+    assert 1 not in cache
+    assert 0 in cache and 2 in cache
+    try:
+        cache[1]
+    except KeyError:
+        pass
+    else:
+        assert False
+    assert cache.stats == {
+        'size': 2, 'max_size': 2, 'hits': 1, 'misses': 1,
+        'evictions': 1, 'expirations': 0
+    }
+
+
+def test_ttl():
+    """
+    Test rows expire after the time to live.
+    """
+    cache = RowCache(2, 0.01)
+    cache[0] = 'a'
+    assert cache[0] == 'a'
+    sleep(0.02)
+    assert 0 not in cache
+    try:
+        cache[0]
+    except KeyError:
+        pass
+    else:
+        assert False
+    assert cache.stats['expirations'] == 1
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_lazy_manager(postgres):
+    """
+    Test DataManager loads rows on first use in cache mode.
+    """
+    await postgres.set_user(('1', 100, None))
+    await postgres.set_user(('2', 200, None))
+    manager = DataManager(postgres, cache_size=1, preload_guilds=False)
+    await manager.init()
+    with pytest.raises(RowNotLoadedError):
+        manager.get_user_balance(1)
+    await manager.load_user(1)
+    assert manager.get_user_balance(1) == 100
+    await manager.set_user_balance(2, 300)
+    assert manager.get_user_balance(2) == 300
+    with pytest.raises(RowNotLoadedError):
+        manager.get_user_balance(1)
+    await manager.load_user(1)
+    assert manager.get_user_balance(1) == 100
+    assert (await postgres.get_user('2'))[1] == 300
+    assert manager.cache_stats['user']['evictions'] == 2
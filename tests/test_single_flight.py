@@ -0,0 +1,73 @@
+from asyncio import CancelledError, ensure_future, gather, sleep
+
+import pytest
+
+from bot.single_flight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_coalesce():
+    """
+    Test concurrent calls with the same key share one call.
+    """
+    flight = SingleFlight()
+    calls = []
+
+    async def call(val):
+        calls.append(val)
+        await sleep(0.01)
+        return val
+
+    res = await gather(
+        flight.do('a', lambda: call(1)),
+        flight.do('a', lambda: call(2)),
+        flight.do('b', lambda: call(3))
+    )
+    assert res == [1, 1, 3]
+    assert calls == [1, 3]
+    assert flight.stats == {'started': 2, 'coalesced': 1, 'in_flight': 0}
+
+
+async def test_exception():
+    """
+    Test every caller gets the exception of the shared call.
+    """
+    flight = SingleFlight()
+
+    async def call():
+        await sleep(0.01)
+        raise ValueError
+
+    res = await gather(
+        flight.do('a', call), flight.do('a', call), return_exceptions=True)
+    assert all(isinstance(e, ValueError) for e in res)
+
+
+async def test_cancel():
+    """
+    Test a cancelled caller doesn't cancel the call for the other callers,
+    and the last caller cancels the call.
+    """
+    flight = SingleFlight()
+    done = []
+
+    async def call():
+        await sleep(0.05)
+        done.append(1)
+        return 1
+
+    first = ensure_future(flight.do('a', call))
+    second = ensure_future(flight.do('a', call))
+    await sleep(0.01)
+    first.cancel()
+    assert await second == 1
+    with pytest.raises(CancelledError):
+        await first
+
+    last = ensure_future(flight.do('b', call))
+    await sleep(0.01)
+    last.cancel()
+    await sleep(0.06)
+    assert done == [1]
+    assert flight.stats['in_flight'] == 0
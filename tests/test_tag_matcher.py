@@ -0,0 +1,84 @@
+from asyncio import sleep
+
+import pytest
+
+from data_controller.postgres import Postgres
+from data_controller.tag_matcher import TagMatcher
+from tests import *
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='function')
+async def postgres():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    yield pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
+async def test_add_tags(postgres):
+    """
+    Test new tags are written after the flush delay.
+    """
+    await postgres.set_tags('foo', ['a', 'b'])
+    matcher = TagMatcher(postgres, await postgres.get_tags(), 0.05)
+    await matcher.add_tags('foo', ['a', 'c', ''])
+    await matcher.add_tags('foo', 'd')
+    await matcher.add_tags('bar', ['a'])
+    assert matcher.tag_exist('foo', 'c')
+    assert matcher.tag_exist('bar', 'a')
+    assert sorted((await postgres.get_tags())['foo']) == ['a', 'b']
+    await sleep(0.1)
+    tags = await postgres.get_tags()
+    assert sorted(tags['foo']) == ['a', 'b', 'c', 'd']
+    assert tags['bar'] == ['a']
+
+
+async def test_close(postgres):
+    """
+    Test close writes the new tags right away.
+    """
+    matcher = TagMatcher(postgres, {}, 60)
+    await matcher.add_tags('foo', ['a', 'b'])
+    await matcher.close()
+    assert sorted((await postgres.get_tags())['foo']) == ['a', 'b']
+
+
+async def test_match_tag(postgres):
+    """
+    Test fuzzy matching picks the same tag as difflib, and sees new tags.
+    """
+    tags = ['long_hair', 'short_hair', 'blue_eyes', 'school_uniform']
+    matcher = TagMatcher(postgres, {'foo': tags}, 0)
+    assert matcher.match_tag('foo', 'blue_eyes') == 'blue_eyes'
+    assert matcher.match_tag('foo', 'long_hiar') == 'long_hair'
+    assert matcher.match_tag('foo', 'shcool_uniform') == 'school_uniform'
+    assert matcher.match_tag('foo', 'zzzz') is None
+    assert matcher.match_tag('bar', 'long_hair') is None
+    await matcher.add_tags('foo', 'red_eyes')
+    assert matcher.match_tag('foo', 'red_eye') == 'red_eyes'
+
+
+async def test_match_cache(postgres):
+    """
+    Test fuzzy matches are cached, and only the ones a new tag changes are
+    dropped.
+    """
+    matcher = TagMatcher(postgres, {'foo': ['long_hair', 'blue_eyes']}, 0)
+    assert matcher.match_tag('foo', 'long_hiar') == 'long_hair'
+    assert matcher.match_tag('foo', 'cat_tial') is None
+    assert matcher.match_tag('foo', 'long_hiar') == 'long_hair'
+    assert matcher.match_tag('foo', 'cat_tial') is None
+    stats = matcher.match_stats
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 2, 2)
+    await matcher.add_tags('foo', 'cat_tail')
+    assert matcher.match_stats['invalidations'] == 1
+    assert matcher.match_tag('foo', 'cat_tial') == 'cat_tail'
+    assert matcher.match_tag('foo', 'long_hiar') == 'long_hair'
+    assert matcher.match_stats['hits'] == 3
+    await matcher.add_tags('foo', ['zzzz', 'long_hat'])
+    assert matcher.match_stats['invalidations'] == 1
+    assert matcher.match_tag('foo', 'long_hiar') == 'long_hair'
@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import pytest
+
+from data_controller.data_manager import DataManager
+from data_controller.postgres import Postgres
+from data_controller.write_buffer import WriteBuffer
+from tests import *
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='function')
+async def buffered():
+    pool = await _get_pool()
+    pos = Postgres(pool, SCHEMA, MockLogger())
+    buffer = WriteBuffer(pos, MockLogger(), batch_size=2, max_pending=10)
+    yield buffer, pos
+    async with pool.acquire() as conn:
+        await _clear_db(conn)
+    await pool.close()
+
+
+async def test_coalesce(buffered):
+    """
+    Test writes to the same row are coalesced and only written on flush.
+    """
+    buffer, pos = buffered
+    for i in range(5):
+        await buffer.set_user(('1', i, None))
+    await buffer.set_member(('1', '2', 3))
+    await buffer.set_guild(('1', '?', 'en', None, None))
+    assert len(buffer) == 3
+    assert buffer.pending('user', '1') == ('1', 4, None)
+    assert not any(await pos.get_user('1'))
+
+    assert await buffer.flush() == 3
+    assert len(buffer) == 0
+    assert await pos.get_user('1') == ('1', 4, None)
+    assert await pos.get_member('1', '2') == ('1', '2', 3)
+    assert await pos.get_guild('1') == ('1', '?', 'en', None, None)
+    assert buffer.stats == {'writes': 7, 'flushed': 3, 'pending': 0}
+
+
+async def test_max_pending(buffered):
+    """
+    Test the buffer flushes by itself when it's full.
+    """
+    buffer, pos = buffered
+    now = datetime.now()
+    for i in range(10):
+        await buffer.set_user((str(i), i, now))
+    assert len(buffer) == 0
+    for i in range(10):
+        assert await pos.get_user(str(i)) == (str(i), i, now)
+
+
+async def test_bad_values(buffered):
+    """
+    Test bad values are rejected before they get into the buffer.
+    """
+    buffer = buffered[0]
+    try:
+        await buffer.set_user(('1', '100', None))
+    except AssertionError:
+        pass
+    else:
+        assert False
+    finally:
+        assert len(buffer) == 0
+
+
+async def test_data_manager(buffered):
+    """
+    Test DataManager writes through the buffer, balances are written
+    straight into the db.
+    """
+    buffer, pos = buffered
+    manager = DataManager(pos, buffer)
+    daily = datetime(2018, 1, 1)
+    await manager.set_user_daily(1, daily)
+    await manager.set_user_balance(1, 100)
+    await manager.set_member_warns(1, 2, 3)
+    assert manager.get_user_balance(1) == 100
+    assert manager.get_member_warns(1, 2) == 3
+    assert await pos.get_user('1') == ('1', 100, None)
+    assert not any(await pos.get_member('1', '2'))
+    assert buffer.pending('user', '1') == ('1', 100, daily)
+    await manager.close()
+    assert await pos.get_user('1') == ('1', 100, daily)
+    assert await pos.get_member('1', '2') == ('1', '2', 3)
+
+
+async def test_balance_not_overwritten(buffered):
+    """
+    Test a flush of a buffered user row doesn't undo a balance change made
+    while the row was buffered.
+    """
+    buffer, pos = buffered
+    manager = DataManager(pos, buffer)
+    await manager.change_user_balance(1, 50)
+    await manager.set_user_daily(1, datetime(2018, 1, 1))
+    await pos.change_balance('1', 25)
+    await buffer.flush()
+    assert (await pos.get_user('1'))[1] == 75
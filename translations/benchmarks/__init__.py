@@ -0,0 +1,4 @@
+"""
+Benchmarks for the translations, run them with
+``python -m benchmarks.<module name>`` from the translations folder.
+"""
@@ -0,0 +1,48 @@
+"""
+Compare Translation.get on the flat per-language tables with the nested
+lookup it did before, over every key of every language.
+"""
+from sys import argv
+from timeit import repeat
+
+from translations import Translation
+
+
+def nested_get(data, lan, file, key):
+    """
+    The lookup Translation.get did before the flat tables.
+    """
+    if not file.endswith('.json'):
+        file = f'{file}.json'
+    language_data = data[lan][file]
+    english_data = data['en'][file][key]
+    return language_data.get(key, english_data)
+
+
+def main(rounds: int):
+    tr = Translation()
+    data = tr._data
+    lookups = [
+        (lan, file_name[:-5], key)
+        for lan in data
+        for file_name, file_data in data['en'].items()
+        for key in file_data
+    ]
+
+    def flat():
+        for args in lookups:
+            tr.get(*args)
+
+    def nested():
+        for args in lookups:
+            nested_get(data, *args)
+
+    flat_time = min(repeat(flat, number=rounds, repeat=5)) / rounds
+    nested_time = min(repeat(nested, number=rounds, repeat=5)) / rounds
+    print(f'{len(lookups)} lookups: flat {flat_time * 1e3:.3f}ms, '
+          f'nested {nested_time * 1e3:.3f}ms, '
+          f'{nested_time / flat_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 20)
@@ -0,0 +1,40 @@
+"""
+Compare rendering the English strings as Templates with str.format on the
+same strings.
+"""
+from sys import argv
+from timeit import repeat
+
+from translations import Template, Translation
+
+
+def main(rounds: int):
+    tr = Translation(None)
+    args = 'Hifumi', 'Takimoto', 12345
+    templates = [
+        val for val in tr._Translation__table('en').values()
+        if isinstance(val, Template) and val.fields and
+        all(isinstance(f, int) for f in val.fields) and
+        max(val.fields) < len(args) and '[' not in val and '.' not in val
+    ]
+    texts = [str(t) for t in templates]
+
+    def compiled():
+        for t in templates:
+            t.format(*args)
+
+    def parsed():
+        for t in texts:
+            t.format(*args)
+
+    # The first call compiles every template.
+    compiled()
+    compiled_time = min(repeat(compiled, number=rounds, repeat=5)) / rounds
+    parsed_time = min(repeat(parsed, number=rounds, repeat=5)) / rounds
+    print(f'{len(templates)} templates: compiled '
+          f'{compiled_time * 1e3:.3f}ms, str.format '
+          f'{parsed_time * 1e3:.3f}ms, {parsed_time / compiled_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 100)
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from translations import Translation, compile_translations
+
+
+def test_lazy_load():
+    tr = Translation(None)
+    assert not tr._tables
+    assert 'en' in tr and 'es' in tr and 'xx' not in tr
+    tr.get('es', 'sentence', 'ex_error')
+    assert set(tr._tables) == {'en', 'es'}
+
+
+def test_compiled(tmpdir):
+    path = compile_translations(Path(str(tmpdir), 'compiled.bin'))
+    compiled = Translation(path)
+    assert compiled._Translation__compiled is not None
+    source = Translation(None)
+    assert compiled.languages == source.languages
+    assert compiled._data == source._data
+    for lan in source.languages:
+        for file_name, file_data in source.en.items():
+            for key in file_data:
+                assert (compiled.get(lan, file_name[:-5], key) ==
+                        source.get(lan, file_name[:-5], key))
+
+
+def test_bad_compiled(tmpdir):
+    path = Path(str(tmpdir), 'compiled.bin')
+    path.write_bytes(b'not a compiled file')
+    tr = Translation(path)
+    assert tr._Translation__compiled is None
+    assert tr.get('en', 'sentence', 'ex_error')
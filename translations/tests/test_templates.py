@@ -0,0 +1,91 @@
+from collections import namedtuple
+
+import pytest
+
+from translations import Template, TemplateError, get_all_data, flatten
+from translations.templates import template_table
+
+Video = namedtuple('Video', 'title uploader')
+
+
+@pytest.mark.parametrize('text, args, kwargs', [
+    ('plain {{text}}', (), {}),
+    ('{} and {}', (1, 'two'), {}),
+    ('{1} {0} {1}', ('a', 'b'), {}),
+    ('{name} has {} coins', (5,), {'name': 'Hifumi'}),
+    ('{0.title} by {0.uploader}', (Video('song', 'me'),), {}),
+    ('{0[0]}: {0[1]}, {1[key]}', (['a', 'b'], {'key': 'c'}), {}),
+    ('{!r:>10}|{:.2f}', ('x', 3.14159), {}),
+    ('{:{width}}|', ('x',), {'width': 5}),
+    ('{} extra args', (1, 2, 3), {'unused': 4}),
+])
+def test_render(text, args, kwargs):
+    template = Template(text)
+    assert template == text
+    assert template.format(*args, **kwargs) == text.format(*args, **kwargs)
+    # Second call goes to the compiled function.
+    assert template.format(*args, **kwargs) == text.format(*args, **kwargs)
+
+
+def test_keyword_attribute():
+    """
+    Test attributes named like keywords fall back to str.format.
+    """
+    class Obj:
+        pass
+
+    obj = Obj()
+    setattr(obj, 'if', 'a')
+    setattr(obj, 'class', 'b')
+    template = Template('{0.if} {0.class}')
+    assert template.format(obj) == template.format(obj) == 'a b'
+
+
+@pytest.mark.parametrize('text, args, kwargs, error', [
+    ('{} and {}', (1,), {}, IndexError),
+    ('{1}', ('a',), {}, IndexError),
+    ('hi {name}', (), {'nombre': 'x'}, KeyError),
+    ('{0[key]}', ({},), {}, KeyError),
+])
+def test_missing_args(text, args, kwargs, error):
+    """
+    Test missing arguments raise what str.format raises.
+    """
+    template = Template(text)
+    for _ in range(2):
+        with pytest.raises(error):
+            template.format(*args, **kwargs)
+
+
+@pytest.mark.parametrize('text', ['{', '{0} {}', '{!x}', '{0.}'])
+def test_invalid(text):
+    with pytest.raises(TemplateError):
+        Template(text)
+
+
+def test_check():
+    english, _ = template_table({
+        ('f', 'a'): '{} and {}',
+        ('f', 'b'): 'hi {name}',
+        ('f', 'c'): '{} items'
+    })
+    table, errors = template_table({
+        ('f', 'a'): '{1} y {0}',
+        ('f', 'b'): 'hola {nombre}',
+        ('f', 'c'): '{0} cosas'
+    }, english)
+    assert set(table) == {('f', 'a'), ('f', 'c')}
+    assert len(errors) == 1 and errors[0].startswith('f/b')
+
+
+def test_shipped_translations():
+    """
+    Test every shipped string is valid and matches the English placeholders.
+    """
+    data = get_all_data()
+    english, errors = template_table(flatten(data.pop('en')))
+    assert not errors
+    for lan, lan_data in data.items():
+        _, errors = template_table(flatten(lan_data), english)
+        assert not errors, lan
+
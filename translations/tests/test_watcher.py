@@ -0,0 +1,55 @@
+from json import dump, load
+from pathlib import Path
+from shutil import copytree
+
+import translations as tr_module
+from translations import Translation, TranslationWatcher
+
+
+def edit(path, key, value):
+    with path.open(encoding='utf-8') as f:
+        data = load(f)
+    if value is None:
+        del data[key]
+    else:
+        data[key] = value
+    with path.open('w', encoding='utf-8') as f:
+        dump(data, f)
+
+
+def test_watcher(tmpdir, monkeypatch):
+    folder = Path(str(tmpdir), 'language_data')
+    copytree(str(tr_module.LANGUAGE_PATH), str(folder))
+    monkeypatch.setattr(tr_module, 'LANGUAGE_PATH', folder)
+    tr = Translation(None)
+    watcher = TranslationWatcher(tr)
+    assert watcher.check() == []
+    es = tr.get('es', 'sentence', 'ex_error')
+    tables = tr._tables
+    es_path = folder.joinpath('es', 'sentence.json')
+    en_path = folder.joinpath('en', 'sentence.json')
+
+    edit(es_path, 'ex_error', 'nuevo')
+    assert watcher.check() == [('es', 'sentence.json')]
+    assert tr.get('es', 'sentence', 'ex_error') == 'nuevo'
+    # The old tables are never changed.
+    assert tables['es']['sentence', 'ex_error'] == es
+
+    # English changes reach the fallbacks of the other languages.
+    edit(es_path, 'ex_error', None)
+    edit(en_path, 'ex_error', 'new')
+    assert watcher.check() == [('en', 'sentence.json'),
+                               ('es', 'sentence.json')]
+    assert tr.get('es', 'sentence', 'ex_error') == 'new'
+    assert tr.get('en', 'sentence', 'ex_error') == 'new'
+
+    # A broken file keeps the old data.
+    en_path.write_text('{"ex_error": ', encoding='utf-8')
+    assert watcher.check() == [('en', 'sentence.json')]
+    assert tr.get('en', 'sentence', 'ex_error') == 'new'
+
+
+def test_thread():
+    watcher = TranslationWatcher(Translation(None), 0.01)
+    watcher.start()
+    watcher.stop()
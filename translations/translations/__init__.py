@@ -1,9 +1,23 @@
+import marshal
 from json import load
+from logging import getLogger
+from mmap import ACCESS_READ, mmap
+from os import replace
 from pathlib import Path
+from struct import Struct, error as StructError
+from threading import Event, RLock, Thread
 
 from language_data import LANGUAGE_PATH
+from .templates import Template, TemplateError, template_table
 
-__all__ = ['Translation']
+__all__ = ['Translation', 'TranslationWatcher', 'compile_translations',
+           'COMPILED_PATH', 'Template', 'TemplateError']
+
+COMPILED_PATH = LANGUAGE_PATH.joinpath('compiled.bin')
+
+# Magic bytes, marshal version and header length of a compiled file.
+_HEADER = Struct('<8sII')
+_MAGIC = b'HIFUMITR'
 
 
 def _good_folder(path):
@@ -26,49 +40,371 @@ def _good_folder(path):
     return False
 
 
+def index_languages():
+    """
+    Find the language folders, without reading them.
+
+    :return: A dict of {language name: folder path}
+    """
+    return {
+        path.name: path for path in map(Path, LANGUAGE_PATH.iterdir())
+        if _good_folder(path)
+    }
+
+
+def _json_files(folder):
+    """
+    :param folder: a language folder.
+
+    :return: The paths of the json files in the folder.
+    """
+    return [Path(f) for f in folder.iterdir() if f.name.endswith('.json')]
+
+
+def get_language_data(folder):
+    """
+    Get the data of one language.
+
+    :param folder: the language folder.
+
+    :return: The language data in a dict of {file name: {key: str}}
+    """
+    res = {}
+    for fp in _json_files(folder):
+        with fp.open(encoding='utf-8') as f:
+            res[fp.name] = load(f)
+    return res
+
+
 def get_all_data():
     """
     Get all language data.
 
     :return: All of the language data in a dict.
     """
+    return {
+        lan: get_language_data(folder)
+        for lan, folder in index_languages().items()
+    }
+
+
+def flatten(language_data):
+    """
+    Flatten the data of a language into one table.
+
+    :param language_data: the data of the language, {file name: {key: str}}
+
+    :return: A dict of {(file name without .json, key): str}
+    """
     res = {}
-    for folder in LANGUAGE_PATH.iterdir():
-        path = Path(folder)
-        lan_name = path.name
-        if not _good_folder(path):
-            continue
-        for file in path.iterdir():
-            if not file.name.endswith('.json'):
-                continue
-            fp = Path(file)
-            fname = fp.name
-            with fp.open() as f:
-                dict_ = load(f, encoding='utf-8')
-            if lan_name not in res:
-                res[lan_name] = {}
-            res[lan_name][fname] = dict_
+    for fname, strings in language_data.items():
+        if fname.endswith('.json'):
+            fname = fname[:-5]
+        for key, val in strings.items():
+            res[fname, key] = val
     return res
 
 
+def _build_table(lan, source, english=None):
+    """
+    Build the table of a language, the strings are parsed into Templates
+    and the ones that are broken are logged and left to English.
+
+    :param lan: the language name.
+
+    :param source: the language data, {file name: {key: str}}
+
+    :param english: the English table, None for English itself.
+
+    :return:
+        A dict of {(file name without .json, key): Template}, with the
+        English strings for the keys the language doesn't have.
+    """
+    table, errors = template_table(flatten(source), english)
+    for error in errors:
+        getLogger(__name__).warning(f'Broken translation {lan}/{error}')
+    if english is None:
+        return table
+    return {**english, **table}
+
+
+def compile_translations(path=COMPILED_PATH):
+    """
+    Compile the json files of every language into one file that can be
+    opened without parsing any json, and read one language at a time.
+
+    The file has a header with the offset and size of each language, and
+    the data of each language in marshal format. Marshal format
+    depends on the Python version, a file written by another version is
+    ignored by Translation.
+
+    :param path: the path of the file to write.
+
+    :return: The path of the file.
+    """
+    blobs = []
+    index = {}
+    offset = 0
+    for lan, folder in sorted(index_languages().items()):
+        blob = marshal.dumps(get_language_data(folder))
+        index[lan] = offset, len(blob)
+        offset += len(blob)
+        blobs.append(blob)
+    index = marshal.dumps(index)
+    tmp = path.with_name(path.name + '.tmp')
+    with tmp.open('wb') as f:
+        f.write(_HEADER.pack(_MAGIC, marshal.version, len(index)))
+        f.write(index)
+        for blob in blobs:
+            f.write(blob)
+    replace(str(tmp), str(path))
+    return path
+
+
+class _Compiled:
+    """
+    A compiled translation file, memory mapped so only the languages that
+    are read are paged in.
+    """
+    __slots__ = ('__file', '__map', '__index', '__start')
+
+    def __init__(self, path):
+        """
+        Open a compiled translation file.
+
+        :param path: the path of the file.
+
+        :raises ValueError: if the file is not a compiled translation file
+        of this Python version.
+        """
+        self.__file = path.open('rb')
+        try:
+            self.__map = mmap(self.__file.fileno(), 0, access=ACCESS_READ)
+            magic, version, size = _HEADER.unpack_from(self.__map)
+            if magic != _MAGIC or version != marshal.version:
+                raise ValueError(f'{path} is not a compiled translation file')
+            self.__start = _HEADER.size + size
+            self.__index = marshal.loads(self.__map[_HEADER.size:self.__start])
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def languages(self):
+        return self.__index.keys()
+
+    def load(self, lan):
+        """
+        :param lan: the language name.
+
+        :return: The data of the language.
+
+        :raises KeyError: if the language is not in the file.
+        """
+        offset, size = self.__index[lan]
+        start = self.__start + offset
+        return marshal.loads(self.__map[start:start + size])
+
+    def close(self):
+        if getattr(self, '_Compiled__map', None) is not None:
+            self.__map.close()
+            self.__map = None
+        self.__file.close()
+
+
+def _open_compiled(path, folders):
+    """
+    Open a compiled translation file if it's up to date with the json files.
+
+    :param path: the path of the file.
+
+    :param folders: a dict of {language name: folder path}
+
+    :return: The opened file, None if it's missing, out of date or invalid.
+    """
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    for folder in folders.values():
+        if any(f.stat().st_mtime > mtime for f in _json_files(folder)):
+            return None
+    try:
+        compiled = _Compiled(path)
+    except (OSError, ValueError, EOFError, StructError):
+        return None
+    if set(compiled.languages) != set(folders):
+        compiled.close()
+        return None
+    return compiled
+
+
 class Translation:
     """
     Class to provide translation support for Hifumi.
+
+    The language folders are indexed when the class is loaded, and a
+    language is read on its first use, from the compiled file if it's up
+    to date with the json files, else from the json files.
+
+    The tables are never changed once built, a language that is read or
+    updated is swapped in with a new dict of tables, so get never sees a
+    table that is half built and doesn't need the lock.
     """
-    __slots__ = ('_data',)
+    __slots__ = ('_tables', '__folders', '__compiled', '__sources',
+                 '__changed', '__lock')
 
-    def __init__(self):
+    def __init__(self, compiled_path=COMPILED_PATH):
         """
         Init the class.
+
+        :param compiled_path:
+            the path of the compiled translation file, None to always read
+            the json files.
         """
-        self._data = {}
-        self.reload()
+        self._tables = {}
+        self.__folders = {}
+        self.__compiled = None
+        self.__sources = {}
+        self.__changed = set()
+        self.__lock = RLock()
+        self.reload(compiled_path)
 
-    def reload(self):
+    def reload(self, compiled_path=COMPILED_PATH):
         """
         Reload the class with new data read from disk.
+
+        :param compiled_path:
+            the path of the compiled translation file, None to always read
+            the json files.
+        """
+        folders = index_languages()
+        compiled = None
+        if compiled_path is not None:
+            compiled = _open_compiled(compiled_path, folders)
+        with self.__lock:
+            old = self.__compiled
+            self.__folders = folders
+            self.__compiled = compiled
+            self.__sources = {}
+            self.__changed = set()
+            self._tables = {}
+        if old is not None:
+            old.close()
+
+    @property
+    def languages(self):
         """
-        self._data = get_all_data()
+        :return: The names of all languages, loaded or not.
+        """
+        return list(self.__folders)
+
+    @property
+    def folders(self):
+        """
+        :return: A dict of {language name: folder path}
+        """
+        return dict(self.__folders)
+
+    def __contains__(self, lan):
+        return lan in self.__folders
+
+    def __source(self, lan):
+        """
+        Read the data of a language, must be called with the lock held.
+
+        :param lan: the language name.
+
+        :return: The language data in a dict of {file name: {key: str}}
+
+        :raises KeyError: if the language doesn't exist.
+        """
+        if self.__compiled is not None and lan not in self.__changed:
+            return self.__compiled.load(lan)
+        return get_language_data(self.__folders[lan])
+
+    def __table(self, lan):
+        """
+        Get the table of a language, the language is read if it's not yet.
+
+        :param lan: the language name.
+
+        :return:
+            A dict of {(file name without .json, key): str}, with the
+            English strings for the keys the language doesn't have.
+
+        :raises KeyError: if the language doesn't exist.
+        """
+        table = self._tables.get(lan)
+        if table is not None:
+            return table
+        with self.__lock:
+            table = self._tables.get(lan)
+            if table is None:
+                source = self.__source(lan)
+                english = self.__table('en') if lan != 'en' else None
+                table = _build_table(lan, source, english)
+                self.__sources[lan] = source
+                self._tables = {**self._tables, lan: table}
+        return table
+
+    def update(self, lan, fname):
+        """
+        Read one json file of a language again and swap it in. The file is
+        parsed before the lock is taken, English changes are merged into
+        the tables of the other languages that are loaded.
+
+        :param lan: the language name.
+
+        :param fname: the json file name, a file that was deleted is removed.
+
+        :raises ValueError: if the file is not valid json, the old data is
+        kept.
+        """
+        folder = self.__folders.get(lan)
+        if folder is None:
+            return
+        try:
+            with folder.joinpath(fname).open(encoding='utf-8') as f:
+                data = load(f)
+        except FileNotFoundError:
+            data = None
+        with self.__lock:
+            self.__changed.add(lan)
+            source = self.__sources.get(lan)
+            if source is None:
+                # Not loaded yet, it's read from the json files when it is.
+                return
+            source = dict(source)
+            if data is None:
+                source.pop(fname, None)
+            else:
+                source[fname] = data
+            sources = {**self.__sources, lan: source}
+            if lan == 'en':
+                english = _build_table(lan, source)
+                tables = {
+                    name: _build_table(name, src, english) if name != 'en'
+                    else english
+                    for name, src in sources.items()
+                }
+            else:
+                tables = {
+                    **self._tables,
+                    lan: _build_table(lan, source, self._tables['en'])
+                }
+            self.__sources = sources
+            self._tables = tables
+
+    @property
+    def _data(self):
+        """
+        All of the language data, every language is read.
+
+        :return: A dict of {language name: {file name: {key: str}}}
+        """
+        with self.__lock:
+            return {lan: self.__source(lan) for lan in self.__folders}
 
     @property
     def en(self):
@@ -76,7 +412,8 @@ class Translation:
         A quick access to the base language(English)
         :return: The English language data.
         """
-        return self._data['en']
+        with self.__lock:
+            return self.__source('en')
 
     def get(self, lan: str, file: str, key: str) -> str:
         """
@@ -93,10 +430,111 @@ class Translation:
             return in English if not found.
 
         :raises KeyError:
-            If the language or file name is not in all of the data.
+            If the language is not in all of the data, or the file name
+            and key are in neither the language nor English.
+        """
+        table = self._tables.get(lan) or self.__table(lan)
+        try:
+            return table[file, key]
+        except KeyError:
+            if not file.endswith('.json'):
+                raise
+        return table[file[:-5], key]
+
+
+class TranslationWatcher:
+    """
+    Poll the modification times of the json files in a thread, and update
+    the translation with the files that changed. Parsing happens in the
+    thread, so edits go live without blocking the event loop.
+
+    New language folders are only picked up by Translation.reload.
+    """
+    __slots__ = ('translation', 'interval', '__logger', '__thread',
+                 '__stop', '__mtimes')
+
+    def __init__(self, translation, interval=2.0, logger=None):
+        """
+        :param translation: the Translation to update.
+
+        :param interval: the time in seconds between polls.
+
+        :param logger: the logger for files that can't be read, optional.
+        """
+        self.translation = translation
+        self.interval = interval
+        self.__logger = logger or getLogger(__name__)
+        self.__thread = None
+        self.__stop = Event()
+        self.__mtimes = None
+
+    def __scan(self):
+        """
+        :return:
+            A dict of {(language name, file name): (mtime, size)} of the
+            json files of the languages.
+        """
+        res = {}
+        for lan, folder in self.translation.folders.items():
+            for fp in _json_files(folder):
+                try:
+                    stat = fp.stat()
+                except FileNotFoundError:
+                    continue
+                res[lan, fp.name] = stat.st_mtime_ns, stat.st_size
+        return res
+
+    def check(self):
+        """
+        Update the translation with the files that changed since the last
+        check, English first so the other languages merge the new English.
+        The first check only records the modification times.
+
+        :return: A list of (language name, file name) of the changed files.
+        """
+        mtimes = self.__scan()
+        old, self.__mtimes = self.__mtimes, mtimes
+        if old is None:
+            return []
+        changed = sorted(
+            (f for f in mtimes.keys() | old.keys()
+             if mtimes.get(f) != old.get(f)),
+            key=lambda f: (f[0] != 'en', f)
+        )
+        for lan, fname in changed:
+            try:
+                self.translation.update(lan, fname)
+            except (OSError, ValueError) as e:
+                self.__logger.warning(
+                    f'Failed to reload translation {lan}/{fname}: {e}')
+        return changed
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.__logger.warning(f'Translation watcher error: {e}')
+
+    def start(self):
+        """
+        Start polling in a daemon thread.
+        """
+        if self.__thread is not None:
+            return
+        if self.__mtimes is None:
+            self.check()
+        self.__stop.clear()
+        self.__thread = Thread(
+            target=self.__run, name='translation-watcher', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop polling and wait for the thread to finish.
         """
-        if not file.endswith('.json'):
-            file = f'{file}.json'
-        language_data = self._data[lan][file]
-        english_data = self.en[file][key]
-        return language_data.get(key, english_data)
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
@@ -0,0 +1,8 @@
+"""
+Compile the translations, run with python -m translations from the
+translations folder.
+"""
+from translations import compile_translations
+
+if __name__ == '__main__':
+    print(f'Compiled translations into {compile_translations()}')
@@ -0,0 +1,211 @@
+"""
+Localized strings parsed once when their language is loaded.
+"""
+from keyword import iskeyword
+from re import compile as re_compile
+from string import Formatter
+
+__all__ = ['Template', 'TemplateError', 'template_table']
+
+_FORMATTER = Formatter()
+_LOOKUP = re_compile(r'\.([^.\[]+)|\[([^\]]+)\]')
+
+
+class TemplateError(ValueError):
+    """
+    Raised for a localized string that is not a valid format string, or
+    whose placeholders don't match the English string.
+    """
+
+
+def _split_field(field):
+    """
+    Split a field name into its root and its lookups.
+
+    :param field: the field name, like 0.title or user[name]
+
+    :return: the root and a list of (is attribute, name)
+
+    :raises TemplateError: if the field name is not valid.
+    """
+    end = len(field)
+    for i, c in enumerate(field):
+        if c in '.[':
+            end = i
+            break
+    lookups = []
+    pos = end
+    while pos < len(field):
+        match = _LOOKUP.match(field, pos)
+        if match is None:
+            raise TemplateError(f'Invalid field name {field!r}')
+        attr, index = match.groups()
+        lookups.append((attr is not None, attr if attr is not None else index))
+        pos = match.end()
+    return field[:end], lookups
+
+
+def _parse(text):
+    """
+    Parse a format string.
+
+    :param text: the format string.
+
+    :return:
+        A list of (literal, root, lookups, conversion, format spec) and the
+        set of field roots, positional roots are ints. root is None for the
+        literal text at the end.
+
+    :raises TemplateError: if the string is not a valid format string.
+    """
+    try:
+        parsed = list(_FORMATTER.parse(text))
+    except ValueError as e:
+        raise TemplateError(str(e)) from None
+    segments = []
+    roots = set()
+    auto = None
+    next_index = 0
+    for literal, field, spec, conversion in parsed:
+        if field is None:
+            segments.append((literal, None, None, None, None))
+            continue
+        if conversion not in (None, 'r', 's', 'a'):
+            raise TemplateError(f'Unknown conversion {conversion!r}')
+        root, lookups = _split_field(field)
+        if root == '' or root.isdigit():
+            if auto is (root != ''):
+                raise TemplateError(
+                    'Automatic and manual field numbering are mixed')
+            auto = root == ''
+            if auto:
+                root = next_index
+                next_index += 1
+            else:
+                root = int(root)
+        roots.add(root)
+        segments.append((literal, root, lookups, conversion, spec))
+    return segments, frozenset(roots)
+
+
+def _compile(segments):
+    """
+    Compile the segments of a template into a function that renders it with
+    f-string bytecode. Literals, lookup keys and format specs are passed in
+    the namespace of the function, so no template text ends up in the code.
+    Fields are looked up in the args and kwargs by index and key, so missing
+    arguments raise the IndexError and KeyError str.format raises.
+
+    :param segments: the segments returned by _parse.
+
+    :return:
+        The function, with the signature of str.format, None if the
+        template uses fields the function can't render, like nested fields
+        in a format spec or attributes named like keywords.
+    """
+    namespace = {'__builtins__': {}}
+    parts = []
+    for i, (literal, root, lookups, conversion, spec) in enumerate(segments):
+        if literal:
+            namespace[f'_l{i}'] = literal
+            parts.append(f'{{_l{i}}}')
+        if root is None:
+            continue
+        if isinstance(root, int):
+            expr = f'_args[{root}]'
+        else:
+            namespace[f'_n{i}'] = root
+            expr = f'_kwargs[_n{i}]'
+        for j, (is_attr, key) in enumerate(lookups):
+            if is_attr:
+                if not key.isidentifier() or iskeyword(key):
+                    return None
+                expr += f'.{key}'
+            elif key.isdigit():
+                expr += f'[{int(key)}]'
+            else:
+                namespace[f'_k{i}_{j}'] = key
+                expr += f'[_k{i}_{j}]'
+        if conversion:
+            expr += f'!{conversion}'
+        if spec:
+            if '{' in spec:
+                return None
+            namespace[f'_s{i}'] = spec
+            expr += f':{{_s{i}}}'
+        parts.append(f'{{{expr}}}')
+    source = f"lambda *_args, **_kwargs: f'{''.join(parts)}'"
+    return eval(source, namespace)
+
+
+class Template(str):
+    """
+    A localized string that was parsed when its language was loaded.
+
+    It's a str, so it can be used like one, but format renders it with a
+    function compiled on the first call instead of parsing the string
+    every time. The function is set on the instance, so later calls go
+    straight to it.
+    """
+
+    def __new__(cls, text):
+        """
+        :param text: the localized string.
+
+        :raises TemplateError: if the string is not a valid format string.
+        """
+        self = super().__new__(cls, text)
+        self.__segments, self.fields = _parse(text)
+        return self
+
+    def format(self, *args, **kwargs):
+        func = _compile(self.__segments)
+        if func is None:
+            func = super().format
+        self.format = func
+        return func(*args, **kwargs)
+
+    def check(self, english):
+        """
+        Check the placeholders match the English string.
+
+        :param english: the English Template.
+
+        :raises TemplateError: if they don't.
+        """
+        if self.fields != english.fields:
+            raise TemplateError(
+                f'Placeholders {sorted(map(str, self.fields))} don\'t match '
+                f'the English {sorted(map(str, english.fields))}'
+            )
+
+
+def template_table(table, english=None):
+    """
+    Turn the strings of a flattened language table into Templates.
+
+    :param table: a dict of {(file name, key): value}
+
+    :param english:
+        the English table of Templates to check the placeholders against,
+        None for English itself.
+
+    :return:
+        The table with Templates, the strings that are not valid or don't
+        match English are left out so the English string is used, and a
+        list of error messages for them.
+    """
+    res = {}
+    errors = []
+    for k, val in table.items():
+        if isinstance(val, str):
+            try:
+                val = Template(val)
+                en_val = english.get(k) if english is not None else None
+                if isinstance(en_val, Template):
+                    val.check(en_val)
+            except TemplateError as e:
+                errors.append(f'{k[0]}/{k[1]}: {e}')
+                continue
+        res[k] = val
+    return res, errors